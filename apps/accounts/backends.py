@@ -1,12 +1,12 @@
 from django.contrib.auth.backends import ModelBackend
 from django.contrib.auth import get_user_model
-from django.db.models import Q
 
 
 class EmailOrUsernameModelBackend(ModelBackend):
     """Authenticate using either username or email address.
 
-    This backend is case-insensitive for both username and email lookups.
+    This backend is case-insensitive for both username and email lookups;
+    the match is on LOWER(column) so it stays an index seek.
     """
 
     def authenticate(self, request, username=None, password=None, **kwargs):
@@ -18,9 +18,7 @@ class EmailOrUsernameModelBackend(ModelBackend):
             return None
 
         try:
-            user = UserModel.objects.filter(
-                Q(username__iexact=username) | Q(email__iexact=username)
-            ).order_by('id').first()
+            user = UserModel.objects.for_login(username).order_by('id').first()
         except Exception:
             return None
 
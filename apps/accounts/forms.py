@@ -66,7 +66,7 @@ class PatientRegistrationForm(UserCreationForm):
 
     def clean_email(self):
         email = self.cleaned_data.get('email')
-        if email and User.objects.filter(email__iexact=email).exists():
+        if email and User.objects.with_email(email).exists():
             raise forms.ValidationError('A user with this email already exists. Please use a different email or sign in.')
         return email
 
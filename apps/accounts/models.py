@@ -1,9 +1,31 @@
 from django.db import models
-from django.contrib.auth.models import AbstractUser
+from django.db.models.functions import Lower
+from django.contrib.auth.models import AbstractUser, UserManager
 from django.core.validators import MinValueValidator
 from django.utils import timezone
 from decimal import Decimal
 
+class UserQuerySet(models.QuerySet):
+    """
+    Case-insensitive lookups compare LOWER(column) so they can use the
+    functional indexes on User rather than scanning with iexact.
+    """
+
+    def with_email(self, email):
+        return self.alias(email_lower=Lower('email')).filter(email_lower=email.strip().lower())
+
+    def for_login(self, identifier):
+        """Users whose username or email matches `identifier`, ignoring case."""
+        value = identifier.strip().lower()
+        return self.alias(username_lower=Lower('username'), email_lower=Lower('email')).filter(
+            models.Q(username_lower=value) | models.Q(email_lower=value)
+        )
+
+
+class CustomUserManager(UserManager.from_queryset(UserQuerySet)):
+    pass
+
+
 class User(AbstractUser):
     """
     Extended User model with role-based access
@@ -28,12 +50,17 @@ class User(AbstractUser):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_verified = models.BooleanField(default=False)
+
+    objects = CustomUserManager()
     
     class Meta:
         db_table = 'users'
         indexes = [
             models.Index(fields=['role']),
             models.Index(fields=['email']),
+            # Login and registration match on LOWER(...), see UserQuerySet
+            models.Index(Lower('username'), name='users_username_lower_idx'),
+            models.Index(Lower('email'), name='users_email_lower_idx'),
         ]
     
     def __str__(self):
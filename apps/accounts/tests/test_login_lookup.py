@@ -0,0 +1,32 @@
+from django.contrib.auth import authenticate
+from django.test import TestCase
+
+from apps.accounts.forms import PatientRegistrationForm
+from apps.accounts.models import User
+
+
+class LoginLookupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='Asha.Rai', email='Asha.Rai@Example.com', password='s3cret-pass', role='patient'
+        )
+
+    def test_login_by_username_or_email_ignores_case(self):
+        self.assertEqual(authenticate(username='asha.rai', password='s3cret-pass'), self.user)
+        self.assertEqual(authenticate(username=' ASHA.RAI@example.COM', password='s3cret-pass'), self.user)
+        self.assertIsNone(authenticate(username='asha.rai', password='wrong'))
+
+    def test_lookups_compare_lowercased_columns(self):
+        sql = str(User.objects.for_login('Asha.Rai').query)
+
+        self.assertIn('LOWER("users"."username") = asha.rai', sql)
+        self.assertIn('LOWER("users"."email") = asha.rai', sql)
+
+    def test_registration_rejects_email_in_another_case(self):
+        form = PatientRegistrationForm(data={
+            'first_name': 'Asha', 'last_name': 'Rai', 'email': 'ASHA.RAI@example.com',
+            'password1': 'An0ther-pass!', 'password2': 'An0ther-pass!',
+        })
+
+        self.assertFalse(form.is_valid())
+        self.assertIn('email', form.errors)
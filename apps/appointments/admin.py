@@ -4,11 +4,13 @@ Appointments Admin Configuration
 
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import Appointment, ProviderAvailability
+from .models import Appointment, ProviderAvailability, OpenAppointmentRequest
+from .services import AppointmentTransitionService
 from .models import (
     PersonalAppointment,
     ProviderSchedule,
     AppointmentReview,
+    AppointmentSeries,
 )
 
 
@@ -74,27 +76,17 @@ class AppointmentAdmin(admin.ModelAdmin):
     actions = ['mark_as_confirmed', 'mark_as_completed', 'mark_as_cancelled']
     
     def mark_as_confirmed(self, request, queryset):
-        from django.utils import timezone
-        count = queryset.filter(status='pending').update(
-            status='confirmed',
-            confirmed_at=timezone.now()
-        )
+        count = len(AppointmentTransitionService.confirm.apply(queryset, actor=request.user))
         self.message_user(request, f'{count} appointment(s) marked as confirmed.')
     mark_as_confirmed.short_description = 'Mark selected as Confirmed'
     
     def mark_as_completed(self, request, queryset):
-        from django.utils import timezone
-        count = queryset.filter(status__in=['confirmed', 'in_progress']).update(
-            status='completed',
-            completed_at=timezone.now()
-        )
+        count = len(AppointmentTransitionService.complete.apply(queryset, actor=request.user))
         self.message_user(request, f'{count} appointment(s) marked as completed.')
     mark_as_completed.short_description = 'Mark selected as Completed'
     
     def mark_as_cancelled(self, request, queryset):
-        count = queryset.exclude(status__in=['completed', 'cancelled']).update(
-            status='cancelled'
-        )
+        count = len(AppointmentTransitionService.cancel.apply(queryset, actor=request.user))
         self.message_user(request, f'{count} appointment(s) marked as cancelled.')
     mark_as_cancelled.short_description = 'Mark selected as Cancelled'
 
@@ -104,6 +96,15 @@ class AppointmentAdmin(admin.ModelAdmin):
         super().save_model(request, obj, form, change)
 
 
+@admin.register(OpenAppointmentRequest)
+class OpenAppointmentRequestAdmin(admin.ModelAdmin):
+    list_display = ['appointment', 'specialization', 'appointment_date', 'appointment_time', 'created_at']
+    list_filter = ['specialization', 'appointment_date']
+    ordering = ['appointment_date', 'appointment_time']
+    raw_id_fields = ['appointment']
+    readonly_fields = ['created_at']
+
+
 @admin.register(ProviderAvailability)
 class ProviderAvailabilityAdmin(admin.ModelAdmin):
     list_display = ['provider', 'day_of_week', 'start_time', 'end_time', 'is_available']
@@ -236,6 +237,15 @@ class PersonalAppointmentAdmin(admin.ModelAdmin):
         super().save_model(request, obj, form, change)
 
 
+@admin.register(AppointmentSeries)
+class AppointmentSeriesAdmin(admin.ModelAdmin):
+    list_display = ['id', 'patient', 'kind', 'service', 'provider', 'frequency', 'interval', 'start_date', 'count', 'until', 'is_active']
+    list_filter = ['kind', 'frequency', 'is_active']
+    search_fields = ['patient__email', 'provider__email', 'service__name']
+    raw_id_fields = ['patient', 'provider', 'service']
+    readonly_fields = ['created_at']
+
+
 @admin.register(AppointmentReview)
 class AppointmentReviewAdmin(admin.ModelAdmin):
     list_display = [
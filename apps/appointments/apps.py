@@ -4,3 +4,7 @@ class AppointmentsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.appointments'
     verbose_name = 'Appointments'
+
+    def ready(self):
+        # Connects the transition and open request queue receivers
+        from . import services  # noqa: F401
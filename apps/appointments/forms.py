@@ -4,7 +4,7 @@ from decimal import Decimal
 from django.utils import timezone
 from .models import Appointment
 from apps.payments.models import Payment
-from .models import PersonalAppointment
+from .models import PersonalAppointment, AppointmentSeries
 
 
 class AppointmentBookingForm(forms.ModelForm):
@@ -75,6 +75,20 @@ class AppointmentBookingForm(forms.ModelForm):
             })
         )
 
+        # Optional weekly/daily/monthly repeat; handled by RecurringBookingService
+        self.fields['repeat_frequency'] = forms.ChoiceField(
+            required=False,
+            choices=(('', 'Does not repeat'),) + AppointmentSeries.FREQUENCY_CHOICES,
+            widget=forms.Select(attrs={'class': 'form-control'})
+        )
+        self.fields['repeat_count'] = forms.IntegerField(
+            required=False,
+            min_value=2,
+            max_value=AppointmentSeries.MAX_OCCURRENCES,
+            help_text='Total number of visits, including the first one.',
+            widget=forms.NumberInput(attrs={'class': 'form-control'})
+        )
+
         if self.service:
             # If service advertises a min/max, communicate it via help_text and widget attrs
             if self.service.price_min is not None:
@@ -119,6 +133,8 @@ class AppointmentBookingForm(forms.ModelForm):
                 self.add_error('requested_price', f'Requested price cannot be less than {self.service.price_min}.')
             if self.service.price_max is not None and requested_price > self.service.price_max:
                 self.add_error('requested_price', f'Requested price cannot be greater than {self.service.price_max}.')
+        if cleaned_data.get('repeat_frequency') and not cleaned_data.get('repeat_count'):
+            self.add_error('repeat_count', 'Please enter how many visits to book.')
         appointment_date = cleaned_data.get('appointment_date')
         appointment_time = cleaned_data.get('appointment_time')
         
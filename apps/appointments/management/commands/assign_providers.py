@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from apps.appointments.services import ProviderAssignmentService
+
+
+class Command(BaseCommand):
+    help = 'Assign providers to pending unassigned appointments in one batch'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report the assignments without saving them')
+        parser.add_argument('--limit', type=int, default=None, help='Maximum number of pending appointments to consider')
+        parser.add_argument(
+            '--max-per-day', type=int, default=ProviderAssignmentService.DEFAULT_MAX_PER_DAY,
+            help='Maximum appointments a provider may hold on a single day'
+        )
+        parser.add_argument('--verbose-report', action='store_true', help='List every assignment and unassigned appointment')
+
+    def handle(self, *args, **options):
+        report = ProviderAssignmentService.run(
+            limit=options['limit'],
+            max_per_day=options['max_per_day'],
+            dry_run=options['dry_run'],
+        )
+
+        if options['verbose_report'] or options['dry_run']:
+            for appointment, provider_id in report['assignments']:
+                self.stdout.write(
+                    f'Appointment {appointment.id} ({appointment.appointment_date} {appointment.appointment_time}) -> provider {provider_id}'
+                )
+            for appointment, reason in report['unassigned']:
+                self.stdout.write(f'Appointment {appointment.id} unassigned: {reason}')
+
+        timings = report['timings']
+        elapsed = sum(timings.values())
+        throughput = report['considered'] / elapsed if elapsed else 0
+        self.stdout.write(
+            f"Timings: load={timings['load']:.3f}s match={timings['match']:.3f}s "
+            f"commit={timings['commit']:.3f}s total={elapsed:.3f}s ({throughput:.0f} appointments/s)"
+        )
+
+        summary = (
+            f"considered={report['considered']}, matched={len(report['assignments'])}, "
+            f"unassigned={len(report['unassigned'])}"
+        )
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'Dry run complete: {summary}'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Assignment complete: {summary}, saved={report['committed']}"))
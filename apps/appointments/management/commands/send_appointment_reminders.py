@@ -0,0 +1,35 @@
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from apps.appointments.services import AppointmentReminderService
+
+
+class Command(BaseCommand):
+    help = 'Send reminders for personal appointments starting within the next few hours'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours', type=int, default=AppointmentReminderService.DEFAULT_LEAD_HOURS,
+            help='How far ahead to look for appointments'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=AppointmentReminderService.DEFAULT_BATCH_SIZE,
+            help='Appointments processed per batch'
+        )
+        parser.add_argument('--sms', action='store_true', help='Also send SMS reminders')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the due reminders')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            due = AppointmentReminderService.due_queryset(lead_hours=options['hours']).count()
+            self.stdout.write(self.style.SUCCESS(f'Dry run: {due} reminders due'))
+            return
+
+        started = perf_counter()
+        sent = AppointmentReminderService.send_due_reminders(
+            lead_hours=options['hours'],
+            batch_size=options['batch_size'],
+            send_sms=options['sms'],
+        )
+        elapsed = perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'Sent {sent} reminders in {elapsed:.2f}s'))
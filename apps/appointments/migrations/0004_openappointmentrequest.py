@@ -0,0 +1,59 @@
+# Generated by Django 4.2.7 on 2026-10-19 14:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_queue(apps, schema_editor):
+    """Queue every unassigned pending appointment under each mapped specialization."""
+    Appointment = apps.get_model('appointments', 'Appointment')
+    OpenAppointmentRequest = apps.get_model('appointments', 'OpenAppointmentRequest')
+    SpecializationCategory = apps.get_model('services', 'SpecializationCategory')
+
+    specializations = {}
+    for category_id, specialization in SpecializationCategory.objects.values_list('category_id', 'specialization'):
+        specializations.setdefault(category_id, []).append(specialization)
+
+    pending = Appointment.objects.filter(status='pending', provider__isnull=True).values_list(
+        'id', 'service__category_id', 'appointment_date', 'appointment_time'
+    )
+    entries = [
+        OpenAppointmentRequest(
+            appointment_id=appointment_id,
+            specialization=spec,
+            appointment_date=appointment_date,
+            appointment_time=appointment_time,
+        )
+        for appointment_id, category_id, appointment_date, appointment_time in pending.iterator()
+        for spec in specializations.get(category_id, [])
+    ]
+    OpenAppointmentRequest.objects.bulk_create(entries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0003_appointment_final_price'),
+        ('services', '0005_specializationcategory'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OpenAppointmentRequest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('specialization', models.CharField(choices=[('nursing', 'Skilled Nursing'), ('physiotherapy', 'Physiotherapy'), ('geriatric', 'Elderly & Geriatric Care'), ('respiratory', 'Respiratory Care'), ('wound_care', 'Wound Care'), ('general', 'General Care')], max_length=50)),
+                ('appointment_date', models.DateField()),
+                ('appointment_time', models.TimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('appointment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='open_requests', to='appointments.appointment')),
+            ],
+            options={
+                'db_table': 'open_appointment_requests',
+                'ordering': ['appointment_date', 'appointment_time'],
+                'indexes': [models.Index(fields=['specialization', 'appointment_date', 'appointment_time'], name='open_appoin_special_d8758c_idx')],
+                'unique_together': {('appointment', 'specialization')},
+            },
+        ),
+        migrations.RunPython(backfill_queue, migrations.RunPython.noop),
+    ]
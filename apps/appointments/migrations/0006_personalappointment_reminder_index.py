@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 14:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0005_appointmentseries'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='personalappointment',
+            index=models.Index(fields=['appointment_date', 'status', 'reminder_sent'], name='personal_ap_appoint_a74c34_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-19 15:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0006_personalappointment_reminder_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['provider', 'appointment_date'], name='appointments_provider_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(condition=models.Q(('provider__isnull', True), ('status', 'pending')), fields=['appointment_date', 'appointment_time'], name='appointments_unassigned_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='personalappointment',
+            index=models.Index(fields=['provider', 'appointment_date', 'appointment_time', 'status'], name='personal_provider_slot_idx'),
+        ),
+    ]
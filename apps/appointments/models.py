@@ -1,8 +1,9 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from django.core.exceptions import ValidationError
-from apps.accounts.models import User
+from apps.accounts.models import User, ProviderProfile
 from apps.services.models import Service
+from datetime import date, timedelta
 from decimal import Decimal
 
 class Appointment(models.Model):
@@ -63,6 +64,15 @@ class Appointment(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     confirmed_at = models.DateTimeField(null=True, blank=True)
     completed_at = models.DateTimeField(null=True, blank=True)
+
+    # Set when the appointment was generated from a recurring series
+    series = models.ForeignKey(
+        'AppointmentSeries',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='appointments'
+    )
     
     class Meta:
         db_table = 'appointments'
@@ -71,6 +81,14 @@ class Appointment(models.Model):
             models.Index(fields=['provider', 'status']),
             models.Index(fields=['appointment_date', 'status']),
             models.Index(fields=['created_at']),
+            # Provider day schedules and slot checks
+            models.Index(fields=['provider', 'appointment_date'], name='appointments_provider_date_idx'),
+            # Only the unassigned queue, already in the order the assigner reads it
+            models.Index(
+                fields=['appointment_date', 'appointment_time'],
+                condition=models.Q(status='pending', provider__isnull=True),
+                name='appointments_unassigned_idx',
+            ),
         ]
         ordering = ['-appointment_date', '-appointment_time']
     
@@ -105,6 +123,7 @@ class Appointment(models.Model):
         effective_price = self.final_price if (self.final_price is not None) else self.service_price
         self.total_amount = (effective_price or Decimal('0.00')) + (self.additional_charges or Decimal('0.00'))
         # Prevent editing critical appointment details after confirmation unless allowed
+        old = None
         if self.pk:
             try:
                 old = Appointment.objects.get(pk=self.pk)
@@ -119,6 +138,93 @@ class Appointment(models.Model):
 
         super().save(*args, **kwargs)
 
+        # Keep the open request queue in step with status/assignment changes.
+        # Skip the extra queries when nothing that affects the queue changed.
+        queue_fields = ['status', 'provider_id', 'service_id', 'appointment_date', 'appointment_time']
+        if old is None:
+            if OpenAppointmentRequest.is_open(self):
+                OpenAppointmentRequest.sync_for(self)
+        elif any(getattr(old, f) != getattr(self, f) for f in queue_fields):
+            OpenAppointmentRequest.sync_for(self)
+
+
+class OpenAppointmentRequest(models.Model):
+    """
+    Precomputed queue of unassigned pending appointments, one row per
+    specialization whose service categories cover the appointment. Lets
+    providers find claimable work with an indexed lookup instead of a text
+    scan over service category names.
+    """
+    appointment = models.ForeignKey(Appointment, on_delete=models.CASCADE, related_name='open_requests')
+    specialization = models.CharField(max_length=50, choices=ProviderProfile.SPECIALIZATION_CHOICES)
+    # Denormalized from the appointment so the queue can be ordered from the index
+    appointment_date = models.DateField()
+    appointment_time = models.TimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'open_appointment_requests'
+        unique_together = ('appointment', 'specialization')
+        indexes = [
+            models.Index(fields=['specialization', 'appointment_date', 'appointment_time']),
+        ]
+        ordering = ['appointment_date', 'appointment_time']
+
+    def __str__(self):
+        return f"Open request #{self.appointment_id} ({self.specialization})"
+
+    @staticmethod
+    def is_open(appointment):
+        return appointment.status == 'pending' and appointment.provider_id is None
+
+    @classmethod
+    def entries_for(cls, appointments):
+        """Build (unsaved) queue rows for the open appointments given."""
+        from apps.services.models import SpecializationCategory
+
+        open_appointments = [a for a in appointments if cls.is_open(a)]
+        if not open_appointments:
+            return []
+
+        category_ids = {a.service.category_id for a in open_appointments}
+        specializations = {}
+        for category_id, specialization in SpecializationCategory.objects.filter(
+            category_id__in=category_ids
+        ).values_list('category_id', 'specialization'):
+            specializations.setdefault(category_id, []).append(specialization)
+        # A category nobody has mapped yet is offered to every specialization
+        # rather than to no one
+        everyone = [code for code, _ in ProviderProfile.SPECIALIZATION_CHOICES]
+
+        return [
+            cls(
+                appointment=a,
+                specialization=spec,
+                appointment_date=a.appointment_date,
+                appointment_time=a.appointment_time,
+            )
+            for a in open_appointments
+            for spec in specializations.get(a.service.category_id, everyone)
+        ]
+
+    @classmethod
+    def sync_for(cls, appointment):
+        """Add, refresh or remove the queue rows for a single appointment."""
+        cls.objects.filter(appointment=appointment).delete()
+        entries = cls.entries_for([appointment])
+        if entries:
+            cls.objects.bulk_create(entries)
+
+    @classmethod
+    def sync_categories(cls, category_ids):
+        """Rebuild the queue rows of every open appointment in the given service categories."""
+        appointments = list(Appointment.objects.filter(
+            status='pending', provider__isnull=True, service__category_id__in=category_ids
+        ).select_related('service'))
+        with transaction.atomic():
+            cls.objects.filter(appointment__in=appointments).delete()
+            cls.objects.bulk_create(cls.entries_for(appointments), batch_size=500)
+
 
 class ProviderAvailability(models.Model):
     """
@@ -184,6 +290,14 @@ class ProviderSchedule(models.Model):
         return f"{self.provider.get_full_name()} - {self.get_day_of_week_display()}"
 
 
+class PersonalAppointmentQuerySet(models.QuerySet):
+    def with_review_state(self):
+        """Annotate `has_review` so listings don't touch `.review` per row."""
+        return self.annotate(
+            has_review=models.Exists(AppointmentReview.objects.filter(appointment=models.OuterRef('pk')))
+        )
+
+
 class PersonalAppointment(models.Model):
     """
     Personal appointments between patient and provider
@@ -275,6 +389,17 @@ class PersonalAppointment(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     confirmed_at = models.DateTimeField(null=True, blank=True)
     completed_at = models.DateTimeField(null=True, blank=True)
+
+    # Set when the appointment was generated from a recurring series
+    series = models.ForeignKey(
+        'AppointmentSeries',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='personal_appointments'
+    )
+
+    objects = PersonalAppointmentQuerySet.as_manager()
     
     class Meta:
         db_table = 'personal_appointments'
@@ -283,6 +408,13 @@ class PersonalAppointment(models.Model):
             models.Index(fields=['patient', 'status']),
             models.Index(fields=['provider', 'status']),
             models.Index(fields=['appointment_date', 'status']),
+            # Due-reminder scan in AppointmentReminderService
+            models.Index(fields=['appointment_date', 'status', 'reminder_sent']),
+            # Slot availability checks
+            models.Index(
+                fields=['provider', 'appointment_date', 'appointment_time', 'status'],
+                name='personal_provider_slot_idx',
+            ),
         ]
     
     def __str__(self):
@@ -307,6 +439,127 @@ class PersonalAppointment(models.Model):
         super().save(*args, **kwargs)
 
 
+class AppointmentSeries(models.Model):
+    """
+    Recurring booking pattern (a small subset of RFC 5545 RRULE: FREQ,
+    INTERVAL, BYDAY, COUNT and UNTIL) that generates a run of service
+    bookings or personal appointments.
+    """
+    KIND_CHOICES = (
+        ('service', 'Service Booking'),
+        ('personal', 'Personal Appointment'),
+    )
+
+    FREQUENCY_CHOICES = (
+        ('daily', 'Daily'),
+        ('weekly', 'Weekly'),
+        ('monthly', 'Monthly'),
+    )
+
+    # Hard cap on how many occurrences a single series may generate
+    MAX_OCCURRENCES = 52
+
+    patient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='appointment_series')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default='service')
+    service = models.ForeignKey(
+        Service,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='appointment_series'
+    )
+    provider = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='provider_appointment_series',
+        limit_choices_to={'role': 'provider'}
+    )
+
+    # Recurrence rule
+    frequency = models.CharField(max_length=10, choices=FREQUENCY_CHOICES, default='weekly')
+    interval = models.PositiveSmallIntegerField(default=1, help_text="Repeat every N days/weeks/months")
+    by_weekday = models.CharField(
+        max_length=20,
+        blank=True,
+        help_text="Comma separated weekdays for weekly series (0=Monday). Defaults to the start date's weekday."
+    )
+    start_date = models.DateField()
+    until = models.DateField(null=True, blank=True)
+    count = models.PositiveSmallIntegerField(null=True, blank=True)
+    appointment_time = models.TimeField()
+
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'appointment_series'
+        verbose_name_plural = 'Appointment Series'
+        indexes = [
+            models.Index(fields=['patient', 'is_active']),
+        ]
+
+    def __str__(self):
+        return f"Series #{self.id} - {self.get_frequency_display()} from {self.start_date}"
+
+    def clean(self):
+        errors = {}
+        if self.kind == 'service' and not self.service_id:
+            errors['service'] = 'A service booking series needs a service.'
+        if self.kind == 'personal' and not self.provider_id:
+            errors['provider'] = 'A personal appointment series needs a provider.'
+        if self.until and self.start_date and self.until < self.start_date:
+            errors['until'] = 'End date cannot be before the start date.'
+        if self.interval is not None and self.interval < 1:
+            errors['interval'] = 'Interval must be at least 1.'
+        if errors:
+            raise ValidationError(errors)
+
+    def get_weekdays(self):
+        if not self.by_weekday:
+            return [self.start_date.weekday()]
+        return sorted({int(day) for day in self.by_weekday.split(',') if day.strip() != ''})
+
+    def occurrence_dates(self):
+        """
+        Expand the rule into concrete dates, starting at start_date and
+        stopping at count, until or MAX_OCCURRENCES, whichever comes first.
+        Monthly dates that don't exist (e.g. the 31st) are skipped, as RRULE
+        does.
+        """
+        limit = min(self.count or self.MAX_OCCURRENCES, self.MAX_OCCURRENCES)
+        interval = max(self.interval or 1, 1)
+        start = self.start_date
+        dates = []
+        step = 0
+
+        while len(dates) < limit:
+            if self.frequency == 'daily':
+                candidates = [start + timedelta(days=step * interval)]
+            elif self.frequency == 'weekly':
+                week_start = start - timedelta(days=start.weekday()) + timedelta(weeks=step * interval)
+                candidates = [week_start + timedelta(days=day) for day in self.get_weekdays()]
+            else:
+                months = start.month - 1 + step * interval
+                try:
+                    candidates = [date(start.year + months // 12, months % 12 + 1, start.day)]
+                except ValueError:
+                    candidates = []
+
+            for candidate in candidates:
+                if candidate < start:
+                    continue
+                if self.until and candidate > self.until:
+                    return dates
+                dates.append(candidate)
+                if len(dates) == limit:
+                    break
+            step += 1
+
+        return dates
+
+
 class AppointmentReview(models.Model):
     """
     Patient reviews for completed personal appointments
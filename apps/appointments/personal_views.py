@@ -200,6 +200,13 @@ def get_available_slots(request, provider_id, date):
         is_available=True
     )
     
+    # Booked times for the day in one query rather than one per slot
+    booked = set(PersonalAppointment.objects.filter(
+        provider=provider,
+        appointment_date=appointment_date,
+        status__in=['pending', 'confirmed']
+    ).values_list('appointment_time', flat=True))
+
     slots = []
     for schedule in schedules:
         # Generate time slots
@@ -207,15 +214,7 @@ def get_available_slots(request, provider_id, date):
         end_time = schedule.end_time
         
         while current_time < end_time:
-            # Check if slot is already booked
-            is_booked = PersonalAppointment.objects.filter(
-                provider=provider,
-                appointment_date=appointment_date,
-                appointment_time=current_time,
-                status__in=['pending', 'confirmed']
-            ).exists()
-            
-            if not is_booked:
+            if current_time not in booked:
                 slots.append({
                     'time': current_time.strftime('%H:%M'),
                     'display': current_time.strftime('%I:%M %p')
@@ -253,17 +252,11 @@ def my_personal_appointments(request):
         appointments = appointments.filter(status=status_filter)
     
     # Determine whether each appointment can be reviewed by the current user.
-    # We avoid calling reverse relations directly in templates to prevent
-    # TemplateSyntaxError when the related object is missing.
-    from django.core.exceptions import ObjectDoesNotExist
+    # has_review is annotated in the listing query rather than read from the
+    # reverse relation, which would cost one query per appointment.
+    appointments = appointments.with_review_state()
     for appt in appointments:
-        try:
-            _ = appt.review
-            has_review = True
-        except ObjectDoesNotExist:
-            has_review = False
-
-        appt.can_review = (appt.status == 'completed' and not has_review and request.user.role == 'patient')
+        appt.can_review = (appt.status == 'completed' and not appt.has_review and request.user.role == 'patient')
 
     context = {
         'appointments': appointments,
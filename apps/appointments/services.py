@@ -0,0 +1,673 @@
+"""
+UH Care - Appointment services
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from time import perf_counter
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.db.models import F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.urls import reverse
+from django.utils import timezone
+
+from utils.transitions import BulkTransition, transition_applied
+from .models import (
+    Appointment,
+    OpenAppointmentRequest,
+    PersonalAppointment,
+    ProviderAvailability,
+    ProviderSchedule,
+)
+
+
+def _minutes(value):
+    return value.hour * 60 + value.minute
+
+
+class ProviderAssignmentService:
+    """
+    Batch assignment of unassigned pending appointments to providers.
+
+    Everything the matcher needs is loaded up front with a handful of
+    queries and indexed in memory; the chosen assignments are then written
+    back with a single bulk_update.
+    """
+
+    BUSY_STATUSES = ['pending', 'confirmed', 'in_progress']
+    DEFAULT_MAX_PER_DAY = 8
+
+    @staticmethod
+    def load_open_appointments(limit=None):
+        """
+        Pending unassigned appointments from today onwards in date/time
+        order, each paired with the specializations that may take it (read
+        from the open request queue). Past-dated requests are left for staff.
+        """
+        appointments = Appointment.objects.filter(
+            status='pending', provider__isnull=True, appointment_date__gte=timezone.localdate()
+        ).order_by('appointment_date', 'appointment_time', 'id')
+        if limit:
+            appointments = appointments[:limit]
+        appointments = list(appointments)
+
+        specializations = defaultdict(list)
+        for appointment_id, specialization in OpenAppointmentRequest.objects.filter(
+            appointment_id__in=[a.id for a in appointments]
+        ).values_list('appointment_id', 'specialization'):
+            specializations[appointment_id].append(specialization)
+
+        return [(a, specializations.get(a.id, [])) for a in appointments]
+
+    @staticmethod
+    def build_provider_index(dates):
+        """
+        Index available providers for the given dates.
+
+        Returns a dict with:
+          - by_specialization: specialization -> [provider ids]
+          - rating: provider id -> rating
+          - windows: (provider id, weekday) -> [(start, end)] in minutes
+          - busy: (provider id, date) -> [(start, end)] in minutes
+          - load: (provider id, date) -> booked appointment count
+          - total_load: provider id -> booked appointment count in range
+        """
+        from apps.accounts.models import ProviderProfile
+
+        index = {
+            'by_specialization': defaultdict(list),
+            'rating': {},
+            'windows': defaultdict(list),
+            'busy': defaultdict(list),
+            'load': defaultdict(int),
+            'total_load': defaultdict(int),
+        }
+
+        for user_id, specialization, rating in ProviderProfile.objects.filter(
+            is_available=True, user__is_active=True
+        ).values_list('user_id', 'specialization', 'rating'):
+            index['by_specialization'][specialization].append(user_id)
+            index['rating'][user_id] = rating
+
+        provider_ids = list(index['rating'])
+        if not provider_ids or not dates:
+            return index
+
+        # Either kind of weekly slot counts as a working window
+        for model in (ProviderAvailability, ProviderSchedule):
+            for provider_id, weekday, start, end in model.objects.filter(
+                provider_id__in=provider_ids, is_available=True
+            ).values_list('provider_id', 'day_of_week', 'start_time', 'end_time'):
+                index['windows'][(provider_id, weekday)].append((_minutes(start), _minutes(end)))
+
+        first, last = min(dates), max(dates)
+
+        for provider_id, day, start, hours in Appointment.objects.filter(
+            provider_id__in=provider_ids,
+            status__in=ProviderAssignmentService.BUSY_STATUSES,
+            appointment_date__range=(first, last),
+        ).values_list('provider_id', 'appointment_date', 'appointment_time', 'duration_hours'):
+            begin = _minutes(start)
+            index['busy'][(provider_id, day)].append((begin, begin + int(hours * 60)))
+            index['load'][(provider_id, day)] += 1
+            index['total_load'][provider_id] += 1
+
+        for provider_id, day, start, duration in PersonalAppointment.objects.filter(
+            provider_id__in=provider_ids,
+            status__in=ProviderAssignmentService.BUSY_STATUSES,
+            appointment_date__range=(first, last),
+        ).values_list('provider_id', 'appointment_date', 'appointment_time', 'duration_minutes'):
+            begin = _minutes(start)
+            index['busy'][(provider_id, day)].append((begin, begin + duration))
+
+        return index
+
+    @staticmethod
+    def match(open_appointments, index, max_per_day=DEFAULT_MAX_PER_DAY):
+        """
+        Greedily assign appointments in chronological order. For each one the
+        eligible providers are those with a matching specialization, a
+        working window covering the visit, no overlapping booking and spare
+        daily capacity; the least loaded (then highest rated) provider wins.
+
+        Returns (assignments, unassigned) where assignments is a list of
+        (appointment, provider_id) and unassigned a list of
+        (appointment, reason).
+        """
+        assignments = []
+        unassigned = []
+
+        for appointment, specializations in open_appointments:
+            if not specializations:
+                unassigned.append((appointment, 'no specialization covers this service'))
+                continue
+
+            day = appointment.appointment_date
+            weekday = day.weekday()
+            start = _minutes(appointment.appointment_time)
+            end = start + int(appointment.duration_hours * 60)
+
+            best = None
+            best_key = None
+            seen = set()
+            for specialization in specializations:
+                for provider_id in index['by_specialization'].get(specialization, []):
+                    if provider_id in seen:
+                        continue
+                    seen.add(provider_id)
+
+                    if index['load'][(provider_id, day)] >= max_per_day:
+                        continue
+                    if not any(w_start <= start and end <= w_end
+                               for w_start, w_end in index['windows'].get((provider_id, weekday), [])):
+                        continue
+                    if any(start < b_end and b_start < end
+                           for b_start, b_end in index['busy'].get((provider_id, day), [])):
+                        continue
+
+                    key = (
+                        index['load'][(provider_id, day)],
+                        index['total_load'][provider_id],
+                        -index['rating'][provider_id],
+                        provider_id,
+                    )
+                    if best_key is None or key < best_key:
+                        best, best_key = provider_id, key
+
+            if best is None:
+                reason = 'no available provider' if seen else 'no provider with this specialization'
+                unassigned.append((appointment, reason))
+                continue
+
+            # Reserve the slot so later appointments in the batch see it
+            index['busy'][(best, day)].append((start, end))
+            index['load'][(best, day)] += 1
+            index['total_load'][best] += 1
+            assignments.append((appointment, best))
+
+        return assignments, unassigned
+
+    @staticmethod
+    def commit(assignments, batch_size=500):
+        """
+        Write assignments in bulk. Rows that were claimed or cancelled since
+        they were loaded are skipped. Patients and providers get the same
+        confirmation notifications as the admin confirm action, once the
+        batch has committed. Returns the number of appointments assigned.
+        """
+        from apps.payments.services import PaymentSourceService
+
+        if not assignments:
+            return 0
+
+        now = timezone.now()
+        chosen = {appointment.id: provider_id for appointment, provider_id in assignments}
+
+        with transaction.atomic():
+            still_open = list(
+                Appointment.objects.select_for_update().filter(
+                    id__in=list(chosen), status='pending', provider__isnull=True
+                )
+            )
+            for appointment in still_open:
+                appointment.provider_id = chosen[appointment.id]
+                appointment.status = 'confirmed'
+                appointment.confirmed_at = now
+                appointment.updated_at = now
+
+            Appointment.objects.bulk_update(
+                still_open,
+                ['provider', 'status', 'confirmed_at', 'updated_at'],
+                batch_size=batch_size,
+            )
+            # bulk_update bypasses Appointment.save, so clear the queue and
+            # update the payments' copy of the status here
+            OpenAppointmentRequest.objects.filter(
+                appointment_id__in=[a.id for a in still_open]
+            ).delete()
+            PaymentSourceService.sync(Appointment, [a.id for a in still_open], 'confirmed')
+
+        confirmed = Appointment.objects.filter(
+            id__in=[a.id for a in still_open]
+        ).select_related(*AppointmentTransitionService.confirm.related)
+        AppointmentTransitionService.notify(AppointmentTransitionService.confirm, list(confirmed))
+        return len(still_open)
+
+    @staticmethod
+    def run(limit=None, max_per_day=DEFAULT_MAX_PER_DAY, dry_run=False):
+        """
+        Load, match and (unless dry_run) commit one batch. Returns a report
+        dict with the assignments, unassigned appointments and per-phase
+        timings in seconds.
+        """
+        timings = {}
+
+        started = perf_counter()
+        open_appointments = ProviderAssignmentService.load_open_appointments(limit=limit)
+        dates = {appointment.appointment_date for appointment, _ in open_appointments}
+        index = ProviderAssignmentService.build_provider_index(dates)
+        timings['load'] = perf_counter() - started
+
+        started = perf_counter()
+        assignments, unassigned = ProviderAssignmentService.match(
+            open_appointments, index, max_per_day=max_per_day
+        )
+        timings['match'] = perf_counter() - started
+
+        started = perf_counter()
+        committed = 0 if dry_run else ProviderAssignmentService.commit(assignments)
+        timings['commit'] = perf_counter() - started
+
+        return {
+            'considered': len(open_appointments),
+            'assignments': assignments,
+            'unassigned': unassigned,
+            'committed': committed,
+            'dry_run': dry_run,
+            'timings': timings,
+        }
+
+
+class RecurringBookingService:
+    """
+    Expansion and bulk creation of recurring appointment series
+    """
+
+    ACTIVE_STATUSES = ['pending', 'confirmed', 'in_progress']
+
+    @staticmethod
+    def build_occurrences(series, template):
+        """
+        Copy the unsaved `template` appointment (Appointment or
+        PersonalAppointment) onto every date of the series. Totals are
+        computed here because bulk_create skips the models' save().
+        """
+        fields = {
+            field.attname: getattr(template, field.attname)
+            for field in template._meta.concrete_fields
+            if not field.primary_key
+        }
+
+        occurrences = []
+        for day in series.occurrence_dates():
+            occurrence = template.__class__(**fields)
+            occurrence.appointment_date = day
+            occurrence.appointment_time = series.appointment_time
+            occurrence.status = 'pending'
+            occurrence.series = series
+            if series.kind == 'service':
+                occurrence.service = template.service
+                effective_price = occurrence.final_price if occurrence.final_price is not None else occurrence.service_price
+                occurrence.total_amount = (effective_price or Decimal('0.00')) + (occurrence.additional_charges or Decimal('0.00'))
+            else:
+                occurrence.total_fee = occurrence.consultation_fee + occurrence.additional_charges
+            occurrences.append(occurrence)
+        return occurrences
+
+    @staticmethod
+    def find_conflicts(series, dates):
+        """
+        Return the subset of `dates` that clash with an existing booking, in
+        a single query covering the whole series.
+        """
+        if series.kind == 'service':
+            # Same slot rules as AppointmentBookingForm, plus the patient's own bookings
+            existing = Appointment.objects.filter(
+                Q(service=series.service) | Q(patient=series.patient),
+                appointment_date__in=dates,
+                appointment_time=series.appointment_time,
+                status__in=RecurringBookingService.ACTIVE_STATUSES,
+            )
+        else:
+            existing = PersonalAppointment.objects.filter(
+                provider=series.provider,
+                appointment_date__in=dates,
+                appointment_time=series.appointment_time,
+                status__in=['pending', 'confirmed'],
+            )
+        return sorted(set(existing.order_by().values_list('appointment_date', flat=True)))
+
+    @staticmethod
+    def create_series(series, template):
+        """
+        Validate and save a series with all its occurrences and their unpaid
+        Payment rows in one transaction. Raises ValidationError listing every
+        conflicting date if any occurrence clashes. Returns the created
+        appointments.
+        """
+        from apps.accounts.models import PatientProfile
+        from apps.payments.models import Payment
+
+        series.full_clean()
+        occurrences = RecurringBookingService.build_occurrences(series, template)
+        if not occurrences:
+            raise ValidationError('This repeat pattern does not produce any appointments.')
+
+        with transaction.atomic():
+            # Check for clashes under the lock so two concurrent series
+            # cannot both pass and double-book the same slots
+            RecurringBookingService.lock_slots(series)
+            conflicts = RecurringBookingService.find_conflicts(
+                series, [occurrence.appointment_date for occurrence in occurrences]
+            )
+            if conflicts:
+                raise ValidationError(
+                    'These dates are no longer available: '
+                    + ', '.join(day.strftime('%Y-%m-%d') for day in conflicts)
+                )
+
+            series.save()
+            for occurrence in occurrences:
+                occurrence.series = series
+
+            if series.kind == 'service':
+                created = Appointment.objects.bulk_create(occurrences)
+                OpenAppointmentRequest.objects.bulk_create(OpenAppointmentRequest.entries_for(created))
+                Payment.objects.bulk_create([
+                    Payment(
+                        appointment=appointment,
+                        patient=series.patient,
+                        amount=appointment.total_amount,
+                        payment_status='unpaid',
+                        source_type='appointment',
+                        source_status=appointment.status,
+                    )
+                    for appointment in created
+                ])
+                PatientProfile.objects.filter(user=series.patient).update(
+                    total_balance=F('total_balance') + sum(a.total_amount for a in created)
+                )
+            else:
+                # Personal bookings carry no appointment link or balance change,
+                # matching book_personal_appointment
+                created = PersonalAppointment.objects.bulk_create(occurrences)
+                Payment.objects.bulk_create([
+                    Payment(
+                        patient=series.patient,
+                        amount=appointment.total_fee,
+                        payment_status='unpaid',
+                    )
+                    for appointment in created
+                ])
+
+        RecurringBookingService.notify_booked(series, created)
+        return created
+
+    @staticmethod
+    def lock_slots(series):
+        """
+        Lock the rows whose slots find_conflicts checks: the patient and the
+        service for service bookings, the provider for personal ones.
+        Must be called inside a transaction.
+        """
+        from apps.accounts.models import User
+        from apps.services.models import Service
+
+        user_ids = [series.patient_id] if series.kind == 'service' else [series.provider_id]
+        list(User.objects.select_for_update().filter(pk__in=user_ids).order_by('pk').values_list('pk', flat=True))
+        if series.kind == 'service':
+            list(Service.objects.select_for_update().filter(pk=series.service_id).order_by().values_list('pk', flat=True))
+
+    @staticmethod
+    def notify_booked(series, created):
+        """One appointment_booked notification per recipient for the whole series."""
+        from apps.notifications.services import NotificationService
+
+        first, last = created[0], created[-1]
+        when = (
+            f"{len(created)} appointments from {first.appointment_date:%Y-%m-%d} to "
+            f"{last.appointment_date:%Y-%m-%d} at {series.appointment_time:%H:%M}"
+        )
+        if series.kind == 'service':
+            entries = [{
+                'user': series.patient,
+                'title': 'Recurring Appointments Booked',
+                'message': f'Your {when} for {series.service.name} have been booked.',
+                'related_object': first,
+                'action_url': reverse('appointments:detail', args=[first.id]),
+            }]
+        else:
+            action_url = reverse('appointments:personal_appointment_detail', args=[first.id])
+            entries = [
+                {
+                    'user': series.patient,
+                    'title': 'Recurring Appointment Requests Sent',
+                    'message': f'Your requests with {series.provider.get_full_name()} for {when} have been sent.',
+                    'related_object': first,
+                    'action_url': action_url,
+                },
+                {
+                    'user': series.provider,
+                    'title': 'New Recurring Appointment Requests',
+                    'message': f'New requests from {series.patient.get_full_name()}: {when}.',
+                    'related_object': first,
+                    'action_url': action_url,
+                },
+            ]
+        NotificationService.send_bulk_notifications(entries, 'appointment_booked')
+
+
+class AppointmentReminderService:
+    """
+    Sends appointment_reminder notifications for upcoming personal
+    appointments and flags them via reminder_sent.
+    """
+
+    REMINDER_STATUSES = ['pending', 'confirmed']
+    DEFAULT_LEAD_HOURS = 24
+    DEFAULT_BATCH_SIZE = 500
+
+    @staticmethod
+    def due_queryset(now=None, lead_hours=DEFAULT_LEAD_HOURS):
+        """
+        Unreminded appointments starting between now and now + lead_hours.
+        The date range and status/flag filters match the
+        (appointment_date, status, reminder_sent) index; the time bounds only
+        apply to the first and last day of the window.
+        """
+        now = timezone.localtime(now or timezone.now())
+        cutoff = now + timedelta(hours=lead_hours)
+        today, last_day = now.date(), cutoff.date()
+
+        window = Q(appointment_date__gt=today, appointment_date__lt=last_day)
+        if today == last_day:
+            window |= Q(appointment_date=today, appointment_time__gte=now.time(), appointment_time__lte=cutoff.time())
+        else:
+            window |= Q(appointment_date=today, appointment_time__gte=now.time())
+            window |= Q(appointment_date=last_day, appointment_time__lte=cutoff.time())
+
+        return PersonalAppointment.objects.filter(
+            window,
+            appointment_date__range=(today, last_day),
+            status__in=AppointmentReminderService.REMINDER_STATUSES,
+            reminder_sent=False,
+        )
+
+    @staticmethod
+    def build_entry(appointment):
+        provider_name = appointment.provider.get_full_name() or appointment.provider.username
+        return {
+            'user': appointment.patient,
+            'title': 'Appointment Reminder',
+            'message': (
+                f"Reminder: your {appointment.get_appointment_type_display()} with {provider_name} "
+                f"is on {appointment.appointment_date:%Y-%m-%d} at {appointment.appointment_time:%H:%M}."
+            ),
+            'related_object': appointment,
+            'action_url': reverse('appointments:personal_appointment_detail', args=[appointment.id]),
+        }
+
+    @staticmethod
+    def send_due_reminders(now=None, lead_hours=DEFAULT_LEAD_HOURS, batch_size=DEFAULT_BATCH_SIZE,
+                           send_sms=False):
+        """
+        Process due reminders in id-ordered batches (keyset pagination), so
+        memory stays bounded by batch_size however many rows are due. Each
+        batch is one select, a bulk notification send and one bulk_update of
+        the flags. Returns the number of reminders sent.
+        """
+        from apps.notifications.services import NotificationService
+
+        due = AppointmentReminderService.due_queryset(now=now, lead_hours=lead_hours).select_related(
+            'patient', 'provider'
+        ).only(
+            'id', 'appointment_type', 'appointment_date', 'appointment_time',
+            'reminder_sent', 'reminder_sent_at',
+            'patient__id', 'patient__username', 'patient__email', 'patient__phone_number',
+            'patient__first_name', 'patient__last_name',
+            'provider__id', 'provider__username', 'provider__first_name', 'provider__last_name',
+        ).order_by('id')
+
+        sent = 0
+        last_id = 0
+        while True:
+            batch = list(due.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1].id
+
+            with transaction.atomic():
+                NotificationService.send_bulk_notifications(
+                    [AppointmentReminderService.build_entry(a) for a in batch],
+                    'appointment_reminder',
+                    send_sms=send_sms,
+                )
+                flagged_at = timezone.now()
+                for appointment in batch:
+                    appointment.reminder_sent = True
+                    appointment.reminder_sent_at = flagged_at
+                PersonalAppointment.objects.bulk_update(batch, ['reminder_sent', 'reminder_sent_at'])
+
+            sent += len(batch)
+
+        return sent
+
+
+class AppointmentTransitionService:
+    """
+    Bulk status changes for service appointments (used by the admin actions).
+    Each transition is one UPDATE followed by one batched side-effect pass:
+    open-queue cleanup, notifications and, for cancellations, payment
+    refunds and patient balance adjustments.
+    """
+
+    confirm = BulkTransition(
+        Appointment, 'confirm', 'confirmed', ['pending'],
+        timestamp_field='confirmed_at', related=['patient', 'provider', 'service'],
+    )
+    complete = BulkTransition(
+        Appointment, 'complete', 'completed', ['confirmed', 'in_progress'],
+        timestamp_field='completed_at', related=['patient', 'provider', 'service'],
+    )
+    cancel = BulkTransition(
+        Appointment, 'cancel', 'cancelled', ['pending', 'confirmed', 'in_progress', 'rejected'],
+        related=['patient', 'provider', 'service'],
+    )
+
+    @staticmethod
+    def notifications_for(transition, appointment):
+        """(notification_type, user, title, message) tuples, as in notifications.signals."""
+        service_name = appointment.service.name
+        if transition.target == 'confirmed':
+            entries = [('appointment_confirmed', appointment.patient, 'Appointment Confirmed',
+                        'Your appointment has been confirmed.'
+                        + (f' Provider: {appointment.provider.get_full_name()}' if appointment.provider else ''))]
+            if appointment.provider:
+                entries.append(('appointment_confirmed', appointment.provider, 'New Appointment Assigned',
+                                f'New appointment assigned: {service_name} on {appointment.appointment_date}'))
+            return entries
+        if transition.target == 'completed':
+            return [('appointment_completed', appointment.patient, 'Appointment Completed',
+                     f'Your appointment for {service_name} has been completed. Thank you!')]
+        if transition.target == 'cancelled':
+            entries = [('appointment_cancelled', appointment.patient, 'Appointment Cancelled',
+                        f'Your appointment for {service_name} has been cancelled.')]
+            if appointment.provider:
+                entries.append(('appointment_cancelled', appointment.provider, 'Appointment Cancelled',
+                                f'Appointment cancelled: {service_name}'))
+            return entries
+        return []
+
+    @staticmethod
+    def release_charges(ids):
+        """
+        Drop the outstanding charge for cancelled appointments: subtract each
+        patient's unpaid/pending payment total from their balance in one
+        correlated UPDATE, then mark those payments refunded in another.
+        """
+        from apps.accounts.models import PatientProfile
+        from apps.payments.models import Payment
+
+        outstanding = Payment.objects.filter(
+            appointment_id__in=ids, payment_status__in=['unpaid', 'pending']
+        )
+        per_patient = outstanding.filter(patient_id=OuterRef('user_id')).order_by().values(
+            'patient_id'
+        ).annotate(total=Sum('amount')).values('total')
+
+        PatientProfile.objects.filter(
+            user_id__in=outstanding.values('patient_id')
+        ).update(
+            total_balance=F('total_balance') - Coalesce(Subquery(per_patient), Decimal('0.00'))
+        )
+        outstanding.update(payment_status='refunded', updated_at=timezone.now())
+
+    @staticmethod
+    def on_transition(sender, transition, instances, previous, actor=None, **kwargs):
+        ids = [appointment.id for appointment in instances]
+        # update() bypasses Appointment.save, so keep the open queue in step here
+        OpenAppointmentRequest.objects.filter(appointment_id__in=ids).delete()
+
+        if transition.target == 'cancelled':
+            AppointmentTransitionService.release_charges(ids)
+
+        AppointmentTransitionService.notify(transition, instances)
+
+    @staticmethod
+    def notify(transition, instances):
+        """Send the transition's notifications for `instances` as one bulk send per type."""
+        from apps.notifications.services import NotificationService
+
+        grouped = defaultdict(list)
+        for appointment in instances:
+            for notification_type, user, title, message in AppointmentTransitionService.notifications_for(
+                transition, appointment
+            ):
+                grouped[notification_type].append({
+                    'user': user,
+                    'title': title,
+                    'message': message,
+                    'related_object': appointment,
+                    'action_url': reverse('appointments:detail', args=[appointment.id]),
+                })
+        for notification_type, entries in grouped.items():
+            NotificationService.send_bulk_notifications(entries, notification_type)
+
+
+transition_applied.connect(
+    AppointmentTransitionService.on_transition,
+    sender=Appointment,
+    dispatch_uid='appointments.bulk_transition',
+)
+
+
+def _specialization_mapping_changed(sender, instance, raw=False, **kwargs):
+    # Queue rows are derived from the mapping, so rebuild the category's open requests
+    if not raw:
+        OpenAppointmentRequest.sync_categories([instance.category_id])
+
+
+post_save.connect(
+    _specialization_mapping_changed,
+    sender='services.SpecializationCategory',
+    dispatch_uid='appointments.open_queue.mapping_saved',
+)
+post_delete.connect(
+    _specialization_mapping_changed,
+    sender='services.SpecializationCategory',
+    dispatch_uid='appointments.open_queue.mapping_deleted',
+)
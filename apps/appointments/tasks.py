@@ -0,0 +1,20 @@
+from celery import shared_task
+
+
+@shared_task
+def assign_pending_providers(limit=None):
+    from apps.appointments.services import ProviderAssignmentService
+
+    report = ProviderAssignmentService.run(limit=limit)
+    return {
+        'considered': report['considered'],
+        'assigned': report['committed'],
+        'unassigned': len(report['unassigned']),
+    }
+
+
+@shared_task
+def send_appointment_reminders(lead_hours=24):
+    from apps.appointments.services import AppointmentReminderService
+
+    return AppointmentReminderService.send_due_reminders(lead_hours=lead_hours)
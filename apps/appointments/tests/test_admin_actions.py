@@ -0,0 +1,68 @@
+from datetime import time, timedelta
+from decimal import Decimal
+
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.accounts.models import User
+from apps.appointments.models import Appointment, PersonalAppointment
+from apps.payments.models import Payment
+from apps.services.models import Service, ServiceCategory
+
+
+class PersonalAppointmentAdminActionsTestCase(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin1', password='pass', email='admin@example.com')
+        self.patient = User.objects.create_user(username='patient1', password='pass', role='patient')
+        self.provider = User.objects.create_user(username='provider1', password='pass', role='provider')
+        self.client.force_login(self.admin)
+
+        self.personal = PersonalAppointment.objects.create(
+            patient=self.patient, provider=self.provider, appointment_type='consultation',
+            appointment_date=timezone.localdate() + timedelta(days=2), appointment_time=time(10, 0),
+            reason='Checkup', status='pending',
+        )
+        # A service appointment sharing the personal appointment's id, with a payment
+        category = ServiceCategory.objects.create(name='Nursing')
+        service = Service.objects.create(
+            name='Home care', category=category, slug='home-care', description='Care',
+            base_price=Decimal('1000.00'), what_included='Care',
+        )
+        self.appointment = Appointment.objects.create(
+            id=self.personal.id, patient=self.patient, service=service,
+            appointment_date=timezone.localdate() + timedelta(days=2), appointment_time=time(10, 0),
+            status='pending', service_price=Decimal('1000.00'), total_amount=Decimal('1000.00'),
+            service_address='Home',
+        )
+        self.payment = Payment.objects.create(
+            appointment=self.appointment, patient=self.patient, amount=Decimal('1000.00'), payment_status='unpaid'
+        )
+
+    def act(self, action):
+        return self.client.post(reverse('admin:appointments_personalappointment_changelist'), {
+            'action': action, '_selected_action': [self.personal.id],
+        })
+
+    def test_actions_update_personal_appointments_only(self):
+        self.assertEqual(self.act('mark_as_confirmed').status_code, 302)
+        self.personal.refresh_from_db()
+        self.assertEqual(self.personal.status, 'confirmed')
+        self.assertIsNotNone(self.personal.confirmed_at)
+
+        self.act('mark_as_completed')
+        self.personal.refresh_from_db()
+        self.assertEqual(self.personal.status, 'completed')
+
+        self.appointment.refresh_from_db()
+        self.payment.refresh_from_db()
+        self.assertEqual(self.appointment.status, 'pending')
+        self.assertEqual(self.payment.source_status, 'pending')
+
+    def test_cancel_skips_completed(self):
+        PersonalAppointment.objects.filter(pk=self.personal.pk).update(status='completed')
+
+        self.act('mark_as_cancelled')
+
+        self.personal.refresh_from_db()
+        self.assertEqual(self.personal.status, 'completed')
@@ -0,0 +1,117 @@
+from django.test import TestCase
+from django.utils import timezone
+from datetime import time, timedelta
+from decimal import Decimal
+
+from apps.accounts.models import User, ProviderProfile
+from apps.appointments.models import Appointment, OpenAppointmentRequest, ProviderSchedule
+from apps.appointments.services import ProviderAssignmentService
+from apps.notifications.models import Notification
+from apps.services.models import Service, ServiceCategory, SpecializationCategory
+
+
+class ProviderAssignmentServiceTestCase(TestCase):
+    def setUp(self):
+        self.patient = User.objects.create_user(username='patient1', password='pass', role='patient')
+        self.day = timezone.now().date() + timedelta(days=7)
+
+        category = ServiceCategory.objects.create(name='Nursing Care')
+        SpecializationCategory.objects.create(specialization='nursing', category=category)
+        self.service = Service.objects.create(
+            name='Home Nursing',
+            category=category,
+            slug='home-nursing',
+            description='Nursing at home',
+            base_price=Decimal('1000.00'),
+            what_included='Care',
+        )
+
+        self.busy_nurse = self._provider('nurse1', 'nursing', '4.50', 'LIC1')
+        self.free_nurse = self._provider('nurse2', 'nursing', '3.00', 'LIC2')
+        self.physio = self._provider('physio1', 'physiotherapy', '5.00', 'LIC3')
+
+        # busy_nurse already has a visit that morning
+        self._book(time(9, 0), provider=self.busy_nurse, status='confirmed')
+
+    def _provider(self, username, specialization, rating, license_number):
+        user = User.objects.create_user(username=username, password='pass', role='provider')
+        ProviderProfile.objects.create(
+            user=user, specialization=specialization, rating=Decimal(rating), license_number=license_number
+        )
+        ProviderSchedule.objects.create(
+            provider=user, day_of_week=self.day.weekday(), start_time=time(8, 0), end_time=time(17, 0)
+        )
+        return user
+
+    def _book(self, at, **kwargs):
+        return Appointment.objects.create(
+            patient=self.patient,
+            service=self.service,
+            appointment_date=self.day,
+            appointment_time=at,
+            service_price=self.service.base_price,
+            total_amount=self.service.base_price,
+            service_address='Patient home address',
+            **kwargs
+        )
+
+    def test_assigns_least_loaded_matching_provider(self):
+        appointment = self._book(time(11, 0))
+
+        report = ProviderAssignmentService.run()
+
+        self.assertEqual(report['committed'], 1)
+        appointment.refresh_from_db()
+        self.assertEqual(appointment.provider, self.free_nurse)
+        self.assertEqual(appointment.status, 'confirmed')
+        self.assertFalse(OpenAppointmentRequest.objects.filter(appointment=appointment).exists())
+
+    def test_overlapping_appointments_go_to_different_providers(self):
+        first = self._book(time(13, 0))
+        second = self._book(time(13, 0))
+
+        ProviderAssignmentService.run()
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual({first.provider, second.provider}, {self.busy_nurse, self.free_nurse})
+
+    def test_outside_working_window_is_left_unassigned(self):
+        appointment = self._book(time(18, 0))
+
+        report = ProviderAssignmentService.run()
+
+        self.assertEqual(report['committed'], 0)
+        self.assertEqual(report['unassigned'][0], (appointment, 'no available provider'))
+
+    def test_dry_run_does_not_save(self):
+        appointment = self._book(time(11, 0))
+
+        report = ProviderAssignmentService.run(dry_run=True)
+
+        self.assertEqual(len(report['assignments']), 1)
+        appointment.refresh_from_db()
+        self.assertIsNone(appointment.provider)
+        self.assertEqual(appointment.status, 'pending')
+
+    def test_commit_notifies_patient_and_provider(self):
+        appointment = self._book(time(11, 0))
+
+        ProviderAssignmentService.run()
+
+        notified = set(Notification.objects.filter(
+            notification_type='appointment_confirmed', object_id=appointment.id
+        ).values_list('user_id', flat=True))
+        self.assertEqual(notified, {self.patient.id, self.free_nurse.id})
+
+    def test_past_dated_requests_are_not_assigned(self):
+        self.day = timezone.localdate() - timedelta(days=7)
+        stale = self._book(time(11, 0))
+
+        report = ProviderAssignmentService.run()
+
+        seen = [a for a, _ in report['assignments']] + [a for a, _ in report['unassigned']]
+        self.assertNotIn(stale, seen)
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, 'pending')
+        self.assertIsNone(stale.provider)
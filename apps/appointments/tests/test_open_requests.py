@@ -0,0 +1,85 @@
+from django.test import TestCase
+from django.utils import timezone
+from decimal import Decimal
+
+from apps.accounts.models import ProviderProfile, User
+from apps.appointments.models import Appointment, OpenAppointmentRequest
+from apps.services.models import Service, ServiceCategory, SpecializationCategory
+
+
+class OpenAppointmentRequestTestCase(TestCase):
+    def setUp(self):
+        self.patient = User.objects.create_user(username='patient1', password='pass', role='patient')
+        self.provider = User.objects.create_user(username='provider1', password='pass', role='provider')
+
+        self.category = category = ServiceCategory.objects.create(name='Nursing Care')
+        SpecializationCategory.objects.create(specialization='nursing', category=category)
+        SpecializationCategory.objects.create(specialization='geriatric', category=category)
+        self.service = Service.objects.create(
+            name='Home Nursing',
+            category=category,
+            slug='home-nursing',
+            description='Nursing at home',
+            base_price=Decimal('1000.00'),
+            what_included='Care',
+        )
+
+    def _book(self, **kwargs):
+        return Appointment.objects.create(
+            patient=self.patient,
+            service=self.service,
+            appointment_date=timezone.now().date(),
+            appointment_time=timezone.now().time(),
+            service_price=self.service.base_price,
+            total_amount=self.service.base_price,
+            service_address='Patient home address',
+            **kwargs
+        )
+
+    def test_pending_appointment_is_queued_per_specialization(self):
+        appointment = self._book()
+        specializations = set(
+            appointment.open_requests.values_list('specialization', flat=True)
+        )
+        self.assertEqual(specializations, {'nursing', 'geriatric'})
+
+    def test_assigning_provider_removes_queue_rows(self):
+        appointment = self._book()
+        appointment.provider = self.provider
+        appointment.status = 'confirmed'
+        appointment.save()
+        self.assertFalse(OpenAppointmentRequest.objects.filter(appointment=appointment).exists())
+
+    def test_cancelling_removes_queue_rows(self):
+        appointment = self._book()
+        appointment.status = 'cancelled'
+        appointment.save()
+        self.assertFalse(OpenAppointmentRequest.objects.filter(appointment=appointment).exists())
+
+    def test_assigned_appointment_is_not_queued(self):
+        self._book(provider=self.provider, status='confirmed')
+        self.assertEqual(OpenAppointmentRequest.objects.count(), 0)
+
+    def test_mapping_changes_resync_existing_rows(self):
+        appointment = self._book()
+
+        SpecializationCategory.objects.create(specialization='wound_care', category=self.category)
+        SpecializationCategory.objects.filter(specialization='nursing').get().delete()
+
+        specializations = set(appointment.open_requests.values_list('specialization', flat=True))
+        self.assertEqual(specializations, {'geriatric', 'wound_care'})
+
+    def test_unmapped_category_is_offered_to_every_specialization(self):
+        category = ServiceCategory.objects.create(name='Companionship')
+        self.service = Service.objects.create(
+            name='Visits', category=category, slug='visits', description='Company',
+            base_price=Decimal('500.00'), what_included='Visits',
+        )
+
+        appointment = self._book()
+
+        specializations = set(appointment.open_requests.values_list('specialization', flat=True))
+        self.assertEqual(specializations, {code for code, _ in ProviderProfile.SPECIALIZATION_CHOICES})
+
+        SpecializationCategory.objects.create(specialization='general', category=category)
+        self.assertEqual(list(appointment.open_requests.values_list('specialization', flat=True)), ['general'])
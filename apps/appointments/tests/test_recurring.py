@@ -0,0 +1,118 @@
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ValidationError
+from django.test import TestCase
+from datetime import date, time, timedelta
+from decimal import Decimal
+
+from apps.accounts.models import User, PatientProfile
+from apps.appointments.models import Appointment, AppointmentSeries, OpenAppointmentRequest
+from apps.appointments.services import RecurringBookingService
+from apps.notifications.models import Notification
+from apps.payments.models import Payment
+from apps.services.models import Service, ServiceCategory, SpecializationCategory
+
+
+class AppointmentSeriesExpansionTestCase(TestCase):
+    def test_weekly_by_weekday(self):
+        # 2030-01-07 is a Monday
+        series = AppointmentSeries(
+            frequency='weekly', by_weekday='0,3', start_date=date(2030, 1, 7),
+            count=4, appointment_time=time(10, 0)
+        )
+        self.assertEqual(series.occurrence_dates(), [
+            date(2030, 1, 7), date(2030, 1, 10), date(2030, 1, 14), date(2030, 1, 17)
+        ])
+
+    def test_interval_and_until(self):
+        series = AppointmentSeries(
+            frequency='daily', interval=3, start_date=date(2030, 1, 1),
+            until=date(2030, 1, 10), appointment_time=time(10, 0)
+        )
+        self.assertEqual(series.occurrence_dates(), [
+            date(2030, 1, 1), date(2030, 1, 4), date(2030, 1, 7), date(2030, 1, 10)
+        ])
+
+    def test_monthly_skips_missing_days(self):
+        series = AppointmentSeries(
+            frequency='monthly', start_date=date(2030, 1, 31), count=3, appointment_time=time(10, 0)
+        )
+        self.assertEqual(series.occurrence_dates(), [
+            date(2030, 1, 31), date(2030, 3, 31), date(2030, 5, 31)
+        ])
+
+    def test_capped_without_count_or_until(self):
+        series = AppointmentSeries(frequency='daily', start_date=date(2030, 1, 1), appointment_time=time(10, 0))
+        self.assertEqual(len(series.occurrence_dates()), AppointmentSeries.MAX_OCCURRENCES)
+
+
+class RecurringBookingServiceTestCase(TestCase):
+    def setUp(self):
+        self.patient = User.objects.create_user(username='patient1', password='pass', role='patient')
+        PatientProfile.objects.get_or_create(user=self.patient)
+
+        category = ServiceCategory.objects.create(name='Physiotherapy')
+        SpecializationCategory.objects.create(specialization='physiotherapy', category=category)
+        self.service = Service.objects.create(
+            name='Home Physio',
+            category=category,
+            slug='home-physio',
+            description='Physio at home',
+            base_price=Decimal('800.00'),
+            what_included='Session',
+        )
+        self.start = date.today() + timedelta(days=7)
+
+    def _series_and_template(self, count=4):
+        series = AppointmentSeries(
+            patient=self.patient, kind='service', service=self.service,
+            frequency='weekly', count=count, start_date=self.start, appointment_time=time(10, 0)
+        )
+        template = Appointment(
+            patient=self.patient,
+            service=self.service,
+            appointment_date=self.start,
+            appointment_time=time(10, 0),
+            service_price=self.service.base_price,
+            total_amount=self.service.base_price,
+            service_address='Patient home address',
+        )
+        return series, template
+
+    def test_creates_appointments_payments_and_balance_in_bulk(self):
+        series, template = self._series_and_template()
+
+        ContentType.objects.clear_cache()
+        # Validation, row locks and conflict check, one insert per table and a
+        # single notification send, regardless of length (email goes out on commit)
+        with self.assertNumQueries(17):
+            created = RecurringBookingService.create_series(series, template)
+
+        self.assertEqual(len(created), 4)
+        self.assertEqual(series.appointments.count(), 4)
+        self.assertEqual(Payment.objects.filter(appointment__series=series).count(), 4)
+        self.assertEqual(OpenAppointmentRequest.objects.filter(appointment__series=series).count(), 4)
+        self.patient.patient_profile.refresh_from_db()
+        self.assertEqual(self.patient.patient_profile.total_balance, Decimal('3200.00'))
+        notification = Notification.objects.get(user=self.patient, notification_type='appointment_booked')
+        self.assertEqual(notification.object_id, created[0].id)
+        self.assertIn('4 appointments', notification.message)
+
+    def test_conflict_rejects_whole_series(self):
+        taken = self.start + timedelta(weeks=2)
+        Appointment.objects.create(
+            patient=User.objects.create_user(username='other', password='pass', role='patient'),
+            service=self.service,
+            appointment_date=taken,
+            appointment_time=time(10, 0),
+            service_price=self.service.base_price,
+            total_amount=self.service.base_price,
+            service_address='Elsewhere',
+        )
+        series, template = self._series_and_template()
+
+        with self.assertRaises(ValidationError) as ctx:
+            RecurringBookingService.create_series(series, template)
+
+        self.assertIn(taken.strftime('%Y-%m-%d'), str(ctx.exception))
+        self.assertFalse(AppointmentSeries.objects.exists())
+        self.assertEqual(Appointment.objects.count(), 1)
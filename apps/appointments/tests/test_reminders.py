@@ -0,0 +1,59 @@
+from django.core import mail
+from django.test import TestCase
+from django.utils import timezone
+from datetime import timedelta
+
+from apps.accounts.models import User
+from apps.appointments.models import PersonalAppointment
+from apps.appointments.services import AppointmentReminderService
+from apps.notifications.models import Notification, EmailLog
+
+
+class AppointmentReminderServiceTestCase(TestCase):
+    def setUp(self):
+        self.patient = User.objects.create_user(
+            username='patient1', email='patient1@example.com', password='pass', role='patient'
+        )
+        self.provider = User.objects.create_user(username='provider1', password='pass', role='provider')
+        self.now = timezone.localtime()
+
+    def _appointment(self, starts_in, **kwargs):
+        when = self.now + starts_in
+        return PersonalAppointment.objects.create(
+            patient=self.patient,
+            provider=self.provider,
+            appointment_type='consultation',
+            appointment_date=when.date(),
+            appointment_time=when.time().replace(microsecond=0),
+            reason='Checkup',
+            **kwargs
+        )
+
+    def test_sends_due_reminders_in_batches(self):
+        due = [self._appointment(timedelta(hours=h)) for h in (2, 5, 20)]
+        later = self._appointment(timedelta(hours=30))
+        cancelled = self._appointment(timedelta(hours=3), status='cancelled_by_patient')
+        already = self._appointment(timedelta(hours=4), reminder_sent=True)
+
+        # Emails go out once each batch's transaction commits
+        with self.captureOnCommitCallbacks(execute=True):
+            sent = AppointmentReminderService.send_due_reminders(now=self.now, batch_size=2)
+
+        self.assertEqual(sent, 3)
+        self.assertEqual(
+            set(PersonalAppointment.objects.filter(reminder_sent=True, reminder_sent_at__isnull=False).values_list('id', flat=True)),
+            {a.id for a in due}
+        )
+        self.assertEqual(Notification.objects.filter(notification_type='appointment_reminder').count(), 3)
+        self.assertEqual(EmailLog.objects.filter(status='sent').count(), 3)
+        self.assertEqual(len(mail.outbox), 3)
+        later.refresh_from_db()
+        cancelled.refresh_from_db()
+        self.assertFalse(later.reminder_sent)
+        self.assertFalse(cancelled.reminder_sent)
+        self.assertIsNone(already.reminder_sent_at)
+
+    def test_second_run_sends_nothing(self):
+        self._appointment(timedelta(hours=2))
+        AppointmentReminderService.send_due_reminders(now=self.now)
+        self.assertEqual(AppointmentReminderService.send_due_reminders(now=self.now), 0)
@@ -0,0 +1,32 @@
+from datetime import date, time
+
+from django.test import TestCase
+
+from apps.accounts.models import User
+from apps.appointments.models import AppointmentReview, PersonalAppointment
+
+
+class PersonalAppointmentQuerySetTestCase(TestCase):
+    def setUp(self):
+        self.patient = User.objects.create_user(username='patient1', password='pass', role='patient')
+        self.provider = User.objects.create_user(username='provider1', password='pass', role='provider')
+
+    def test_with_review_state_is_one_query(self):
+        appointments = [
+            PersonalAppointment.objects.create(
+                patient=self.patient,
+                provider=self.provider,
+                appointment_type='consultation',
+                appointment_date=date(2030, 1, day),
+                appointment_time=time(10, 0),
+                reason='Checkup',
+                status='completed',
+            )
+            for day in (1, 2, 3)
+        ]
+        AppointmentReview.objects.create(appointment=appointments[0], rating=5, review_text='Great')
+
+        with self.assertNumQueries(1):
+            flags = {a.pk: a.has_review for a in PersonalAppointment.objects.with_review_state()}
+
+        self.assertEqual(flags, {appointments[0].pk: True, appointments[1].pk: False, appointments[2].pk: False})
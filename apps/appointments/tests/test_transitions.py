@@ -0,0 +1,93 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from datetime import timedelta
+from decimal import Decimal
+
+from apps.accounts.models import User, PatientProfile
+from apps.appointments.models import Appointment, OpenAppointmentRequest
+from apps.appointments.services import AppointmentTransitionService
+from apps.notifications.models import Notification
+from apps.payments.models import Payment
+from apps.services.models import Service, ServiceCategory, SpecializationCategory
+
+
+class AppointmentTransitionServiceTestCase(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin1', password='pass', role='admin', is_staff=True)
+        self.provider = User.objects.create_user(username='provider1', password='pass', role='provider')
+        category = ServiceCategory.objects.create(name='Nursing Care')
+        SpecializationCategory.objects.create(specialization='nursing', category=category)
+        self.service = Service.objects.create(
+            name='Home Nursing',
+            category=category,
+            slug='home-nursing',
+            description='Nursing at home',
+            base_price=Decimal('1000.00'),
+            what_included='Care',
+        )
+        self.patients = []
+        for i in range(3):
+            patient = User.objects.create_user(username=f'patient{i}', password='pass', role='patient')
+            profile, _ = PatientProfile.objects.get_or_create(user=patient)
+            profile.total_balance = Decimal('1000.00')
+            profile.save()
+            self.patients.append(patient)
+
+    def _book(self, patient, **kwargs):
+        appointment = Appointment.objects.create(
+            patient=patient,
+            service=self.service,
+            appointment_date=timezone.now().date() + timedelta(days=3),
+            appointment_time=timezone.now().time(),
+            service_price=self.service.base_price,
+            total_amount=self.service.base_price,
+            service_address='Patient home address',
+            **kwargs
+        )
+        Payment.objects.create(appointment=appointment, patient=patient, amount=appointment.total_amount)
+        return appointment
+
+    def test_cancel_releases_charges_queue_and_notifies(self):
+        appointments = [self._book(patient) for patient in self.patients]
+        paid = appointments[0].payments.get()
+        paid.payment_status = 'paid'
+        paid.save()
+
+        cancelled = AppointmentTransitionService.cancel.apply(
+            Appointment.objects.all(), actor=self.admin
+        )
+
+        self.assertEqual(len(cancelled), 3)
+        self.assertFalse(Appointment.objects.exclude(status='cancelled').exists())
+        self.assertFalse(OpenAppointmentRequest.objects.exists())
+        balances = dict(PatientProfile.objects.values_list('user_id', 'total_balance'))
+        # Paid appointment keeps its balance; unpaid ones drop the charge
+        self.assertEqual(balances[self.patients[0].id], Decimal('1000.00'))
+        self.assertEqual(balances[self.patients[1].id], Decimal('0.00'))
+        self.assertEqual(Payment.objects.filter(payment_status='refunded').count(), 2)
+        self.assertEqual(Notification.objects.filter(notification_type='appointment_cancelled').count(), 3)
+
+    def test_query_count_does_not_grow_with_batch(self):
+        def run(count):
+            Appointment.objects.all().delete()
+            for i in range(count):
+                self._book(self.patients[i % 3], provider=self.provider)
+            with CaptureQueriesContext(connection) as ctx:
+                AppointmentTransitionService.confirm.apply(Appointment.objects.all())
+            return len(ctx.captured_queries)
+
+        self.assertEqual(run(2), run(6))
+
+    def test_only_source_states_transition(self):
+        pending = self._book(self.patients[0])
+        done = self._book(self.patients[1], status='completed')
+
+        AppointmentTransitionService.confirm.apply(Appointment.objects.all())
+
+        pending.refresh_from_db()
+        done.refresh_from_db()
+        self.assertEqual(pending.status, 'confirmed')
+        self.assertIsNotNone(pending.confirmed_at)
+        self.assertEqual(done.status, 'completed')
@@ -7,16 +7,19 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.db import transaction
 from django.utils import timezone
-from django.core.exceptions import PermissionDenied
+from django.core.exceptions import PermissionDenied, ValidationError
 from datetime import datetime, timedelta
 
-from .models import Appointment
+from .models import Appointment, AppointmentSeries
 from apps.services.models import Service
 from apps.payments.models import Payment
 from .forms import AppointmentBookingForm
+from .services import RecurringBookingService
+from config.idempotency import idempotent
 
 
 @login_required
+@idempotent
 def book_appointment(request, service_id):
     """
     Book a new appointment for a service
@@ -68,6 +71,25 @@ def book_appointment(request, service_id):
                         appointment.additional_charges
                     )
                     
+                    if form.cleaned_data.get('repeat_frequency'):
+                        # Recurring booking: every visit, payment and the
+                        # balance update are written in bulk by the service
+                        series = AppointmentSeries(
+                            patient=request.user,
+                            kind='service',
+                            service=service,
+                            frequency=form.cleaned_data['repeat_frequency'],
+                            count=form.cleaned_data['repeat_count'],
+                            start_date=appointment.appointment_date,
+                            appointment_time=appointment.appointment_time,
+                        )
+                        created = RecurringBookingService.create_series(series, appointment)
+                        messages.success(
+                            request,
+                            f'{len(created)} appointments booked successfully! First reference: #{created[0].id}'
+                        )
+                        return redirect('appointments:confirmation', appointment_id=created[0].id)
+
                     appointment.save()
                     
                     # Create payment record. Do NOT allow selecting payment method
@@ -92,6 +114,9 @@ def book_appointment(request, service_id):
                     )
                     return redirect('appointments:confirmation', appointment_id=appointment.id)
                     
+            except ValidationError as e:
+                form.add_error(None, e)
+                messages.error(request, 'Please correct the errors below.')
             except Exception as e:
                 messages.error(request, f'Error booking appointment: {str(e)}')
         else:
@@ -149,12 +174,12 @@ def my_appointments(request):
     if request.user.role == 'patient':
         appointments = Appointment.objects.filter(
             patient=request.user
-        ).select_related('service', 'provider').order_by('-appointment_date', '-appointment_time')
+        ).select_related('service__category', 'provider').order_by('-appointment_date', '-appointment_time')
         
     elif request.user.role == 'provider':
         appointments = Appointment.objects.filter(
             provider=request.user
-        ).select_related('service', 'patient').order_by('-appointment_date', '-appointment_time')
+        ).select_related('service__category', 'patient').order_by('-appointment_date', '-appointment_time')
         
     else:
         messages.error(request, 'Invalid user role.')
@@ -323,16 +348,16 @@ def accept_appointment(request, appointment_id):
     if request.user.role != 'provider':
         raise PermissionDenied("Only providers can accept appointments.")
     
-    appointment = get_object_or_404(
-        Appointment,
-        id=appointment_id,
-        status='pending'
-    )
-    
     # Check if provider is available
     # (Add availability check logic here if implemented)
     
     with transaction.atomic():
+        # Lock the row so two providers cannot claim the same request
+        appointment = get_object_or_404(
+            Appointment.objects.select_for_update(),
+            id=appointment_id,
+            status='pending'
+        )
         appointment.provider = request.user
         appointment.status = 'confirmed'
         appointment.confirmed_at = timezone.now()
@@ -0,0 +1,87 @@
+"""
+UH Care - Dashboard metric services
+"""
+
+from django.db.models import Sum, Count, Q, Exists, OuterRef
+from datetime import timedelta
+from decimal import Decimal
+
+from apps.appointments.models import Appointment
+from apps.payments.models import Payment
+from apps.equipment.models import EquipmentPurchase, EquipmentRental
+from apps.pharmacy.models import PharmacyOrderActivity, PharmacyOrder
+
+
+class ProviderMetricsService:
+    """
+    Aggregated statistics and scoped activity for the provider dashboard
+    """
+
+    @staticmethod
+    def get_appointment_metrics(provider, today):
+        """
+        Compute every provider appointment count and hour sum in a single
+        conditional-aggregate query.
+        """
+        this_week_start = today - timedelta(days=today.weekday())
+        this_month_start = today.replace(day=1)
+
+        completed = Q(status='completed')
+        this_month = Q(appointment_date__gte=this_month_start)
+
+        metrics = Appointment.objects.filter(provider=provider).aggregate(
+            total_appointments=Count('id'),
+            completed_appointments=Count('id', filter=completed),
+            today_appointments=Count('id', filter=Q(appointment_date=today)),
+            this_week_appointments=Count(
+                'id',
+                filter=Q(appointment_date__gte=this_week_start, appointment_date__lte=today)
+            ),
+            this_month_appointments=Count('id', filter=this_month),
+            total_hours=Sum('duration_hours', filter=completed),
+            this_month_hours=Sum('duration_hours', filter=completed & this_month),
+        )
+
+        # Sums come back as None when there are no matching rows
+        metrics['total_hours'] = metrics['total_hours'] or Decimal('0')
+        metrics['this_month_hours'] = metrics['this_month_hours'] or Decimal('0')
+        return metrics
+
+    @staticmethod
+    def patient_scope(provider, outer_ref):
+        """
+        Correlated EXISTS filter matching rows whose `outer_ref` user has
+        booked with this provider. Used instead of materializing the list of
+        patient ids so the database can resolve the scope with an index.
+        """
+        return Exists(
+            Appointment.objects.filter(provider=provider, patient=OuterRef(outer_ref))
+        )
+
+    @staticmethod
+    def get_recent_activity(provider):
+        """
+        Recent purchases, rentals, pharmacy orders/activities and payments
+        from patients who booked with this provider.
+        """
+        scope = ProviderMetricsService.patient_scope
+
+        return {
+            'recent_purchases': EquipmentPurchase.objects.filter(
+                scope(provider, 'customer')
+            ).select_related('equipment', 'customer').order_by('-created_at')[:6],
+            'recent_rentals': EquipmentRental.objects.filter(
+                scope(provider, 'customer')
+            ).select_related('equipment', 'customer').order_by('-created_at')[:6],
+            'recent_pharmacy_orders': PharmacyOrder.objects.filter(
+                scope(provider, 'customer')
+            ).select_related('customer').order_by('-created_at')[:6],
+            'recent_pharmacy_activities': PharmacyOrderActivity.objects.filter(
+                scope(provider, 'order__customer')
+            ).select_related('order', 'actor').order_by('-created_at')[:8],
+            'recent_payments': Payment.objects.filter(
+                scope(provider, 'patient') | Q(appointment__provider=provider)
+            ).select_related(
+                'appointment', 'pharmacy_order', 'equipment_purchase', 'equipment_rental', 'patient'
+            ).order_by('-created_at')[:8],
+        }
@@ -0,0 +1,56 @@
+import json
+
+import pytest
+from django.urls import reverse
+
+from utils import metrics
+
+
+@pytest.fixture
+def local_metrics(settings, tmp_path):
+    settings.METRICS_BACKEND = 'local'
+    settings.METRICS_DIR = str(tmp_path)
+    settings.METRICS_FLUSH_SECONDS = 0
+    settings.STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
+    metrics.reset_backend()
+    yield tmp_path
+    metrics.reset_backend()
+
+
+@pytest.fixture
+def staff(django_user_model):
+    return django_user_model.objects.create_user(username='staff1', password='pass', role='admin', is_staff=True)
+
+
+def test_requests_are_exported_per_view(client, staff, local_metrics):
+    client.get(reverse('blog:list'))
+    client.get(reverse('blog:list'))
+    client.force_login(staff)
+
+    body = client.get(reverse('metrics')).content.decode()
+
+    assert '# TYPE uhcare_request_duration_seconds histogram' in body
+    assert 'uhcare_requests_total{method="GET",status="200",view="blog:list"} 2' in body
+    assert 'uhcare_request_duration_seconds_bucket{le="+Inf",view="blog:list"} 2' in body
+    assert 'uhcare_request_db_queries_count{view="blog:list"} 2' in body
+    assert 'uhcare_request_template_seconds_sum{view="blog:list"}' in body
+    assert 'uhcare_response_size_bytes_sum{view="blog:list"}' in body
+
+
+def test_local_backend_sums_worker_files(local_metrics):
+    key = metrics._key('uhcare_requests_total', {'view': 'blog:list', 'method': 'GET', 'status': '200'})
+    (local_metrics / '1.json').write_text(json.dumps({key: 3}))
+    (local_metrics / '2.json').write_text(json.dumps({key: 4}))
+
+    assert metrics.get_backend().collect()[key] == 7
+
+
+def test_metrics_requires_staff_or_token(client, django_user_model, local_metrics, settings):
+    settings.METRICS_TOKEN = 'scrape-secret'
+    patient = django_user_model.objects.create_user(username='patient1', password='pass', role='patient')
+
+    assert client.get(reverse('metrics')).status_code == 403
+    assert client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong').status_code == 403
+    assert client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape-secret').status_code == 200
+    client.force_login(patient)
+    assert client.get(reverse('metrics')).status_code == 403
@@ -0,0 +1,393 @@
+"""
+Query budgets for the read and write views.
+
+Every listing is seeded with several rows per relation, so a loop that
+queries once per row pushes the view over its budget in
+config/query_budgets.py and fails here. Write views are posted inside a
+rolled-back transaction so each one sees the same seeded data.
+"""
+from datetime import time, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.apps import apps as django_apps
+from django.contrib.contenttypes.models import ContentType
+from django.core.paginator import Page
+from django.db import transaction
+from django.db.models import QuerySet
+from django.http import HttpResponse
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.accounts.models import PatientProfile, ProviderProfile, User
+from apps.appointments.models import Appointment, PersonalAppointment, ProviderSchedule
+from apps.blog.models import Post
+from apps.equipment.models import Equipment, EquipmentCategory, EquipmentPurchase, EquipmentRental
+from apps.notifications.models import Notification
+from apps.payments.models import Payment
+from apps.payments.services import PaymentQRService
+from apps.pharmacy.models import Cart, CartItem, Medicine, MedicineCategory, PharmacyOrder, PharmacyOrderItem
+from apps.services.models import Service, ServiceCategory, Wishlist
+from config.query_budgets import QUERY_BUDGETS, named_urls
+from utils.query_budget import QueryRecorder, fingerprint
+
+ROWS = 5
+
+# (url name, logged-in user key or None, reverse() args as keys of self.data)
+READ_VIEWS = [
+    ('accounts:home', None, []),
+    ('accounts:about', None, []),
+    ('login', None, []),
+    ('password_reset', None, []),
+    ('password_reset_done', None, []),
+    ('password_reset_confirm', None, ['reset_uid', 'reset_token']),
+    ('password_reset_complete', None, []),
+    ('accounts:login', None, []),
+    ('accounts:register_patient', None, []),
+    ('accounts:register_provider', None, []),
+    ('accounts:contact', None, []),
+    ('services:list', None, []),
+    ('services:list_by_category', None, ['service_category_slug']),
+    ('services:detail', None, ['service_slug']),
+    ('pharmacy:list', None, []),
+    ('pharmacy:list_by_category', None, ['medicine_category_slug']),
+    ('pharmacy:detail', None, ['medicine_slug']),
+    ('equipment:list', None, []),
+    ('equipment:list_by_category', None, ['equipment_category_slug']),
+    ('equipment:detail', None, ['equipment_slug']),
+    ('accounts:profile', 'patient', []),
+    ('accounts:change_password', 'patient', []),
+    ('password_change', 'patient', []),
+    ('password_change_done', 'patient', []),
+    ('accounts:password_change_done', 'patient', []),
+    ('services:wishlist', 'patient', []),
+    ('blog:list', None, []),
+    ('blog:detail', None, ['post_slug']),
+    ('dashboard:home', 'patient', []),
+    ('dashboard:patient', 'patient', []),
+    ('dashboard:patient_balance', 'patient', []),
+    ('appointments:my_appointments', 'patient', []),
+    ('appointments:detail', 'patient', ['appointment_id']),
+    ('appointments:confirmation', 'patient', ['appointment_id']),
+    ('appointments:personal_appointment_detail', 'patient', ['requested_id']),
+    ('appointments:provider_directory', 'patient', []),
+    ('appointments:get_available_slots', 'patient', ['provider_id', 'slot_date']),
+    ('payments:history', 'patient', []),
+    ('payments:detail', 'patient', ['payment_id']),
+    ('payments:qr_code', 'patient', ['payment_id']),
+    ('payments:qr_code_image', 'patient', ['payment_id', 'qr_digest', 'qr_format']),
+    ('payments:upload_proof', 'patient', ['payment_id']),
+    ('payments:cash_commitments', 'patient', []),
+    ('payments:verification_queue', 'admin', []),
+    ('payments:reconcile', 'admin', []),
+    ('metrics', 'admin', []),
+    ('pharmacy:cart', 'patient', []),
+    ('pharmacy:my_orders', 'patient', []),
+    ('pharmacy:order_confirmation', 'patient', ['order_number']),
+    ('equipment:my_rentals', 'patient', []),
+    ('equipment:my_purchases', 'patient', []),
+    ('equipment:purchase_detail', 'patient', ['purchase_number']),
+    ('notifications:list', 'patient', []),
+    ('notifications:recent', 'patient', []),
+    ('notifications:unread_count', 'patient', []),
+]
+
+# These templates currently fail to render (duplicate blocks / missing
+# files). Their views are measured with `render` stubbed out in the view
+# module, keyed here by the module to patch.
+BROKEN_TEMPLATE_VIEWS = [
+    ('dashboard:provider', 'provider', [], 'apps.dashboard.views'),
+    ('dashboard:provider_schedule', 'provider', [], 'apps.dashboard.views'),
+    ('dashboard:admin', 'admin', [], 'apps.dashboard.views'),
+    ('appointments:provider_pending', 'provider', [], 'apps.appointments.views'),
+    ('appointments:provider_detail', 'patient', ['provider_id'], 'apps.appointments.personal_views'),
+    ('appointments:my_personal_appointments', 'patient', [], 'apps.appointments.personal_views'),
+    ('equipment:rental_detail', 'patient', ['rental_number'], 'apps.equipment.views'),
+    ('payments:qr_paid', 'patient', [], 'apps.payments.views'),
+    ('notifications:preferences', 'patient', [], 'apps.notifications.views'),
+]
+
+
+def render_context(request, template_name, context=None, *args, **kwargs):
+    """Stand-in for shortcuts.render that evaluates the context's querysets."""
+    for value in (context or {}).values():
+        if isinstance(value, (QuerySet, Page)):
+            list(value)
+    return HttpResponse()
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        patient = User.objects.create_user(username='patient1', password='pass', role='patient')
+        PatientProfile.objects.create(user=patient)
+        provider = User.objects.create_user(username='provider1', password='pass', role='provider')
+        ProviderProfile.objects.create(
+            user=provider, specialization='nursing', license_number='LIC1', hourly_rate=Decimal('800.00')
+        )
+        admin = User.objects.create_user(username='admin1', password='pass', role='admin', is_staff=True)
+        # Owns the proofs waiting in the staff verification queue
+        payer = User.objects.create_user(username='patient2', password='pass', role='patient')
+        PatientProfile.objects.create(user=payer)
+        today = timezone.localdate()
+        for day in range(7):
+            ProviderSchedule.objects.create(
+                provider=provider, day_of_week=day, start_time=time(9, 0), end_time=time(17, 0)
+            )
+
+        category = ServiceCategory.objects.create(name='Nursing')
+        medicine_category = MedicineCategory.objects.create(name='Pain Relief', slug='pain-relief')
+        equipment_category = EquipmentCategory.objects.create(name='Mobility', slug='mobility')
+        services, medicines, equipment = [], [], []
+        for i in range(ROWS + 1):
+            services.append(Service.objects.create(
+                name=f'Service {i}', category=category, slug=f'service-{i}', description='Care',
+                base_price=Decimal('1000.00'), what_included='Care',
+            ))
+        for i in range(ROWS):
+            medicines.append(Medicine.objects.create(
+                category=medicine_category, name=f'Medicine {i}', slug=f'medicine-{i}', description='Tablets',
+                uses='Pain', dosage_instructions='Daily', strength='500mg', package_size=10,
+                price=Decimal('50.00'), stock_quantity=100,
+            ))
+            equipment.append(Equipment.objects.create(
+                category=equipment_category, name=f'Wheelchair {i}', slug=f'wheelchair-{i}', price_per_day=Decimal('100.00'),
+                purchase_price=Decimal('9000.00'), total_units=5, available_units=5,
+            ))
+            Post.objects.create(
+                title=f'Post {i}', slug=f'post-{i}', author=admin, content='Text', status='published',
+                published_at=timezone.now(),
+            )
+
+        proofs = []
+        for i, service in enumerate(services[:ROWS]):
+            appointment = Appointment.objects.create(
+                patient=patient, provider=provider, service=service,
+                appointment_date=today + timedelta(days=i + 2), appointment_time=time(10, 0),
+                status='confirmed', service_price=service.base_price, total_amount=service.base_price,
+                service_address='Home',
+            )
+            payment = Payment.objects.create(
+                appointment=appointment, patient=patient, amount=service.base_price, payment_status='unpaid'
+            )
+            visited = PersonalAppointment.objects.create(
+                patient=patient, provider=provider, appointment_type='consultation',
+                appointment_date=today - timedelta(days=i + 1), appointment_time=time(11, 0),
+                reason='Checkup', status='completed',
+            )
+            order = PharmacyOrder(customer=patient, delivery_address='Home', delivery_phone='9800000000')
+            order.save()
+            for medicine in medicines[:2]:
+                PharmacyOrderItem.objects.create(order=order, medicine=medicine, quantity=1, unit_price=medicine.price)
+            Payment.objects.create(
+                pharmacy_order=order, patient=patient, amount=order.total_amount, payment_status='unpaid'
+            )
+            rental = EquipmentRental.objects.create(
+                customer=patient, equipment=equipment[i], rental_period='daily', start_date=today,
+                end_date=today + timedelta(days=3), delivery_address='Home', delivery_phone='9800000000',
+            )
+            purchase = EquipmentPurchase.objects.create(
+                customer=patient, equipment=equipment[i], unit_price=Decimal('9000.00'),
+                delivery_address='Home', delivery_phone='9800000000',
+            )
+            Payment.objects.create(
+                equipment_purchase=purchase, patient=patient, amount=purchase.total_amount, payment_status='unpaid'
+            )
+            proofs.append(Payment.objects.create(
+                equipment_rental=rental, patient=payer, amount=Decimal('300.00'), payment_status='pending',
+                payment_method='online', transaction_id=f'TRX{i}',
+            ))
+            Notification.objects.create(user=patient, notification_type='general', title=f'Note {i}', message='Hello')
+
+        # Targets for the write views
+        pending = Appointment.objects.create(
+            patient=payer, service=services[0], appointment_date=today + timedelta(days=3),
+            appointment_time=time(14, 0), status='pending', service_price=Decimal('1000.00'),
+            total_amount=Decimal('1000.00'), service_address='Home',
+        )
+        requested = PersonalAppointment.objects.create(
+            patient=patient, provider=provider, appointment_type='consultation',
+            appointment_date=today + timedelta(days=2), appointment_time=time(11, 0),
+            reason='Checkup', status='pending', consultation_fee=Decimal('800.00'),
+        )
+        booked = PersonalAppointment.objects.create(
+            patient=patient, provider=provider, appointment_type='consultation',
+            appointment_date=today, appointment_time=time(9, 0),
+            reason='Checkup', status='confirmed', consultation_fee=Decimal('800.00'),
+        )
+        served = Appointment.objects.create(
+            patient=patient, provider=provider, service=services[ROWS],
+            appointment_date=today - timedelta(days=1), appointment_time=time(10, 0), status='completed',
+            service_price=Decimal('1000.00'), total_amount=Decimal('1000.00'), service_address='Home',
+        )
+        cash = Payment.objects.create(
+            appointment=served, patient=patient, amount=Decimal('1000.00'), payment_status='unpaid',
+            payment_method='cash',
+        )
+        active = EquipmentRental.objects.create(
+            customer=patient, equipment=equipment[0], rental_period='daily', start_date=today,
+            end_date=today + timedelta(days=3), delivery_address='Home', delivery_phone='9800000000',
+            status='active',
+        )
+        Wishlist.objects.create(user=patient, service=services[1])
+        cart = Cart.objects.create(user=patient, cart_type='pharmacy')
+        cart_items = [
+            CartItem.objects.create(
+                cart=cart, item_type='medicine', medicine=medicine, quantity=2,
+                unit_price=medicine.price, total_price=medicine.price * 2,
+            )
+            for medicine in medicines
+        ]
+        cls.ids = [proof.id for proof in proofs]
+
+        cls.data = {
+            'patient': patient,
+            'provider': provider,
+            'admin': admin,
+            'service_slug': services[0].slug,
+            'service_category_slug': category.slug,
+            'medicine_category_slug': medicine_category.slug,
+            'equipment_category_slug': equipment_category.slug,
+            'medicine_slug': medicines[0].slug,
+            'equipment_slug': equipment[0].slug,
+            'post_slug': 'post-0',
+            'reset_uid': 'MQ',
+            'reset_token': 'set-password',
+            'appointment_id': appointment.id,
+            'payment_id': payment.id,
+            'qr_digest': PaymentQRService.digest(payment),
+            'qr_format': 'svg',
+            'order_number': order.order_number,
+            'rental_number': rental.rental_number,
+            'purchase_number': purchase.order_number,
+            'provider_id': provider.id,
+            'slot_date': (today + timedelta(days=1)).isoformat(),
+            'open_service_id': services[ROWS].id,
+            'pending_id': pending.id,
+            'requested_id': requested.id,
+            'booked_id': booked.id,
+            'visited_id': visited.id,
+            'cash_payment_id': cash.id,
+            'wished_service_id': services[1].id,
+            'active_rental_number': active.rental_number,
+            'medicine_id': medicines[0].id,
+            'cart_item_id': cart_items[0].id,
+            'equipment_id': equipment[1].id,
+            'notification_id': Notification.objects.filter(user=patient).first().id,
+        }
+
+    def setUp(self):
+        # Match a long-running server, whose content type cache is warm
+        ContentType.objects.get_for_models(*django_apps.get_models())
+
+    def url(self, url_name, args):
+        return reverse(url_name, args=[self.data[key] for key in args])
+
+    def assertWithinBudget(self, url_name, request, user=None):
+        if user:
+            self.client.force_login(self.data[user])
+        else:
+            self.client.logout()
+        with QueryRecorder() as recorder:
+            response = request()
+        recorder.check(QUERY_BUDGETS[url_name], label=url_name)
+        return response
+
+    def test_every_named_url_has_a_budget(self):
+        missing = sorted(set(named_urls()) - set(QUERY_BUDGETS))
+
+        self.assertFalse(missing, f"Declare a query budget in config/query_budgets.py for: {', '.join(missing)}")
+
+    def test_read_views_within_query_budget(self):
+        for url_name, user, args in READ_VIEWS:
+            with self.subTest(url_name):
+                url = self.url(url_name, args)
+                response = self.assertWithinBudget(url_name, lambda: self.client.get(url), user)
+                self.assertEqual(response.status_code, 200)
+
+    def test_broken_template_views_within_query_budget(self):
+        for url_name, user, args, module in BROKEN_TEMPLATE_VIEWS:
+            with self.subTest(url_name), mock.patch(f'{module}.render', render_context):
+                url = self.url(url_name, args)
+                response = self.assertWithinBudget(url_name, lambda: self.client.get(url), user)
+                self.assertEqual(response.status_code, 200)
+
+    def test_write_views_within_query_budget(self):
+        tomorrow = timezone.localdate() + timedelta(days=2)
+        booking = {
+            'appointment_date': tomorrow.isoformat(), 'appointment_time': '16:00',
+            'duration_hours': '1.0', 'service_address': 'Home',
+        }
+        write_views = [
+            ('appointments:book', 'patient', ['open_service_id'], booking),
+            ('appointments:book', 'patient', ['open_service_id'],
+             dict(booking, repeat_frequency='weekly', repeat_count=ROWS)),
+            ('appointments:cancel', 'patient', ['appointment_id'], {'cancellation_reason': 'Travelling'}),
+            ('appointments:accept', 'provider', ['pending_id'], {}),
+            ('appointments:reject', 'provider', ['pending_id'], {'rejection_reason': 'Unavailable'}),
+            ('appointments:complete', 'provider', ['appointment_id'], {'provider_notes': 'Done'}),
+            ('appointments:book_personal_appointment', 'patient', ['provider_id'], {
+                'appointment_type': 'consultation', 'appointment_date': tomorrow.isoformat(),
+                'appointment_time': '15:00', 'duration_minutes': 30, 'location_type': 'home',
+                'location_address': 'Home', 'reason': 'Checkup', 'additional_charges': '0.00',
+            }),
+            ('appointments:confirm_personal_appointment', 'provider', ['requested_id'], {}),
+            ('appointments:cancel_personal_appointment', 'patient', ['requested_id'], {'reason': 'Travelling'}),
+            ('appointments:complete_personal_appointment', 'provider', ['booked_id'], {'provider_notes': 'Done'}),
+            ('appointments:add_appointment_review', 'patient', ['visited_id'], {
+                'rating': 5, 'review_text': 'Helpful', 'would_recommend': 'yes',
+            }),
+            ('payments:initiate', 'patient', ['appointment_id'], {'payment_method': 'cash'}),
+            ('payments:detail', 'patient', ['payment_id'], {'payment_method': 'cash'}),
+            ('payments:confirm', 'patient', ['cash_payment_id'], {'payment_method': 'cash'}),
+            ('payments:verification_queue', 'admin', [], {'action': 'approve', 'payment_ids': self.ids}),
+            ('services:add_to_wishlist', 'patient', ['open_service_id'], {}),
+            ('accounts:logout', 'patient', [], {}),
+            ('services:remove_from_wishlist', 'patient', ['wished_service_id'], {}),
+            ('pharmacy:add_to_cart', 'patient', ['medicine_id'], {'quantity': 1}),
+            ('pharmacy:update_cart', 'patient', ['cart_item_id'], {'quantity': 3}),
+            ('pharmacy:remove_from_cart', 'patient', ['cart_item_id'], {}),
+            ('pharmacy:checkout', 'patient', [], {'delivery_address': 'Home', 'delivery_phone': '9800000000'}),
+            ('pharmacy:cancel_order', 'patient', ['order_number'], {'cancellation_reason': 'Not needed'}),
+            ('equipment:rent', 'patient', ['equipment_id'], {
+                'rental_period': 'daily', 'quantity': 1, 'start_date': tomorrow.isoformat(),
+                'end_date': (tomorrow + timedelta(days=3)).isoformat(),
+                'delivery_address': 'Home', 'delivery_phone': '9800000000',
+            }),
+            ('equipment:buy', 'patient', ['equipment_id'], {
+                'quantity': 1, 'delivery_address': 'Home', 'delivery_phone': '9800000000',
+            }),
+            ('equipment:cancel_purchase', 'patient', ['purchase_number'], {}),
+            ('equipment:cancel_rental', 'patient', ['rental_number'], {}),
+            ('equipment:return_rental', 'patient', ['active_rental_number'], {}),
+            ('notifications:mark_read', 'patient', ['notification_id'], {}),
+            ('notifications:mark_all_read', 'patient', [], {}),
+            ('notifications:delete', 'patient', ['notification_id'], {}),
+        ]
+        for url_name, user, args, data in write_views:
+            with self.subTest(url_name), transaction.atomic():
+                url = self.url(url_name, args)
+                response = self.assertWithinBudget(url_name, lambda: self.client.post(url, data), user)
+                if response.status_code != 302:
+                    # The notification endpoints answer fetch() calls with JSON
+                    self.assertTrue(response.json()['success'])
+                transaction.set_rollback(True)
+
+    def test_fingerprint_groups_repeated_lookups(self):
+        self.assertEqual(fingerprint('SELECT * FROM t WHERE id = 1'), fingerprint('SELECT *  FROM t WHERE id = 42'))
+        self.assertEqual(
+            fingerprint('SELECT * FROM t WHERE id IN (%s, %s)'), fingerprint('SELECT * FROM t WHERE id IN (%s)')
+        )
+
+    @override_settings(DEBUG=True)
+    def test_debug_responses_carry_query_headers(self):
+        self.client.force_login(self.data['patient'])
+
+        response = self.client.get(reverse('notifications:unread_count'))
+
+        self.assertEqual(int(response['X-DB-Query-Count']), QUERY_BUDGETS['notifications:unread_count'])
+        self.assertIn('X-DB-Time-Ms', response)
+        self.assertEqual(response['X-DB-Duplicate-Queries'], '0')
+
@@ -0,0 +1,58 @@
+import pytest
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from apps.services.models import Service
+from config.middleware import ReplicaStickyMiddleware
+from config.routers import ReplicaRouter, replica_reads, use_replica
+
+
+router = ReplicaRouter()
+
+
+@pytest.fixture
+def replica(settings):
+    settings.DATABASE_REPLICA_ALIAS = 'replica'
+    settings.REPLICA_STICKY_SECONDS = 5
+
+
+def read_alias_view(request):
+    return HttpResponse(router.db_for_read(Service))
+
+
+def test_reads_use_replica_only_inside_replica_block(replica):
+    assert router.db_for_read(Service) == 'default'
+    with replica_reads():
+        assert router.db_for_read(Service) == 'replica'
+        assert router.db_for_write(Service) == 'default'
+    assert router.db_for_read(Service) == 'default'
+
+
+def test_without_replica_everything_goes_to_primary(settings):
+    settings.DATABASE_REPLICA_ALIAS = None
+    with replica_reads():
+        assert router.db_for_read(Service) == 'default'
+
+
+def test_use_replica_respects_primary_pin(replica):
+    view = use_replica(read_alias_view)
+    request = RequestFactory().get('/')
+
+    assert view(request).content == b'replica'
+    request.pin_primary = True
+    assert view(request).content == b'default'
+
+
+def test_writes_pin_client_to_primary(replica):
+    middleware = ReplicaStickyMiddleware(use_replica(read_alias_view))
+    factory = RequestFactory()
+
+    assert middleware(factory.get('/')).content == b'replica'
+
+    response = middleware(factory.post('/'))
+    cookie = response.cookies[ReplicaStickyMiddleware.cookie_name]
+    assert cookie['max-age'] == 5
+
+    request = factory.get('/')
+    request.COOKIES[ReplicaStickyMiddleware.cookie_name] = cookie.value
+    assert middleware(request).content == b'default'
@@ -0,0 +1,74 @@
+from django.test import TestCase
+from django.utils import timezone
+from decimal import Decimal
+
+from apps.accounts.models import User, ProviderProfile
+from apps.appointments.models import Appointment
+from apps.equipment.models import Equipment, EquipmentPurchase
+from apps.services.models import Service, ServiceCategory
+from apps.dashboard.services import ProviderMetricsService
+
+
+class ProviderMetricsServiceTestCase(TestCase):
+    def setUp(self):
+        self.patient = User.objects.create_user(username='patient1', password='pass', role='patient')
+        self.other_patient = User.objects.create_user(username='patient2', password='pass', role='patient')
+        self.provider = User.objects.create_user(username='provider1', password='pass', role='provider')
+        ProviderProfile.objects.create(user=self.provider, specialization='nursing', license_number='LIC123')
+
+        cat = ServiceCategory.objects.create(name='Nursing')
+        self.service = Service.objects.create(
+            name='Test Service',
+            category=cat,
+            slug='test-service',
+            description='Test service description',
+            base_price=Decimal('1000.00'),
+            what_included='Care',
+        )
+        self.today = timezone.now().date()
+
+        for status, hours in (('completed', '2.0'), ('completed', '1.5'), ('confirmed', '3.0')):
+            Appointment.objects.create(
+                patient=self.patient,
+                provider=self.provider,
+                service=self.service,
+                appointment_date=self.today,
+                appointment_time=timezone.now().time(),
+                duration_hours=Decimal(hours),
+                status=status,
+                service_price=self.service.base_price,
+                total_amount=self.service.base_price,
+                service_address='Patient home address',
+            )
+
+        equipment = Equipment.objects.create(name='Wheelchair', slug='wheelchair', purchase_price=Decimal('100.00'))
+        for customer in (self.patient, self.other_patient):
+            EquipmentPurchase.objects.create(
+                customer=customer,
+                equipment=equipment,
+                unit_price=Decimal('100.00'),
+                delivery_address='Somewhere',
+                delivery_phone='9800000000',
+            )
+
+    def test_appointment_metrics_single_query(self):
+        with self.assertNumQueries(1):
+            metrics = ProviderMetricsService.get_appointment_metrics(self.provider, self.today)
+
+        self.assertEqual(metrics['total_appointments'], 3)
+        self.assertEqual(metrics['completed_appointments'], 2)
+        self.assertEqual(metrics['today_appointments'], 3)
+        self.assertEqual(metrics['this_month_appointments'], 3)
+        self.assertEqual(metrics['total_hours'], Decimal('3.5'))
+        self.assertEqual(metrics['this_month_hours'], Decimal('3.5'))
+
+    def test_metrics_without_appointments_default_to_zero(self):
+        other = User.objects.create_user(username='provider2', password='pass', role='provider')
+        metrics = ProviderMetricsService.get_appointment_metrics(other, self.today)
+        self.assertEqual(metrics['total_appointments'], 0)
+        self.assertEqual(metrics['total_hours'], Decimal('0'))
+
+    def test_recent_activity_scoped_to_provider_patients(self):
+        activity = ProviderMetricsService.get_recent_activity(self.provider)
+        customers = [p.customer for p in activity['recent_purchases']]
+        self.assertEqual(customers, [self.patient])
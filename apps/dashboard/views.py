@@ -10,12 +10,14 @@ from datetime import timedelta, datetime
 from decimal import Decimal
 
 from apps.accounts.models import User, PatientProfile, ProviderProfile
-from apps.appointments.models import Appointment, PersonalAppointment
+from apps.appointments.models import Appointment, PersonalAppointment, OpenAppointmentRequest
 from apps.payments.models import Payment
 from apps.services.models import Service
 from apps.services.wishlist import Wishlist
 from apps.equipment.models import EquipmentPurchase, EquipmentRental
 from apps.pharmacy.models import PharmacyOrderActivity, PharmacyOrder
+from config.routers import use_replica
+from .services import ProviderMetricsService
 
 
 @login_required
@@ -197,12 +199,7 @@ def patient_dashboard(request):
         Q(payment_method='online') & Q(payment_status='unpaid') & (
             Q(payment_proof_file__isnull=False) | ~Q(transaction_id='') | ~Q(payment_proof_url='')
         )
-    ).exclude(
-        Q(appointment__status='cancelled') |
-        Q(pharmacy_order__status='cancelled') |
-        Q(equipment_purchase__status='cancelled') |
-        Q(equipment_rental__status='cancelled')
-    )
+    ).exclude(source_status='cancelled')
     total_unpaid = total_unpaid_qs.aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
 
     # Update stats to reflect aggregated view-level totals.
@@ -236,6 +233,7 @@ def patient_dashboard(request):
 
 
 @login_required
+@use_replica
 def patient_balance(request):
     """
     Detailed view of patient's financial balance and payment history
@@ -257,13 +255,9 @@ def patient_balance(request):
 
     # Exclude any payments tied to domain objects that are cancelled. We don't
     # want cancelled appointments/orders/purchases to appear in actionable
-    # payments or affect totals on this page.
-    payments = payments.exclude(
-        Q(appointment__status='cancelled') |
-        Q(pharmacy_order__status='cancelled') |
-        Q(equipment_purchase__status='cancelled') |
-        Q(equipment_rental__status='cancelled')
-    )
+    # payments or affect totals on this page. source_status mirrors the linked
+    # record's status, so this needs no joins.
+    payments = payments.exclude(source_status='cancelled')
     
     # Payment summary
     # Define amounts to exclude from 'total charges' and 'unpaid' when the patient
@@ -325,12 +319,7 @@ def patient_balance(request):
         Q(payment_method='online') & Q(payment_status='unpaid') & (
             Q(payment_proof_file__isnull=False) | ~Q(transaction_id='') | ~Q(payment_proof_url='')
         )
-    ).exclude(
-        Q(appointment__status='cancelled') |
-        Q(pharmacy_order__status='cancelled') |
-        Q(equipment_purchase__status='cancelled') |
-        Q(equipment_rental__status='cancelled')
-    )
+    ).exclude(source_status='cancelled')
     total_unpaid = total_unpaid_qs.aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
     
     context = {
@@ -382,16 +371,13 @@ def provider_dashboard(request):
             }
         )
     
-    # Get date ranges
     today = timezone.now().date()
-    this_week_start = today - timedelta(days=today.weekday())
-    this_month_start = today.replace(day=1)
-    
+
     # Today's appointments
-    todays_appointments = Appointment.objects.filter(
+    todays_appointments = list(Appointment.objects.filter(
         provider=user,
         appointment_date=today
-    ).select_related('service', 'patient').order_by('appointment_time')
+    ).select_related('service', 'patient').order_by('appointment_time'))
     
     # Upcoming appointments
     upcoming_appointments = Appointment.objects.filter(
@@ -400,111 +386,69 @@ def provider_dashboard(request):
         status__in=['confirmed', 'in_progress']
     ).select_related('service', 'patient').order_by('appointment_date', 'appointment_time')[:10]
     
-    # Pending requests (unassigned appointments matching provider specialization)
-    pending_requests = Appointment.objects.filter(
-        status='pending',
-        provider__isnull=True,
-        service__category__name__icontains=profile.get_specialization_display()
-    ).select_related('service', 'patient').order_by('appointment_date', 'appointment_time')[:5]
-    
-    # Statistics
-    total_appointments = Appointment.objects.filter(provider=user).count()
-    completed_appointments = Appointment.objects.filter(
-        provider=user,
-        status='completed'
-    ).count()
-    
-    this_week_appointments = Appointment.objects.filter(
-        provider=user,
-        appointment_date__gte=this_week_start,
-        appointment_date__lte=today
-    ).count()
-    
-    this_month_appointments = Appointment.objects.filter(
-        provider=user,
-        appointment_date__gte=this_month_start
-    ).count()
-    
-    # Earnings calculation
-    total_hours = Appointment.objects.filter(
-        provider=user,
-        status='completed'
-    ).aggregate(total=Sum('duration_hours'))['total'] or Decimal('0')
-    
-    estimated_earnings = total_hours * profile.hourly_rate
-    
-    this_month_hours = Appointment.objects.filter(
-        provider=user,
-        status='completed',
-        appointment_date__gte=this_month_start
-    ).aggregate(total=Sum('duration_hours'))['total'] or Decimal('0')
-    
-    this_month_earnings = this_month_hours * profile.hourly_rate
+    # Pending requests (unassigned appointments matching provider specialization),
+    # served from the precomputed open request queue
+    open_requests = OpenAppointmentRequest.objects.filter(specialization=profile.specialization)
+    pending_requests = [
+        entry.appointment for entry in open_requests.select_related(
+            'appointment__service', 'appointment__patient'
+        ).order_by('appointment_date', 'appointment_time')[:5]
+    ]
+    pending_requests_count = open_requests.count()
+    
+    # Statistics and earnings: all counts and hour sums come from one
+    # conditional-aggregate query.
+    metrics = ProviderMetricsService.get_appointment_metrics(user, today)
+    estimated_earnings = metrics['total_hours'] * profile.hourly_rate
+    this_month_earnings = metrics['this_month_hours'] * profile.hourly_rate
     
     # Rating
     average_rating = profile.rating
     
     stats = {
-        'total_appointments': total_appointments,
-        'completed_appointments': completed_appointments,
-        'this_week_appointments': this_week_appointments,
-        'this_month_appointments': this_month_appointments,
+        'total_appointments': metrics['total_appointments'],
+        'completed_appointments': metrics['completed_appointments'],
+        'this_week_appointments': metrics['this_week_appointments'],
+        'this_month_appointments': metrics['this_month_appointments'],
         'estimated_earnings': estimated_earnings,
         'this_month_earnings': this_month_earnings,
         'average_rating': average_rating,
         'total_reviews': profile.total_reviews,
-        'pending_requests_count': pending_requests.count(),
+        'pending_requests_count': pending_requests_count,
     }
     
     context = {
         'stats': stats,
         'todays_appointments': todays_appointments,
-        'today_appointments_count': todays_appointments.count(),
+        'today_appointments_count': metrics['today_appointments'],
         'upcoming_appointments': upcoming_appointments,
         'pending_requests': pending_requests,
-        'pending_count': pending_requests.count(),
+        'pending_count': pending_requests_count,
         'earnings_month': this_month_earnings,
         'profile': profile,
     }
-    # Recent related activity: prefer activity from patients who booked with
-    # this provider recently (90 days); fall back to any appointments, and
-    # finally fall back to site-wide recent activity if the provider has no
-    # patients yet. This avoids showing an empty area for new providers and
-    # gives a sensible default.
-    recent_window = timezone.now() - timedelta(days=90)
-    # Activity scoped strictly to patients who booked with this provider.
-    # Do NOT fallback to site-wide activity for providers; if there are no
-    # patients, show empty lists so the provider sees only related activity.
-    recent_patient_ids = list(Appointment.objects.filter(provider=user).values_list('patient', flat=True).distinct())
-    scoped_activity = bool(recent_patient_ids)
+    # Recent related activity, scoped strictly to patients who booked with
+    # this provider. Do NOT fallback to site-wide activity for providers; if
+    # there are no patients, show empty lists so the provider sees only
+    # related activity. The patient scope is a correlated EXISTS subquery
+    # rather than a materialized list of patient ids.
+    scoped_activity = metrics['total_appointments'] > 0
 
     if scoped_activity:
-        recent_purchases = EquipmentPurchase.objects.filter(customer__in=recent_patient_ids).select_related('equipment', 'customer').order_by('-created_at')[:6]
-        recent_rentals = EquipmentRental.objects.filter(customer__in=recent_patient_ids).select_related('equipment', 'customer').order_by('-created_at')[:6]
-
-        recent_pharmacy_orders = PharmacyOrder.objects.filter(customer__in=recent_patient_ids).order_by('-created_at')[:6]
-        recent_pharmacy_activities = PharmacyOrderActivity.objects.filter(order__customer__in=recent_patient_ids).select_related('order', 'actor').order_by('-created_at')[:8]
-
-        recent_payments = Payment.objects.filter(
-            Q(patient__in=recent_patient_ids) | Q(appointment__provider=user)
-        ).select_related('appointment', 'pharmacy_order', 'equipment_purchase', 'equipment_rental', 'patient').order_by('-created_at')[:8]
+        activity = ProviderMetricsService.get_recent_activity(user)
     else:
         # No patients for this provider yet — present empty querysets (no site-wide fallback)
-        recent_purchases = EquipmentPurchase.objects.none()
-        recent_rentals = EquipmentRental.objects.none()
-        recent_pharmacy_orders = PharmacyOrder.objects.none()
-        recent_pharmacy_activities = PharmacyOrderActivity.objects.none()
-        recent_payments = Payment.objects.none()
+        activity = {
+            'recent_purchases': EquipmentPurchase.objects.none(),
+            'recent_rentals': EquipmentRental.objects.none(),
+            'recent_pharmacy_orders': PharmacyOrder.objects.none(),
+            'recent_pharmacy_activities': PharmacyOrderActivity.objects.none(),
+            'recent_payments': Payment.objects.none(),
+        }
 
     # Merge into context so the provider dashboard template can render activity lists.
-    context.update({
-        'recent_purchases': recent_purchases,
-        'recent_rentals': recent_rentals,
-        'recent_pharmacy_orders': recent_pharmacy_orders,
-        'recent_pharmacy_activities': recent_pharmacy_activities,
-        'recent_payments': recent_payments,
-        'recent_activity_scoped': scoped_activity,
-    })
+    context.update(activity)
+    context['recent_activity_scoped'] = scoped_activity
     
     return render(request, 'dashboard/provider_dashboard.html', context)
 
@@ -541,6 +485,7 @@ def provider_schedule(request):
 
 
 @login_required
+@use_replica
 def admin_dashboard(request):
     """
     Admin dashboard with system-wide statistics
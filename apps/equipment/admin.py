@@ -4,6 +4,7 @@ from .models import (
     EquipmentCategory, Equipment, EquipmentRental, 
     EquipmentPurchase, EquipmentWishlist
 )
+from .services import RentalTransitionService
 
 
 @admin.register(EquipmentCategory)
@@ -102,6 +103,28 @@ class EquipmentRentalAdmin(admin.ModelAdmin):
             'fields': ('condition_at_delivery', 'condition_at_return', 'damage_notes')
         }),
     )
+
+    actions = ['mark_as_confirmed', 'mark_as_active', 'mark_as_returned', 'mark_as_cancelled']
+
+    def mark_as_confirmed(self, request, queryset):
+        count = len(RentalTransitionService.confirm.apply(queryset, actor=request.user))
+        self.message_user(request, f'{count} rental(s) marked as confirmed.')
+    mark_as_confirmed.short_description = 'Mark selected as Confirmed'
+
+    def mark_as_active(self, request, queryset):
+        count = len(RentalTransitionService.activate.apply(queryset, actor=request.user))
+        self.message_user(request, f'{count} rental(s) marked as active.')
+    mark_as_active.short_description = 'Mark selected as Active'
+
+    def mark_as_returned(self, request, queryset):
+        count = len(RentalTransitionService.return_rentals(queryset, actor=request.user))
+        self.message_user(request, f'{count} rental(s) marked as returned.')
+    mark_as_returned.short_description = 'Mark selected as Returned'
+
+    def mark_as_cancelled(self, request, queryset):
+        count = len(RentalTransitionService.cancel.apply(queryset, actor=request.user))
+        self.message_user(request, f'{count} rental(s) marked as cancelled.')
+    mark_as_cancelled.short_description = 'Mark selected as Cancelled'
     
     def save_model(self, request, obj, form, change):
         # Allow staff/admin to override immutability when editing in admin
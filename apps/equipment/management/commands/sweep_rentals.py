@@ -0,0 +1,34 @@
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from apps.equipment.services import RentalLifecycleService
+
+
+class Command(BaseCommand):
+    help = 'Send due/overdue rental notices and update late fees'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--due-soon-days', type=int, default=RentalLifecycleService.DEFAULT_DUE_SOON_DAYS,
+            help='Notify rentals ending within this many days'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=RentalLifecycleService.DEFAULT_BATCH_SIZE,
+            help='Rentals processed per batch'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Report counts without saving or notifying')
+
+    def handle(self, *args, **options):
+        started = perf_counter()
+        stats = RentalLifecycleService.sweep(
+            due_soon_days=options['due_soon_days'],
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+        )
+        elapsed = perf_counter() - started
+
+        prefix = 'Dry run' if options['dry_run'] else 'Sweep complete'
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}: due_soon={stats['due_soon']}, overdue={stats['overdue']}, "
+            f"fees_updated={stats['fees_updated']} in {elapsed:.2f}s"
+        ))
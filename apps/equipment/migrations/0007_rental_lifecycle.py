@@ -0,0 +1,27 @@
+# Generated by Django 4.2.7 on 2026-10-19 14:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipment', '0006_equipment_brand_equipment_condition_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='equipmentrental',
+            name='due_notice_sent_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='equipmentrental',
+            name='overdue_notice_sent_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='equipmentrental',
+            index=models.Index(fields=['status', 'end_date'], name='equipment_r_status_d387c6_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-19 15:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipment', '0007_rental_lifecycle'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='equipmentpurchase',
+            index=models.Index(fields=['customer', 'created_at'], name='equipment_purchase_cust_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='equipmentrental',
+            index=models.Index(fields=['customer', 'created_at'], name='equipment_rental_customer_idx'),
+        ),
+    ]
@@ -3,6 +3,8 @@ from django.core.validators import MinValueValidator
 from django.core.exceptions import ValidationError
 from decimal import Decimal
 
+from utils.querysets import UnpaidPaymentQuerySet
+
 
 class EquipmentCategory(models.Model):
     name = models.CharField(max_length=150)
@@ -135,12 +137,26 @@ class EquipmentRental(models.Model):
     damage_notes = models.TextField(blank=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     actual_return_date = models.DateField(null=True, blank=True)
+    # Set by RentalLifecycleService so each notice goes out once
+    due_notice_sent_at = models.DateTimeField(null=True, blank=True)
+    overdue_notice_sent_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Fields that must not change after confirmation/processing
+    LOCKED_FIELDS = [
+        'rental_period', 'quantity', 'start_date', 'end_date',
+        'delivery_address', 'delivery_phone', 'delivery_instructions', 'customer_notes'
+    ]
+
     class Meta:
         db_table = 'equipment_rentals'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'end_date']),
+            # A customer's rentals, newest first
+            models.Index(fields=['customer', 'created_at'], name='equipment_rental_customer_idx'),
+        ]
 
     def __str__(self):
         return f"Rental #{self.rental_number}"
@@ -158,12 +174,7 @@ class EquipmentRental(models.Model):
                 old = None
 
             if old and old.status != 'pending' and not getattr(self, '_allow_modification', False):
-                # Fields that must not change after confirmation/processing
-                locked_fields = [
-                    'rental_period', 'quantity', 'start_date', 'end_date',
-                    'delivery_address', 'delivery_phone', 'delivery_instructions', 'customer_notes'
-                ]
-                for f in locked_fields:
+                for f in self.LOCKED_FIELDS:
                     if getattr(old, f) != getattr(self, f):
                         raise ValidationError('This rental cannot be modified after it has been confirmed/processed. To change your booking, please create a new rental.')
 
@@ -180,6 +191,10 @@ class EquipmentRental(models.Model):
         super().save(*args, **kwargs)
 
 
+class EquipmentPurchaseQuerySet(UnpaidPaymentQuerySet):
+    payment_link = 'equipment_purchase'
+
+
 class EquipmentPurchase(models.Model):
     STATUS_CHOICES = (
         ('pending', 'Pending'),
@@ -208,9 +223,15 @@ class EquipmentPurchase(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = EquipmentPurchaseQuerySet.as_manager()
+
     class Meta:
         db_table = 'equipment_purchases'
         ordering = ['-created_at']
+        indexes = [
+            # A customer's purchases, newest first
+            models.Index(fields=['customer', 'created_at'], name='equipment_purchase_cust_idx'),
+        ]
 
     def __str__(self):
         return f"Purchase #{self.order_number}"
@@ -0,0 +1,303 @@
+"""
+UH Care - Equipment rental lifecycle services
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
+
+from utils.transitions import BulkTransition, bulk_increment, transition_applied
+from .models import Equipment, EquipmentRental
+
+
+class RentalLifecycleService:
+    """
+    Periodic sweep over outstanding rentals: sends due-soon and overdue
+    notices once per rental and keeps late fees, and the payments that
+    charge them, current.
+    """
+
+    OUTSTANDING_STATUSES = ['confirmed', 'active']
+    DEFAULT_DUE_SOON_DAYS = 1
+    DEFAULT_BATCH_SIZE = 500
+
+    # Written by the sweep with bulk_update, which bypasses
+    # EquipmentRental.save; none of these may be a locked field.
+    FEE_FIELDS = ['late_fee', 'total_amount', 'updated_at']
+
+    @staticmethod
+    def late_fee_rate():
+        """Multiplier on one day's rent charged per overdue day."""
+        return Decimal(str(getattr(settings, 'RENTAL_LATE_FEE_RATE', '1.0')))
+
+    @staticmethod
+    def daily_rate(equipment):
+        return equipment.rent_price_daily or equipment.price_per_day or Decimal('0.00')
+
+    @staticmethod
+    def late_fee_for(rental, on_date, daily_rate=None, rate=None):
+        """Late fee owed for `rental` if returned on `on_date`."""
+        overdue_days = (on_date - rental.end_date).days
+        if overdue_days <= 0:
+            return Decimal('0.00')
+        if daily_rate is None:
+            daily_rate = RentalLifecycleService.daily_rate(rental.equipment)
+        if rate is None:
+            rate = RentalLifecycleService.late_fee_rate()
+        return (daily_rate * rental.quantity * overdue_days * rate).quantize(Decimal('0.01'))
+
+    @staticmethod
+    def outstanding():
+        return EquipmentRental.objects.filter(
+            status__in=RentalLifecycleService.OUTSTANDING_STATUSES,
+            actual_return_date__isnull=True,
+        )
+
+    @staticmethod
+    def charge_fees(rentals, now=None):
+        """
+        Bring the rentals' open charge in line with their total_amount after
+        a late fee change: the newest unpaid Payment is set to whatever the
+        other (non-refunded) payments don't cover, or a new unpaid Payment
+        is added for the difference when there is none. Two queries and at
+        most one bulk_update and one bulk_create per call.
+        """
+        from apps.payments.models import Payment
+
+        if not rentals:
+            return
+        now = now or timezone.now()
+        payments = list(
+            Payment.objects.filter(equipment_rental__in=rentals).exclude(payment_status='refunded')
+            .only('id', 'equipment_rental_id', 'amount', 'payment_status', 'created_at')
+            .order_by('created_at', 'id')
+        )
+        open_payment = {}
+        covered = defaultdict(Decimal)
+        for payment in payments:
+            if payment.payment_status == 'unpaid':
+                # The newest unpaid payment carries the fee; older ones stay as they are
+                previous = open_payment.get(payment.equipment_rental_id)
+                if previous is not None:
+                    covered[payment.equipment_rental_id] += previous.amount
+                open_payment[payment.equipment_rental_id] = payment
+            else:
+                covered[payment.equipment_rental_id] += payment.amount
+
+        updated, created = [], []
+        for rental in rentals:
+            due = rental.total_amount - covered[rental.id]
+            payment = open_payment.get(rental.id)
+            if payment is not None:
+                if payment.amount != due:
+                    payment.amount = max(due, Decimal('0.00'))
+                    payment.updated_at = now
+                    updated.append(payment)
+            elif due > 0:
+                created.append(Payment(
+                    patient_id=rental.customer_id,
+                    equipment_rental=rental,
+                    amount=due,
+                    payment_status='unpaid',
+                    source_type='equipment_rental',
+                    source_status=rental.status,
+                    notes=f'Late fee for rental {rental.rental_number}',
+                ))
+        if updated:
+            Payment.objects.bulk_update(updated, ['amount', 'updated_at'])
+        if created:
+            Payment.objects.bulk_create(created)
+
+    @staticmethod
+    def _batches(queryset, batch_size):
+        """Yield id-ordered batches so memory stays bounded by batch_size."""
+        last_id = 0
+        while True:
+            batch = list(queryset.filter(id__gt=last_id).order_by('id')[:batch_size])
+            if not batch:
+                return
+            last_id = batch[-1].id
+            yield batch
+
+    @staticmethod
+    def _notice(rental, title, message):
+        return {
+            'user': rental.customer,
+            'title': title,
+            'message': message,
+            'related_object': rental,
+            'action_url': reverse('equipment:rental_detail', args=[rental.rental_number]),
+        }
+
+    @staticmethod
+    def sweep(today=None, due_soon_days=DEFAULT_DUE_SOON_DAYS, batch_size=DEFAULT_BATCH_SIZE, dry_run=False):
+        """
+        Run one sweep. Both selections are range queries on
+        (status, end_date). Returns a dict of counts.
+        """
+        from apps.notifications.services import NotificationService
+
+        today = today or timezone.localdate()
+        now = timezone.now()
+        rate = RentalLifecycleService.late_fee_rate()
+        stats = {'due_soon': 0, 'overdue': 0, 'fees_updated': 0}
+
+        # Due soon: ends today or within the next few days, not yet told
+        due_soon = RentalLifecycleService.outstanding().filter(
+            end_date__range=(today, today + timedelta(days=due_soon_days)),
+            due_notice_sent_at__isnull=True,
+        ).select_related('customer', 'equipment')
+
+        for batch in RentalLifecycleService._batches(due_soon, batch_size):
+            stats['due_soon'] += len(batch)
+            if dry_run:
+                continue
+            with transaction.atomic():
+                NotificationService.send_bulk_notifications([
+                    RentalLifecycleService._notice(
+                        rental,
+                        'Rental Due Soon',
+                        f"Your rental of {rental.equipment.name} ({rental.rental_number}) is due back on {rental.end_date:%Y-%m-%d}.",
+                    )
+                    for rental in batch
+                ], 'rental_due')
+                for rental in batch:
+                    rental.due_notice_sent_at = now
+                EquipmentRental.objects.bulk_update(batch, ['due_notice_sent_at'])
+
+        # Overdue: past end_date; fees grow daily so every row is recomputed
+        overdue = RentalLifecycleService.outstanding().filter(
+            end_date__lt=today,
+        ).select_related('customer', 'equipment')
+
+        for batch in RentalLifecycleService._batches(overdue, batch_size):
+            stats['overdue'] += len(batch)
+
+            changed = []
+            newly_overdue = []
+            for rental in batch:
+                fee = RentalLifecycleService.late_fee_for(
+                    rental, today, daily_rate=RentalLifecycleService.daily_rate(rental.equipment), rate=rate
+                )
+                if fee != rental.late_fee:
+                    rental.late_fee = fee
+                    # Same formula as EquipmentRental.save
+                    rental.total_amount = (
+                        rental.rental_price + rental.security_deposit + rental.delivery_charge
+                        + rental.late_fee + rental.damage_charge
+                    )
+                    rental.updated_at = now
+                    changed.append(rental)
+                if rental.overdue_notice_sent_at is None:
+                    newly_overdue.append(rental)
+            stats['fees_updated'] += len(changed)
+
+            if dry_run:
+                continue
+            with transaction.atomic():
+                if changed:
+                    EquipmentRental.objects.bulk_update(changed, RentalLifecycleService.FEE_FIELDS)
+                    RentalLifecycleService.charge_fees(changed, now=now)
+                if newly_overdue:
+                    NotificationService.send_bulk_notifications([
+                        RentalLifecycleService._notice(
+                            rental,
+                            'Rental Overdue',
+                            f"Your rental of {rental.equipment.name} ({rental.rental_number}) was due on "
+                            f"{rental.end_date:%Y-%m-%d}. A late fee of NPR {rental.late_fee} applies and grows daily until it is returned.",
+                        )
+                        for rental in newly_overdue
+                    ], 'rental_overdue')
+                    for rental in newly_overdue:
+                        rental.overdue_notice_sent_at = now
+                    EquipmentRental.objects.bulk_update(newly_overdue, ['overdue_notice_sent_at'])
+
+        return stats
+
+
+class RentalTransitionService:
+    """
+    Bulk status changes for rentals (admin actions). After the UPDATE one
+    handler settles late fees on return, puts units back into inventory,
+    refunds open payments on cancellation and sends notifications in bulk.
+    """
+
+    confirm = BulkTransition(EquipmentRental, 'confirm', 'confirmed', ['pending'], related=['customer', 'equipment'])
+    activate = BulkTransition(EquipmentRental, 'activate', 'active', ['confirmed'], related=['customer', 'equipment'])
+    mark_returned = BulkTransition(
+        EquipmentRental, 'mark_returned', 'returned', ['confirmed', 'active'], related=['customer', 'equipment']
+    )
+    cancel = BulkTransition(
+        EquipmentRental, 'cancel', 'cancelled', ['pending', 'confirmed'], related=['customer', 'equipment']
+    )
+
+    @staticmethod
+    def return_rentals(queryset, actor=None):
+        """Mark rentals returned today."""
+        return RentalTransitionService.mark_returned.apply(
+            queryset, actor=actor, actual_return_date=timezone.localdate()
+        )
+
+    @staticmethod
+    def restock(instances):
+        units = {}
+        for rental in instances:
+            units[rental.equipment_id] = units.get(rental.equipment_id, 0) + rental.quantity
+        bulk_increment(Equipment, 'available_units', units)
+
+    @staticmethod
+    def settle_late_fees(instances):
+        rate = RentalLifecycleService.late_fee_rate()
+        now = timezone.now()
+        changed = []
+        for rental in instances:
+            fee = RentalLifecycleService.late_fee_for(rental, rental.actual_return_date, rate=rate)
+            if fee != rental.late_fee:
+                rental.late_fee = fee
+                rental.total_amount = (
+                    rental.rental_price + rental.security_deposit + rental.delivery_charge
+                    + rental.late_fee + rental.damage_charge
+                )
+                rental.updated_at = now
+                changed.append(rental)
+        if changed:
+            EquipmentRental.objects.bulk_update(changed, RentalLifecycleService.FEE_FIELDS)
+            RentalLifecycleService.charge_fees(changed, now=now)
+
+    @staticmethod
+    def on_transition(sender, transition, instances, previous, actor=None, **kwargs):
+        from apps.notifications.services import NotificationService
+        from apps.payments.models import Payment
+
+        if transition.target == 'returned':
+            RentalTransitionService.settle_late_fees(instances)
+            RentalTransitionService.restock(instances)
+
+        elif transition.target == 'cancelled':
+            RentalTransitionService.restock(instances)
+            Payment.objects.filter(equipment_rental_id__in=[r.id for r in instances]).exclude(
+                payment_status__in=['refunded', 'paid']
+            ).update(payment_status='refunded', verified_at=timezone.now())
+
+        elif transition.target == 'active':
+            NotificationService.send_bulk_notifications([
+                RentalLifecycleService._notice(
+                    rental,
+                    'Equipment Rental Started',
+                    f"Your rental for {rental.equipment.name} has started. "
+                    f"Rental period: {rental.start_date} to {rental.end_date}",
+                )
+                for rental in instances
+            ], 'rental_started')
+
+
+transition_applied.connect(
+    RentalTransitionService.on_transition,
+    sender=EquipmentRental,
+    dispatch_uid='equipment.bulk_transition',
+)
@@ -0,0 +1,8 @@
+from celery import shared_task
+
+
+@shared_task
+def sweep_rentals():
+    from apps.equipment.services import RentalLifecycleService
+
+    return RentalLifecycleService.sweep()
@@ -0,0 +1,80 @@
+from decimal import Decimal
+
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from apps.accounts.models import User
+from apps.equipment.models import Equipment, EquipmentPurchase
+from apps.payments.models import Payment
+from config.idempotency import PENDING, cache, cache_key
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class IdempotentPurchaseTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.patient = User.objects.create_user(username='patient', password='pw', role='patient')
+        self.equipment = Equipment.objects.create(
+            name='Wheelchair', slug='wheelchair', purchase_price=Decimal('700.00'), total_units=5, available_units=5,
+        )
+        self.url = reverse('equipment:buy', args=[self.equipment.id])
+        self.client.force_login(self.patient)
+
+    def record_key(self, key):
+        request = type('Request', (), {'user': self.patient})()
+        return cache_key(request, 'apps.equipment.views.buy_equipment', key)
+
+    def post(self, key=None, **overrides):
+        data = {'quantity': 1, 'delivery_address': 'Home', 'delivery_phone': '9800000000'}
+        data.update(overrides)
+        if key:
+            data['idempotency_key'] = key
+        return self.client.post(self.url, data)
+
+    def test_replayed_post_returns_original_redirect(self):
+        first = self.post('a' * 32)
+        second = self.post('a' * 32)
+
+        self.assertEqual(first.status_code, 302)
+        self.assertEqual(second.status_code, 302)
+        self.assertEqual(second['Location'], first['Location'])
+        self.assertEqual(EquipmentPurchase.objects.count(), 1)
+        self.assertEqual(Payment.objects.count(), 1)
+        self.equipment.refresh_from_db()
+        self.assertEqual(self.equipment.available_units, 4)
+
+    def test_new_key_places_a_new_order(self):
+        self.post('a' * 32)
+        self.post('b' * 32)
+
+        self.assertEqual(EquipmentPurchase.objects.count(), 2)
+
+    def test_invalid_form_releases_the_key(self):
+        response = self.post('c' * 32, delivery_address='')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'name="idempotency_key"')
+
+        self.post('c' * 32)
+
+        self.assertEqual(EquipmentPurchase.objects.count(), 1)
+
+    @override_settings(IDEMPOTENCY_WAIT_SECONDS=0)
+    def test_duplicate_of_in_flight_request_does_not_run(self):
+        cache.set(self.record_key('d' * 32), PENDING)
+
+        response = self.post('d' * 32)
+
+        self.assertRedirects(response, self.url, fetch_redirect_response=False)
+        self.assertFalse(EquipmentPurchase.objects.exists())
+
+    def test_outcome_is_shared_across_workers(self):
+        first = self.post('e' * 32)
+
+        # Another worker opens its own cache connection and sees the same record
+        other_worker = caches.create_connection('idempotency')
+        self.assertEqual(other_worker.get(self.record_key('e' * 32)), first['Location'])
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM idempotency_keys')
+            self.assertEqual(cursor.fetchone()[0], 1)
@@ -0,0 +1,218 @@
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from datetime import date, timedelta
+from decimal import Decimal
+
+from apps.accounts.models import User
+from apps.equipment.models import Equipment, EquipmentRental
+from apps.equipment.services import RentalLifecycleService
+from apps.notifications.models import Notification
+from apps.payments.models import Payment
+
+
+@override_settings(RENTAL_LATE_FEE_RATE='1.5')
+class RentalLifecycleServiceTestCase(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(
+            username='patient1', email='patient1@example.com', password='pass', role='patient'
+        )
+        self.equipment = Equipment.objects.create(
+            name='Wheelchair', slug='wheelchair', rent_price_daily=Decimal('100.00')
+        )
+        self.today = date(2030, 6, 15)
+
+    def _rental(self, end_offset, status='active', **kwargs):
+        return EquipmentRental.objects.create(
+            customer=self.customer,
+            equipment=self.equipment,
+            rental_period='daily',
+            quantity=2,
+            start_date=self.today - timedelta(days=10),
+            end_date=self.today + timedelta(days=end_offset),
+            rental_price=Decimal('1000.00'),
+            delivery_address='Somewhere',
+            delivery_phone='9800000000',
+            status=status,
+            **kwargs
+        )
+
+    def test_sweep_updates_fees_and_notifies_once(self):
+        overdue = self._rental(-3)
+        due_soon = self._rental(1)
+        self._rental(10)
+        self._rental(-3, status='returned')
+
+        stats = RentalLifecycleService.sweep(today=self.today)
+
+        self.assertEqual(stats, {'due_soon': 1, 'overdue': 1, 'fees_updated': 1})
+        overdue.refresh_from_db()
+        # 3 days x 2 units x 100/day x 1.5
+        self.assertEqual(overdue.late_fee, Decimal('900.00'))
+        self.assertEqual(overdue.total_amount, Decimal('1900.00'))
+        # Locked fields untouched
+        self.assertEqual(overdue.end_date, self.today - timedelta(days=3))
+        self.assertEqual(
+            sorted(Notification.objects.values_list('notification_type', 'object_id')),
+            sorted([('rental_due', due_soon.id), ('rental_overdue', overdue.id)])
+        )
+
+        # Next day: fee grows, no duplicate notices
+        stats = RentalLifecycleService.sweep(today=self.today + timedelta(days=1))
+        overdue.refresh_from_db()
+        self.assertEqual(overdue.late_fee, Decimal('1200.00'))
+        self.assertEqual(Notification.objects.count(), 2)
+
+    def test_late_fee_is_charged_on_the_open_payment(self):
+        overdue = self._rental(-3)
+        payment = Payment.objects.create(
+            patient=self.customer, equipment_rental=overdue, amount=overdue.total_amount, payment_status='unpaid'
+        )
+
+        RentalLifecycleService.sweep(today=self.today)
+        RentalLifecycleService.sweep(today=self.today + timedelta(days=1))
+
+        payment.refresh_from_db()
+        self.assertEqual(payment.amount, Decimal('2200.00'))
+        self.assertEqual(Payment.objects.count(), 1)
+
+    def test_late_fee_on_a_paid_rental_gets_its_own_payment(self):
+        overdue = self._rental(-3)
+        Payment.objects.create(
+            patient=self.customer, equipment_rental=overdue, amount=overdue.total_amount, payment_status='paid'
+        )
+
+        RentalLifecycleService.sweep(today=self.today)
+        RentalLifecycleService.sweep(today=self.today + timedelta(days=1))
+
+        fee = Payment.objects.get(equipment_rental=overdue, payment_status='unpaid')
+        self.assertEqual(fee.amount, Decimal('1200.00'))
+        self.assertEqual((fee.source_type, fee.source_status), ('equipment_rental', 'active'))
+
+    def test_dry_run_changes_nothing(self):
+        overdue = self._rental(-3)
+
+        stats = RentalLifecycleService.sweep(today=self.today, dry_run=True)
+
+        self.assertEqual(stats['fees_updated'], 1)
+        overdue.refresh_from_db()
+        self.assertEqual(overdue.late_fee, Decimal('0.00'))
+        self.assertFalse(Notification.objects.exists())
+
+
+class RentalTransitionServiceTestCase(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(username='patient1', password='pass', role='patient')
+        self.equipment = Equipment.objects.create(
+            name='Walker', slug='walker', rent_price_daily=Decimal('50.00'), available_units=3
+        )
+
+    def test_return_settles_late_fee_and_restocks(self):
+        from apps.equipment.services import RentalTransitionService
+
+        today = date.today()
+        late = EquipmentRental.objects.create(
+            customer=self.customer, equipment=self.equipment, rental_period='daily', quantity=2,
+            start_date=today - timedelta(days=10), end_date=today - timedelta(days=2),
+            rental_price=Decimal('500.00'), delivery_address='Somewhere', delivery_phone='9800000000',
+            status='active',
+        )
+        on_time = EquipmentRental.objects.create(
+            customer=self.customer, equipment=self.equipment, rental_period='daily', quantity=1,
+            start_date=today - timedelta(days=3), end_date=today + timedelta(days=2),
+            rental_price=Decimal('200.00'), delivery_address='Somewhere', delivery_phone='9800000000',
+            status='confirmed',
+        )
+
+        returned = RentalTransitionService.return_rentals(EquipmentRental.objects.all())
+
+        self.assertEqual(len(returned), 2)
+        late.refresh_from_db()
+        on_time.refresh_from_db()
+        self.assertEqual(late.status, 'returned')
+        self.assertEqual(late.actual_return_date, today)
+        self.assertEqual(late.late_fee, Decimal('200.00'))
+        self.assertEqual(on_time.late_fee, Decimal('0.00'))
+        # No payment existed yet, so the new one covers rent and fee
+        self.assertEqual(Payment.objects.get(equipment_rental=late).amount, Decimal('700.00'))
+        self.assertFalse(Payment.objects.filter(equipment_rental=on_time).exists())
+        self.equipment.refresh_from_db()
+        self.assertEqual(self.equipment.available_units, 6)
+
+    def test_customer_return_charges_late_fee_on_open_payment(self):
+        today = date.today()
+        late = EquipmentRental.objects.create(
+            customer=self.customer, equipment=self.equipment, rental_period='daily', quantity=1,
+            start_date=today - timedelta(days=10), end_date=today - timedelta(days=2),
+            rental_price=Decimal('500.00'), delivery_address='Somewhere', delivery_phone='9800000000',
+            status='active',
+        )
+        payment = Payment.objects.create(
+            patient=self.customer, equipment_rental=late, amount=late.total_amount, payment_status='unpaid'
+        )
+        self.client.force_login(self.customer)
+
+        response = self.client.post(reverse('equipment:return_rental', args=[late.rental_number]))
+
+        self.assertRedirects(response, reverse('equipment:my_rentals'), fetch_redirect_response=False)
+        late.refresh_from_db()
+        payment.refresh_from_db()
+        self.assertEqual(late.status, 'returned')
+        self.assertEqual(late.late_fee, Decimal('100.00'))
+        self.assertEqual(payment.amount, late.total_amount)
+        self.assertEqual(payment.amount, Decimal('600.00'))
+        self.equipment.refresh_from_db()
+        self.assertEqual(self.equipment.available_units, 4)
+
+    def _rental(self, status, quantity=1):
+        today = date.today()
+        return EquipmentRental.objects.create(
+            customer=self.customer, equipment=self.equipment, rental_period='daily', quantity=quantity,
+            start_date=today, end_date=today + timedelta(days=5),
+            rental_price=Decimal('250.00'), delivery_address='Somewhere', delivery_phone='9800000000',
+            status=status,
+        )
+
+    def test_activate_notifies_customer(self):
+        from apps.equipment.services import RentalTransitionService
+
+        rental = self._rental('confirmed')
+
+        RentalTransitionService.activate.apply(EquipmentRental.objects.all())
+
+        rental.refresh_from_db()
+        self.assertEqual(rental.status, 'active')
+        self.assertTrue(Notification.objects.filter(notification_type='rental_started', object_id=rental.id).exists())
+
+    def test_cancel_restocks_and_refunds_open_payment(self):
+        from apps.equipment.services import RentalTransitionService
+
+        rental = self._rental('pending', quantity=2)
+        payment = Payment.objects.create(
+            patient=self.customer, equipment_rental=rental, amount=rental.total_amount, payment_status='unpaid'
+        )
+
+        RentalTransitionService.cancel.apply(EquipmentRental.objects.all())
+
+        rental.refresh_from_db()
+        payment.refresh_from_db()
+        self.equipment.refresh_from_db()
+        self.assertEqual(rental.status, 'cancelled')
+        self.assertEqual(payment.payment_status, 'refunded')
+        self.assertEqual(self.equipment.available_units, 5)
+
+    def test_rejected_states_are_left_alone(self):
+        from apps.equipment.services import RentalTransitionService
+
+        active = self._rental('active')
+        returned = self._rental('returned')
+
+        self.assertEqual(RentalTransitionService.cancel.apply(EquipmentRental.objects.filter(pk=active.pk)), [])
+        self.assertEqual(RentalTransitionService.return_rentals(EquipmentRental.objects.filter(pk=returned.pk)), [])
+        self.assertEqual(RentalTransitionService.activate.apply(EquipmentRental.objects.filter(pk=active.pk)), [])
+
+        self.assertEqual(
+            dict(EquipmentRental.objects.values_list('pk', 'status')),
+            {active.pk: 'active', returned.pk: 'returned'},
+        )
+        self.equipment.refresh_from_db()
+        self.assertEqual(self.equipment.available_units, 3)
@@ -7,9 +7,12 @@ from django.db import transaction
 from .models import Equipment, EquipmentCategory
 from .forms import EquipmentRentalForm, EquipmentPurchaseForm
 from django.utils import timezone
+from config.idempotency import idempotent
+from config.routers import use_replica
 
 
 
+@use_replica
 def equipment_list(request, category_slug=None):
     """
     Display list of equipment
@@ -83,6 +86,7 @@ def equipment_detail(request, slug):
 
 
 @login_required
+@idempotent
 def rent_equipment(request, equipment_id):
     """
     Rent equipment
@@ -145,6 +149,7 @@ def rent_equipment(request, equipment_id):
 
 
 @login_required
+@idempotent
 def buy_equipment(request, equipment_id):
     """
     Buy equipment
@@ -227,25 +232,14 @@ def my_purchases(request):
     View user's equipment purchases
     """
     from .models import EquipmentPurchase
-    # Prefetch related payments so we can surface an unpaid payment (if any)
+    # Annotate the unpaid payment (if any) so the template needs no extra queries
     purchases = (
         EquipmentPurchase.objects.filter(customer=request.user)
         .select_related('equipment')
-        .prefetch_related('payments')
+        .with_unpaid_payment()
         .order_by('-created_at')
     )
 
-    # Attach the first unpaid payment (if present) to each purchase to keep
-    # template logic simple and avoid extra DB queries in the template.
-    for p in purchases:
-        unpaid = None
-        # payments is prefetched, this iterates the cached queryset
-        for pay in p.payments.all():
-            if getattr(pay, 'payment_status', None) == 'unpaid':
-                unpaid = pay
-                break
-        p.unpaid_payment = unpaid
-
     context = {
         'purchases': purchases,
     }
@@ -392,16 +386,13 @@ def return_rental(request, rental_number):
         return redirect('equipment:rental_detail', rental_number=rental.rental_number)
 
     try:
-        rental.status = 'returned'
-        rental.actual_return_date = timezone.now().date()
-        rental.save()
-
-        # restore inventory
-        equipment = rental.equipment
-        equipment.available_units = getattr(equipment, 'available_units', 0) + rental.quantity
-        equipment.save()
+        from .services import RentalTransitionService
 
-        messages.success(request, f'Rental {rental.rental_number} marked as returned.')
+        # Same path as the admin action: settles the late fee on the open payment and restocks
+        if RentalTransitionService.return_rentals(EquipmentRental.objects.filter(pk=rental.pk), actor=request.user):
+            messages.success(request, f'Rental {rental.rental_number} marked as returned.')
+        else:
+            messages.error(request, 'Only active or confirmed rentals can be marked returned.')
     except Exception as e:
         messages.error(request, f'Could not mark returned: {e}')
 
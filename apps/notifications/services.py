@@ -2,6 +2,7 @@ from django.core.mail import EmailMultiAlternatives
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
 from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
 from .models import Notification, EmailLog, SMSLog, NotificationPreference
 import logging
@@ -153,3 +154,184 @@ class NotificationService:
             except Exception:
                 # If sms_log creation failed, nothing more we can do here
                 pass
+
+    @staticmethod
+    def send_bulk_notifications(entries, notification_type, action_text='View Details',
+                                send_email=True, send_sms=False):
+        """
+        Send many notifications with a constant number of queries.
+
+        `entries` is a list of dicts with keys user, title, message and
+        optionally related_object and action_url. In-app notifications are
+        written with one bulk_create and delivery is handed to the batched
+        email/SMS senders once the surrounding transaction commits, so no
+        message goes out for work that is rolled back and no row locks are
+        held while talking to SMTP/Twilio. Preferences are honoured the same
+        way as in send_notification. Returns the list of created
+        Notification rows.
+        """
+        from django.contrib.contenttypes.models import ContentType
+
+        if not entries:
+            return []
+
+        users = {entry['user'].pk: entry['user'] for entry in entries}
+        prefs = {
+            p.user_id: p for p in NotificationPreference.objects.filter(user_id__in=list(users))
+        }
+        missing = [NotificationPreference(user_id=user_id) for user_id in users if user_id not in prefs]
+        if missing:
+            NotificationPreference.objects.bulk_create(missing, ignore_conflicts=True)
+            for pref in missing:
+                prefs[pref.user_id] = pref
+
+        content_types = {}
+        notifications = []
+        emails = []
+        sms_messages = []
+        for entry in entries:
+            user = entry['user']
+            pref = prefs[user.pk]
+            related = entry.get('related_object')
+
+            if pref.enable_in_app:
+                notification = Notification(
+                    user=user,
+                    notification_type=notification_type,
+                    title=entry['title'],
+                    message=entry['message'],
+                    action_url=entry.get('action_url', ''),
+                    action_text=action_text,
+                )
+                if related is not None:
+                    model = type(related)
+                    if model not in content_types:
+                        content_types[model] = ContentType.objects.get_for_model(model)
+                    notification.content_type = content_types[model]
+                    notification.object_id = related.pk
+                notifications.append(notification)
+
+            if send_email and pref.enable_email:
+                emails.append((user, entry['title'], entry['message'], entry.get('action_url', '')))
+            if send_sms and pref.enable_sms:
+                sms_messages.append((user, entry['message']))
+
+        created = Notification.objects.bulk_create(notifications)
+        if emails:
+            transaction.on_commit(lambda: NotificationService.send_bulk_email(emails, notification_type))
+        if sms_messages:
+            transaction.on_commit(lambda: NotificationService.send_bulk_sms(sms_messages, notification_type))
+        return created
+
+    @staticmethod
+    def send_bulk_email(messages, email_type):
+        """
+        Batched counterpart of send_email_notification. `messages` is a list
+        of (user, subject, message, action_url) tuples. All logs are created
+        with one bulk_create, sent over a single backend connection and
+        their statuses written back with one bulk_update.
+        """
+        from django.core.mail import get_connection
+
+        if not messages:
+            return
+
+        logs = EmailLog.objects.bulk_create([
+            EmailLog(recipient=user, subject=subject, message=message, email_type=email_type)
+            for user, subject, message, action_url in messages
+        ])
+
+        outgoing = []
+        for (user, subject, message, action_url) in messages:
+            html_message = render_to_string('notifications/email_template.html', {
+                'user': user,
+                'title': subject,
+                'message': message,
+                'action_url': action_url,
+                'site_name': 'UH Care',
+            })
+            email = EmailMultiAlternatives(
+                subject=subject,
+                body=strip_tags(html_message),
+                from_email=getattr(settings, 'DEFAULT_FROM_EMAIL', 'noreply@localhost'),
+                to=[user.email]
+            )
+            email.attach_alternative(html_message, "text/html")
+            outgoing.append(email)
+
+        now = timezone.now()
+        try:
+            connection = get_connection()
+            connection.open()
+            try:
+                for email, log in zip(outgoing, logs):
+                    try:
+                        connection.send_messages([email])
+                        log.status = 'sent'
+                        log.sent_at = now
+                    except Exception as e:
+                        logger.error(f"Failed to send email to {log.recipient.email}: {str(e)}")
+                        log.status = 'failed'
+                        log.error_message = str(e)
+            finally:
+                connection.close()
+        except Exception as e:
+            logger.error(f"Email backend unavailable for {len(logs)} messages: {str(e)}")
+            for log in logs:
+                if log.status == 'pending':
+                    log.status = 'failed'
+                    log.error_message = str(e)
+
+        EmailLog.objects.bulk_update(logs, ['status', 'sent_at', 'error_message'])
+        logger.info(f"Sent {sum(1 for log in logs if log.status == 'sent')}/{len(logs)} {email_type} emails")
+
+    @staticmethod
+    def send_bulk_sms(messages, sms_type):
+        """
+        Batched counterpart of send_sms_notification. `messages` is a list
+        of (user, message) tuples; one Twilio client is reused for the whole
+        batch and logs are written with bulk_create/bulk_update.
+        """
+        if not messages:
+            return
+
+        logs = SMSLog.objects.bulk_create([
+            SMSLog(
+                recipient=user,
+                phone_number=getattr(user, 'phone_number', ''),
+                message=message,
+                sms_type=sms_type,
+            )
+            for user, message in messages
+        ])
+
+        twilio_sid = getattr(settings, 'TWILIO_ACCOUNT_SID', '')
+        twilio_token = getattr(settings, 'TWILIO_AUTH_TOKEN', '')
+        twilio_from = getattr(settings, 'TWILIO_PHONE_NUMBER', '')
+        if not (twilio_sid and twilio_token and twilio_from):
+            # Twilio not configured; rows stay pending
+            logger.info(f"SMS provider not configured; saved {len(logs)} SMS as pending")
+            return
+
+        try:
+            from twilio.rest import Client
+            client = Client(twilio_sid, twilio_token)
+        except Exception as e:
+            logger.error(f"Twilio client unavailable: {e}")
+            for log in logs:
+                log.status = 'failed'
+                log.error_message = str(e)
+            SMSLog.objects.bulk_update(logs, ['status', 'error_message'])
+            return
+
+        now = timezone.now()
+        for log in logs:
+            try:
+                client.messages.create(body=log.message, from_=twilio_from, to=log.phone_number)
+                log.status = 'sent'
+                log.sent_at = now
+            except Exception as e:
+                logger.error(f"Twilio SMS failed for {log.phone_number}: {e}")
+                log.status = 'failed'
+                log.error_message = str(e)
+        SMSLog.objects.bulk_update(logs, ['status', 'sent_at', 'error_message'])
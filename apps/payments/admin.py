@@ -3,6 +3,7 @@ Payments Admin Configuration
 """
 
 from django.contrib import admin
+from django.urls import reverse
 from django.utils.html import format_html
 from .models import Payment
 from django.contrib.admin import SimpleListFilter
@@ -53,14 +54,17 @@ class PaymentAdmin(admin.ModelAdmin):
     raw_id_fields = ['patient', 'appointment', 'verified_by', 'pharmacy_order', 'equipment_purchase', 'equipment_rental']
     
     # Include a preview field for uploaded payment proof (image URL)
-    readonly_fields = readonly_fields + ['payment_proof_preview']
+    readonly_fields = readonly_fields + ['payment_proof_preview', 'payment_proof_duplicate', 'payment_proof_sha256']
 
     fieldsets = (
         ('Payment Information', {
             'fields': ('patient', 'appointment', 'pharmacy_order', 'equipment_purchase', 'equipment_rental', 'amount', 'payment_method', 'payment_status')
         }),
         ('Transaction Details', {
-            'fields': ('transaction_id', 'payment_proof_preview', 'payment_proof_url', 'payment_date')
+            'fields': (
+                'transaction_id', 'payment_proof_preview', 'payment_proof_duplicate', 'payment_proof_sha256',
+                'payment_proof_url', 'payment_date',
+            )
         }),
         ('Verification', {
             'fields': ('verified_by', 'verified_at')
@@ -171,27 +175,52 @@ class PaymentAdmin(admin.ModelAdmin):
     mark_as_unpaid.short_description = 'Mark selected as Unpaid'
 
     def payment_proof_preview(self, obj):
-        """Render an inline image preview for payment proof URLs in the admin change view."""
+        """
+        Inline thumbnail of the payment proof linking to the larger preview.
+        Until the background task has made them, the original upload is shown.
+        """
+        image_style = 'max-width:520px; max-height:360px; object-fit:contain; border:1px solid #eee; padding:4px; background:#fff;'
+        if obj.payment_proof_thumbnail_file:
+            target = obj.payment_proof_preview_file or obj.payment_proof_file
+            return format_html(
+                '<a href="{}" target="_blank"><img src="{}" style="{}" /></a>'
+                '<br><a href="{}" target="_blank">Original upload</a>',
+                target.url, obj.payment_proof_thumbnail_file.url, image_style, obj.payment_proof_file.url
+            )
+
         # Prefer uploaded file if present
         if getattr(obj, 'payment_proof_file', None):
             try:
                 url = obj.payment_proof_file.url
                 return format_html(
-                    '<a href="{}" target="_blank"><img src="{}" style="max-width:520px; max-height:360px; object-fit:contain; border:1px solid #eee; padding:4px; background:#fff;" /></a>',
-                    url, url
+                    '<a href="{0}" target="_blank"><img src="{0}" style="{1}" /></a>'
+                    '<br><em>Preview is being generated</em>',
+                    url, image_style
                 )
             except Exception:
                 pass
 
         if obj.payment_proof_url:
             return format_html(
-                '<a href="{0}" target="_blank"><img src="{0}" style="max-width:520px; max-height:360px; object-fit:contain; border:1px solid #eee; padding:4px; background:#fff;" /></a>',
-                obj.payment_proof_url
+                '<a href="{0}" target="_blank"><img src="{0}" style="{1}" /></a>',
+                obj.payment_proof_url, image_style
             )
 
         return "No proof uploaded"
     payment_proof_preview.short_description = 'Payment proof'
-    payment_proof_preview.short_description = 'Payment proof'
+
+    def payment_proof_duplicate(self, obj):
+        if obj.payment_proof_duplicate_of_id:
+            return format_html(
+                '<strong style="color:#FF3B30;">Same image as the proof of '
+                '<a href="{0}">Payment #{1}</a></strong>',
+                reverse('admin:payments_payment_change', args=[obj.payment_proof_duplicate_of_id]),
+                obj.payment_proof_duplicate_of_id
+            )
+        if obj.payment_proof_processed_at:
+            return 'No duplicate found'
+        return '-'
+    payment_proof_duplicate.short_description = 'Duplicate check'
 
     def save_model(self, request, obj, form, change):
         """
@@ -4,3 +4,7 @@ class PaymentsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.payments'
     verbose_name = 'Payments'
+
+    def ready(self):
+        # Connects the receivers that keep Payment.source_status in step
+        from . import services  # noqa: F401
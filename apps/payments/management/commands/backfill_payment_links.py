@@ -1,73 +1,141 @@
-from django.core.management.base import BaseCommand
-from django.utils import timezone
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
 from datetime import timedelta
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
 from apps.payments.models import Payment
 
 
+class CandidateIndex:
+    """
+    Rows of one domain table grouped by (customer_id, total_amount), each
+    group holding its created_at values sorted so a time window is two
+    bisects instead of a query. Each candidate keeps its status so a match
+    can set the payment's source fields without another lookup.
+    """
+
+    def __init__(self, rows):
+        groups = defaultdict(list)
+        for customer_id, total_amount, created_at, pk, status in rows:
+            groups[(customer_id, total_amount)].append((created_at, pk, status))
+        self.groups = {}
+        for key, entries in groups.items():
+            # Rows without a timestamp sort first and are never inside a window
+            entries.sort(key=lambda entry: (entry[0] is not None, entry[0] or 0, entry[1]))
+            self.groups[key] = (
+                [created_at for created_at, _, _ in entries if created_at is not None],
+                [(pk, status) for created_at, pk, status in entries if created_at is not None],
+                len(entries),
+                entries[0][1:],
+            )
+
+    def match(self, customer_id, amount, created_at, window):
+        """Return (id, status) of the only candidate for this payment, or None."""
+        group = self.groups.get((customer_id, amount))
+        if group is None:
+            return None
+        times, candidates, total, first = group
+        if created_at is None:
+            return first if total == 1 else None
+        lo = bisect_left(times, created_at - window)
+        hi = bisect_right(times, created_at + window)
+        return candidates[lo] if hi - lo == 1 else None
+
+
 class Command(BaseCommand):
     help = 'Backfill Payment foreign keys to pharmacy orders and equipment purchases/rentals when possible'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help='Payments matched and written per batch')
+        parser.add_argument('--window-days', type=int, default=3, help='Match orders created this many days either side of the payment')
+        parser.add_argument('--dry-run', action='store_true', help='Report the links without saving them')
+
     def handle(self, *args, **options):
-        self.stdout.write('Starting backfill of payment links...')
-        unmatched = 0
-        linked = 0
+        from apps.equipment.models import EquipmentPurchase, EquipmentRental
+        from apps.pharmacy.models import PharmacyOrder
 
-        # Define time window to search orders around payment creation
-        window = timedelta(days=3)
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be at least 1')
+        window = timedelta(days=options['window_days'])
+        dry_run = options['dry_run']
+        verbose = options['verbosity'] >= 2
 
-        # Backfill pharmacy orders
-        from apps.pharmacy.models import PharmacyOrder
-        payments = Payment.objects.filter(pharmacy_order__isnull=True, appointment__isnull=True)
-        for p in payments:
-            # try to match pharmacy order by customer and amount in time window
-            candidates = PharmacyOrder.objects.filter(
-                customer=p.patient,
-                total_amount=p.amount
-            )
-            if p.created_at:
-                candidates = candidates.filter(created_at__range=(p.created_at - window, p.created_at + window))
+        # Tried in this order; the first table with exactly one candidate wins
+        sources = (
+            ('pharmacy_order', 'PharmacyOrder', PharmacyOrder),
+            ('equipment_purchase', 'EquipmentPurchase', EquipmentPurchase),
+            ('equipment_rental', 'EquipmentRental', EquipmentRental),
+        )
 
-            if candidates.count() == 1:
-                order = candidates.first()
-                p.pharmacy_order = order
-                p.save()
-                linked += 1
-                self.stdout.write(f'Linked Payment {p.id} -> PharmacyOrder {order.id}')
+        payments = Payment.objects.filter(
+            appointment__isnull=True, pharmacy_order__isnull=True,
+            equipment_purchase__isnull=True, equipment_rental__isnull=True,
+        )
+        total = payments.count()
+        self.stdout.write(f'Starting backfill of payment links for {total} unlinked payment(s)...')
 
-        # Backfill equipment purchases
-        from apps.equipment.models import EquipmentPurchase, EquipmentRental
-        payments = Payment.objects.filter(equipment_purchase__isnull=True, equipment_rental__isnull=True, appointment__isnull=True, pharmacy_order__isnull=True)
-        for p in payments:
-            # try purchase
-            candidates = EquipmentPurchase.objects.filter(
-                customer=p.patient,
-                total_amount=p.amount
+        started = perf_counter()
+        processed = linked = unmatched = 0
+        last_id = 0
+        while True:
+            # Keyset pagination: each batch is an index range scan on the primary key
+            batch = list(
+                payments.filter(id__gt=last_id).order_by('id')
+                .only('id', 'patient_id', 'amount', 'created_at')[:batch_size]
             )
-            if p.created_at:
-                candidates = candidates.filter(created_at__range=(p.created_at - window, p.created_at + window))
-            if candidates.count() == 1:
-                purchase = candidates.first()
-                p.equipment_purchase = purchase
-                p.save()
-                linked += 1
-                self.stdout.write(f'Linked Payment {p.id} -> EquipmentPurchase {purchase.id}')
-                continue
-
-            # try rental
-            candidates = EquipmentRental.objects.filter(
-                customer=p.patient,
-                total_amount=p.amount
+            if not batch:
+                break
+            last_id = batch[-1].id
+
+            customer_ids = {payment.patient_id for payment in batch}
+            indexes = [
+                (field, label, CandidateIndex(
+                    model.objects.filter(customer_id__in=customer_ids)
+                    .values_list('customer_id', 'total_amount', 'created_at', 'id', 'status')
+                    .order_by().iterator(chunk_size=batch_size)
+                ))
+                for field, label, model in sources
+            ]
+
+            changed = []
+            for payment in batch:
+                for field, label, index in indexes:
+                    match = index.match(payment.patient_id, payment.amount, payment.created_at, window)
+                    if match is not None:
+                        target_id, status = match
+                        setattr(payment, f'{field}_id', target_id)
+                        # The payment had no links, so this source sets its source fields
+                        payment.source_type, payment.source_status = field, status
+                        changed.append((payment, field))
+                        if verbose:
+                            self.stdout.write(f'Linked Payment {payment.id} -> {label} {target_id}')
+                        break
+                else:
+                    unmatched += 1
+
+            if changed and not dry_run:
+                now = timezone.now()
+                fields = {'updated_at', 'source_type', 'source_status'}
+                for payment, field in changed:
+                    payment.updated_at = now
+                    fields.add(field)
+                # Only the link and source columns change, so Payment.save()'s per-row checks are not needed
+                with transaction.atomic():
+                    Payment.objects.bulk_update([payment for payment, _ in changed], sorted(fields))
+
+            processed += len(batch)
+            linked += len(changed)
+            rate = processed / max(perf_counter() - started, 1e-9)
+            self.stdout.write(
+                f'Processed {processed}/{total} payment(s): linked={linked}, unmatched={unmatched} ({rate:.0f}/s)'
             )
-            if p.created_at:
-                candidates = candidates.filter(created_at__range=(p.created_at - window, p.created_at + window))
-            if candidates.count() == 1:
-                rental = candidates.first()
-                p.equipment_rental = rental
-                p.save()
-                linked += 1
-                self.stdout.write(f'Linked Payment {p.id} -> EquipmentRental {rental.id}')
-                continue
-
-            unmatched += 1
-
-        self.stdout.write(self.style.SUCCESS(f'Backfill complete: linked={linked}, unmatched={unmatched}'))
+
+        prefix = 'Dry run' if dry_run else 'Backfill complete'
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix}: linked={linked}, unmatched={unmatched} in {perf_counter() - started:.2f}s'
+        ))
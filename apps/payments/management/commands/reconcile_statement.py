@@ -0,0 +1,64 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.accounts.models import User
+from apps.payments.reconciliation import StatementError, StatementReconciler, read_statement, write_report
+
+
+class Command(BaseCommand):
+    help = (
+        "Match a bank/QR statement (CSV or OFX) against unpaid and pending payments. "
+        "Run with --apply to mark matched payments paid."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("statement", help="Path to the statement file.")
+        parser.add_argument("--format", choices=["csv", "ofx"], help="Statement format (default: from the file extension).")
+        parser.add_argument("--report", help="Write the full matched/ambiguous/unmatched report to this CSV file.")
+        parser.add_argument("--date-tolerance", type=int, default=1, help="Days either side allowed for amount/date matching.")
+        parser.add_argument("--apply", action="store_true", help="Mark payments matched by transaction id as paid.")
+        parser.add_argument(
+            "--include-amount-date",
+            action="store_true",
+            help="With --apply, also settle payments matched only by amount and date.",
+        )
+        parser.add_argument("--staff", help="Username recorded as the verifier when applying.")
+
+    def handle(self, *args, **options):
+        path = options["statement"]
+        fmt = options["format"] or os.path.splitext(path)[1].lstrip(".").lower()
+        if fmt not in ("csv", "ofx", "qfx"):
+            raise CommandError("Cannot tell the statement format; pass --format csv or --format ofx.")
+        fmt = "ofx" if fmt == "qfx" else fmt
+
+        staff = None
+        if options["staff"]:
+            staff = User.objects.filter(username=options["staff"], is_staff=True).first()
+            if staff is None:
+                raise CommandError(f"No staff user named {options['staff']!r}.")
+
+        started = time.perf_counter()
+        try:
+            with open(path, "rb") as fh:
+                report = StatementReconciler(options["date_tolerance"]).reconcile(read_statement(fh, fmt))
+        except (OSError, StatementError) as exc:
+            raise CommandError(str(exc))
+        elapsed = time.perf_counter() - started
+
+        for key, value in report.summary().items():
+            self.stdout.write(f"{key.replace('_', ' '):<20} {value}")
+        self.stdout.write(f"{'reconciled in':<20} {elapsed:.2f}s")
+
+        if options["report"]:
+            with open(options["report"], "w", newline="") as fh:
+                write_report(report, fh)
+            self.stdout.write(f"Report written to {options['report']}")
+
+        if options["apply"]:
+            methods = ("transaction_id", "amount_date") if options["include_amount_date"] else ("transaction_id",)
+            settled = StatementReconciler.apply(report, staff, methods=methods)
+            self.stdout.write(self.style.SUCCESS(f"Marked {settled} payment(s) paid."))
+        elif report.matched:
+            self.stdout.write(self.style.NOTICE("Dry run. Re-run with --apply to mark matched payments paid."))
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.payments.models import Payment
+from apps.payments.services import PaymentQRService
+
+
+class Command(BaseCommand):
+    help = (
+        "Pre-render QR codes for unpaid online payments so the QR page never encodes on request, "
+        "and delete rendered images no longer needed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--format",
+            nargs="*",
+            choices=sorted(PaymentQRService.FORMATS),
+            default=["png"],
+            dest="formats",
+            help="Image formats to render (default: png, the one the QR page embeds).",
+        )
+        parser.add_argument("--batch-size", type=int, default=500, help="Rows fetched per query.")
+        parser.add_argument(
+            "--no-prune",
+            action="store_false",
+            dest="prune",
+            help="Keep rendered images of payments that are no longer unpaid online payments.",
+        )
+
+    def handle(self, *args, **options):
+        if not PaymentQRService.is_available():
+            raise CommandError("The qrcode package is not installed.")
+
+        payments = Payment.objects.filter(
+            payment_status="unpaid", payment_method="online"
+        ).only("id", "amount").order_by("id")
+
+        rendered = cached = 0
+        keep = set()
+        for payment in payments.iterator(chunk_size=options["batch_size"]):
+            keep.add(PaymentQRService.digest(payment))
+            for fmt in options["formats"]:
+                _, created = PaymentQRService.get(payment, fmt)
+                if created:
+                    rendered += 1
+                else:
+                    cached += 1
+
+        removed = PaymentQRService.prune(keep) if options["prune"] else 0
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rendered {rendered} QR image(s); {cached} already cached; {removed} stale removed."
+        ))
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.7 on 2026-10-19 15:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0004_make_payment_method_nullable'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='payment_proof_duplicate_of',
+            field=models.ForeignKey(blank=True, help_text='Earlier payment whose proof has the same content', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='duplicate_proofs', to='payments.payment'),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='payment_proof_preview_file',
+            field=models.ImageField(blank=True, null=True, upload_to='payments/proofs/previews/'),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='payment_proof_processed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='payment_proof_sha256',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='payment_proof_thumbnail_file',
+            field=models.ImageField(blank=True, null=True, upload_to='payments/proofs/thumbnails/'),
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='payment_status',
+            field=models.CharField(choices=[('unpaid', 'Unpaid'), ('pending', 'Pending verification'), ('paid', 'Paid'), ('refunded', 'Refunded'), ('partial', 'Partially Paid')], default='unpaid', max_length=20),
+        ),
+    ]
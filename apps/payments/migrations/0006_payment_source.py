@@ -0,0 +1,49 @@
+# Generated by Django 4.2.7 on 2026-10-19 15:44
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+# Payment link -> source model, in the precedence order PaymentSourceService uses
+SOURCES = (
+    ('appointment', 'appointments', 'Appointment'),
+    ('pharmacy_order', 'pharmacy', 'PharmacyOrder'),
+    ('equipment_purchase', 'equipment', 'EquipmentPurchase'),
+    ('equipment_rental', 'equipment', 'EquipmentRental'),
+)
+
+
+def backfill_sources(apps, schema_editor):
+    # One set-based UPDATE per source type; rows claimed by an earlier type are skipped
+    Payment = apps.get_model('payments', 'Payment')
+    for field, app_label, model_name in SOURCES:
+        model = apps.get_model(app_label, model_name)
+        Payment.objects.filter(**{f'{field}__isnull': False}, source_type='').update(
+            source_type=field,
+            source_status=Subquery(model.objects.filter(pk=OuterRef(f'{field}_id')).values('status')[:1]),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0005_payment_proof_pipeline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='source_status',
+            field=models.CharField(blank=True, default='', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='source_type',
+            field=models.CharField(blank=True, choices=[('appointment', 'Appointment'), ('pharmacy_order', 'Pharmacy order'), ('equipment_purchase', 'Equipment purchase'), ('equipment_rental', 'Equipment rental')], default='', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['patient', 'payment_status', 'source_status'], name='payments_patient_source_idx'),
+        ),
+        migrations.RunPython(backfill_sources, migrations.RunPython.noop),
+    ]
@@ -19,6 +19,13 @@ class Payment(models.Model):
         ('refunded', 'Refunded'),
         ('partial', 'Partially Paid'),
     )
+
+    SOURCE_TYPE_CHOICES = (
+        ('appointment', 'Appointment'),
+        ('pharmacy_order', 'Pharmacy order'),
+        ('equipment_purchase', 'Equipment purchase'),
+        ('equipment_rental', 'Equipment rental'),
+    )
     
     # Reference (can be expanded for equipment, pharmacy later)
     appointment = models.ForeignKey(
@@ -53,6 +60,12 @@ class Payment(models.Model):
         blank=True,
         related_name='payments'
     )
+
+    # Which of the links above this payment is for, and that record's status,
+    # copied here so balance queries can skip cancelled sources without joining
+    # all four tables. Kept in step by PaymentSourceService.
+    source_type = models.CharField(max_length=20, choices=SOURCE_TYPE_CHOICES, blank=True, default='')
+    source_status = models.CharField(max_length=20, blank=True, default='')
     
     # Payment Details
     patient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='payments')
@@ -66,6 +79,20 @@ class Payment(models.Model):
     payment_proof_url = models.URLField(blank=True, null=True, help_text="Screenshot of payment")
     # Optional uploaded proof file (stored in MEDIA_ROOT/payments/proofs/)
     payment_proof_file = models.ImageField(upload_to='payments/proofs/', blank=True, null=True)
+    # Derived from payment_proof_file by the process_payment_proof task
+    # (apps.payments.services.PaymentProofService)
+    payment_proof_preview_file = models.ImageField(upload_to='payments/proofs/previews/', blank=True, null=True)
+    payment_proof_thumbnail_file = models.ImageField(upload_to='payments/proofs/thumbnails/', blank=True, null=True)
+    payment_proof_sha256 = models.CharField(max_length=64, blank=True, db_index=True)
+    payment_proof_duplicate_of = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='duplicate_proofs',
+        help_text="Earlier payment whose proof has the same content"
+    )
+    payment_proof_processed_at = models.DateTimeField(null=True, blank=True)
     
     # Verification
     verified_by = models.ForeignKey(
@@ -87,7 +114,9 @@ class Payment(models.Model):
     class Meta:
         db_table = 'payments'
         indexes = [
-            models.Index(fields=['patient', 'payment_status']),
+            # Also serves (patient, payment_status) lookups as a prefix
+            models.Index(fields=['patient', 'payment_status', 'payment_method'], name='payments_patient_method_idx'),
+            models.Index(fields=['patient', 'payment_status', 'source_status'], name='payments_patient_source_idx'),
             models.Index(fields=['payment_status']),
             models.Index(fields=['created_at']),
         ]
@@ -104,7 +133,10 @@ class Payment(models.Model):
         attribute on the instance to True to permit overriding, which the admin
         UI will do for staff users).
         """
+        from .services import PaymentSourceService
+
         # Only enforce immutability when this is an update to an existing record
+        old = None
         if self.pk:
             try:
                 old = Payment.objects.get(pk=self.pk)
@@ -121,4 +153,5 @@ class Payment(models.Model):
                     from django.core.exceptions import ValidationError
                     raise ValidationError('Payment method is locked and cannot be changed once set.')
 
+        PaymentSourceService.refresh(self, old)
         return super().save(*args, **kwargs)
\ No newline at end of file
@@ -0,0 +1,314 @@
+"""
+UH Care - Bank statement reconciliation
+
+Matches the lines of a bank/QR statement (CSV or OFX) against unpaid and
+pending-verification payments:
+
+1. The statement is read line by line into two hash indexes: normalised
+   transaction id -> lines, and (amount, date) -> lines.
+2. Open payments are fetched in one query and each probes the indexes:
+   by its transaction id first, else by its amount around the date it was
+   created or last updated.
+3. A payment whose probe finds exactly one line, which no other payment
+   also claims, is matched; several candidates (or a shared line) make it
+   ambiguous; nothing found leaves it unmatched. Statement lines no
+   payment claimed are reported too: money received with no record.
+
+Matched payments are settled through PaymentVerificationService.approve,
+so the status, balance and notification updates are the same bulk path
+staff use in the verification queue.
+"""
+
+import csv
+import io
+import re
+from collections import defaultdict, namedtuple
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.utils import timezone
+
+from .models import Payment
+
+
+StatementLine = namedtuple('StatementLine', 'number transaction_id amount date description')
+Match = namedtuple('Match', 'payment_id line method')
+Ambiguity = namedtuple('Ambiguity', 'payment_id lines reason')
+
+
+class StatementError(ValueError):
+    pass
+
+
+# Accepted CSV header names, compared case-insensitively with spaces/dashes as underscores
+CSV_COLUMNS = {
+    'transaction_id': ('transaction_id', 'transaction_ref', 'reference', 'reference_no', 'ref', 'txn_id', 'utr'),
+    'amount': ('amount', 'credit', 'credit_amount', 'deposit'),
+    'date': ('date', 'transaction_date', 'value_date', 'posted_date', 'txn_date'),
+    'description': ('description', 'narration', 'details', 'remarks', 'memo'),
+}
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%Y/%m/%d', '%d %b %Y', '%d-%b-%Y', '%d%m%Y')
+
+_NON_ALNUM = re.compile(r'[^0-9A-Z]')
+
+
+def normalize_transaction_id(value):
+    """Bank references are compared without case, spaces or punctuation."""
+    return _NON_ALNUM.sub('', (value or '').upper())
+
+
+def parse_amount(value):
+    try:
+        amount = Decimal((value or '').replace(',', '').strip())
+    except InvalidOperation:
+        return None
+    return amount.quantize(Decimal('0.01'))
+
+
+def parse_date(value):
+    value = (value or '').strip()
+    if not value:
+        return None
+    # ISO timestamps and OFX's YYYYMMDDHHMMSS[.xxx][TZ]; eight digits that aren't
+    # a valid YYYYMMDD (e.g. a DDMMYYYY CSV column) fall through to DATE_FORMATS
+    if re.match(r'^\d{8}', value):
+        try:
+            return date(int(value[:4]), int(value[4:6]), int(value[6:8]))
+        except ValueError:
+            pass
+    value = value.split('T')[0].split(' ')[0] if re.match(r'^\d{4}-\d{2}-\d{2}[T ]', value) else value
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def read_csv(fh):
+    """Yield StatementLines from a CSV text stream; only credits (positive amounts) are kept."""
+    reader = csv.reader(fh)
+    try:
+        header = next(reader)
+    except StopIteration:
+        return
+    names = [re.sub(r'[\s\-]+', '_', name.strip().lower()) for name in header]
+    columns = {}
+    for field, aliases in CSV_COLUMNS.items():
+        for alias in aliases:
+            if alias in names:
+                columns[field] = names.index(alias)
+                break
+    if 'amount' not in columns or ('transaction_id' not in columns and 'date' not in columns):
+        raise StatementError(
+            'CSV statement needs an amount column and a transaction id or date column; got: ' + ', '.join(header)
+        )
+
+    def cell(row, field):
+        index = columns.get(field)
+        return row[index] if index is not None and index < len(row) else ''
+
+    for number, row in enumerate(reader, start=2):
+        amount = parse_amount(cell(row, 'amount'))
+        if amount is None or amount <= 0:
+            continue
+        yield StatementLine(
+            number, cell(row, 'transaction_id').strip(), amount, parse_date(cell(row, 'date')),
+            cell(row, 'description').strip(),
+        )
+
+
+_OFX_TAG = re.compile(r'<(/?)([A-Z0-9.]+)>([^<\r\n]*)', re.IGNORECASE)
+
+
+def read_ofx(fh):
+    """
+    Yield StatementLines from an OFX (SGML or XML) text stream, one
+    <STMTTRN> at a time. REFNUM is the bank reference patients quote;
+    FITID is used when it is missing.
+    """
+    current = None
+    number = 0
+    for text in fh:
+        for closing, tag, value in _OFX_TAG.findall(text):
+            tag = tag.upper()
+            if tag == 'STMTTRN':
+                if not closing:
+                    number += 1
+                    current = {}
+                    continue
+                if current is not None:
+                    amount = parse_amount(current.get('TRNAMT'))
+                    if amount is not None and amount > 0:
+                        yield StatementLine(
+                            number, current.get('REFNUM') or current.get('FITID', ''), amount,
+                            parse_date(current.get('DTPOSTED')), current.get('MEMO') or current.get('NAME', ''),
+                        )
+                current = None
+            elif current is not None and not closing:
+                current[tag] = value.strip()
+
+
+def read_statement(fh, fmt):
+    """`fh` is a binary or text stream; `fmt` is 'csv' or 'ofx'."""
+    if not isinstance(fh, io.TextIOBase):
+        fh = io.TextIOWrapper(fh, encoding='utf-8-sig', errors='replace', newline='')
+    if fmt == 'ofx':
+        return read_ofx(fh)
+    if fmt == 'csv':
+        return read_csv(fh)
+    raise StatementError(f'Unknown statement format: {fmt}')
+
+
+class StatementIndex:
+    """Hash indexes over statement lines on transaction id and (amount, date)."""
+
+    def __init__(self, lines):
+        self.by_transaction_id = defaultdict(list)
+        self.by_amount_date = defaultdict(list)
+        self.lines = []
+        for line in lines:
+            self.lines.append(line)
+            key = normalize_transaction_id(line.transaction_id)
+            if key:
+                self.by_transaction_id[key].append(line)
+            if line.date is not None:
+                self.by_amount_date[(line.amount, line.date)].append(line)
+        self.by_transaction_id.default_factory = None
+        self.by_amount_date.default_factory = None
+
+
+class ReconciliationReport:
+    def __init__(self, index):
+        self.index = index
+        self.matched = []
+        self.ambiguous = []
+        self.unmatched_payments = []
+        self.unmatched_lines = []
+        self.payments = {}
+
+    def summary(self):
+        return {
+            'statement_lines': len(self.index.lines),
+            'payments_checked': len(self.payments),
+            'matched': len(self.matched),
+            'ambiguous': len(self.ambiguous),
+            'unmatched_payments': len(self.unmatched_payments),
+            'unmatched_lines': len(self.unmatched_lines),
+        }
+
+
+class StatementReconciler:
+    OPEN_STATUSES = ('unpaid', 'pending')
+
+    def __init__(self, date_tolerance_days=1):
+        self.date_tolerance = timedelta(days=date_tolerance_days)
+
+    def open_payments(self):
+        return Payment.objects.filter(
+            payment_status__in=self.OPEN_STATUSES
+        ).exclude(payment_method='cash').values('id', 'transaction_id', 'amount', 'created_at', 'updated_at')
+
+    def candidate_dates(self, payment):
+        # The transfer happens between the payment being raised and the proof being submitted
+        start = timezone.localtime(payment['created_at']).date() - self.date_tolerance
+        end = timezone.localtime(payment['updated_at']).date() + self.date_tolerance
+        day = start
+        while day <= end:
+            yield day
+            day += timedelta(days=1)
+
+    def probe(self, index, payment):
+        """Return (candidate lines, method, reason-if-ambiguous) for one payment."""
+        key = normalize_transaction_id(payment['transaction_id'])
+        if key and key in index.by_transaction_id:
+            lines = index.by_transaction_id[key]
+            exact = [line for line in lines if line.amount == payment['amount']]
+            if exact:
+                return exact, 'transaction_id', 'duplicate transaction id on statement' if len(exact) > 1 else None
+            return lines, 'transaction_id', 'amount differs from statement'
+
+        amount = Decimal(payment['amount']).quantize(Decimal('0.01'))
+        lines = []
+        for day in self.candidate_dates(payment):
+            lines.extend(index.by_amount_date.get((amount, day), ()))
+        return lines, 'amount_date', 'several statement lines with this amount and date' if len(lines) > 1 else None
+
+    def reconcile(self, lines):
+        index = StatementIndex(lines)
+        report = ReconciliationReport(index)
+
+        claims = defaultdict(list)
+        probes = {}
+        for payment in self.open_payments().iterator(chunk_size=2000):
+            report.payments[payment['id']] = payment
+            candidates, method, reason = self.probe(index, payment)
+            probes[payment['id']] = (candidates, method, reason)
+            for line in candidates:
+                claims[line.number].append(payment['id'])
+
+        claimed = set()
+        for payment_id, (candidates, method, reason) in probes.items():
+            if not candidates:
+                report.unmatched_payments.append(payment_id)
+                continue
+            claimed.update(line.number for line in candidates)
+            if reason:
+                report.ambiguous.append(Ambiguity(payment_id, candidates, reason))
+                continue
+            line = candidates[0]
+            if len(claims[line.number]) > 1:
+                report.ambiguous.append(Ambiguity(
+                    payment_id, candidates, 'statement line also matches payment(s) ' + ', '.join(
+                        f'#{other}' for other in claims[line.number] if other != payment_id
+                    )
+                ))
+                continue
+            report.matched.append(Match(payment_id, line, method))
+
+        report.unmatched_lines = [line for line in index.lines if line.number not in claimed]
+        return report
+
+    @staticmethod
+    def apply(report, staff, methods=('transaction_id',)):
+        """
+        Settle matched payments found by one of `methods` in a single
+        batch. Returns the number of payments marked paid.
+        """
+        from django.db import transaction
+        from .services import PaymentVerificationService
+
+        matches = [match for match in report.matched if match.method in methods]
+        if not matches:
+            return 0
+        ids = [match.payment_id for match in matches]
+        with transaction.atomic():
+            # Unpaid rows had no method chosen yet; a bank transfer is online
+            Payment.objects.filter(id__in=ids, payment_method__isnull=True).update(payment_method='online')
+            return PaymentVerificationService.approve(
+                ids, staff, statuses=StatementReconciler.OPEN_STATUSES
+            )
+
+
+def write_report(report, fh):
+    """Write one CSV row per matched/ambiguous/unmatched payment and unclaimed statement line."""
+    writer = csv.writer(fh)
+    writer.writerow(['result', 'payment_id', 'payment_amount', 'statement_line', 'transaction_id', 'amount', 'date', 'detail'])
+
+    def amount_of(payment_id):
+        return report.payments[payment_id]['amount']
+
+    for match in report.matched:
+        line = match.line
+        writer.writerow(['matched', match.payment_id, amount_of(match.payment_id), line.number,
+                         line.transaction_id, line.amount, line.date, match.method])
+    for ambiguity in report.ambiguous:
+        for line in ambiguity.lines:
+            writer.writerow(['ambiguous', ambiguity.payment_id, amount_of(ambiguity.payment_id), line.number,
+                             line.transaction_id, line.amount, line.date, ambiguity.reason])
+    for payment_id in report.unmatched_payments:
+        payment = report.payments[payment_id]
+        writer.writerow(['unmatched_payment', payment_id, payment['amount'], '', payment['transaction_id'], '', '', ''])
+    for line in report.unmatched_lines:
+        writer.writerow(['unmatched_line', '', '', line.number, line.transaction_id, line.amount, line.date,
+                         line.description])
@@ -0,0 +1,458 @@
+"""
+UH Care - Payment proof processing, QR codes, verification and source tracking
+"""
+
+import hashlib
+import importlib.util
+import logging
+import os
+import tempfile
+import time
+from collections import defaultdict
+from decimal import Decimal
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Value, When
+from django.db.models.signals import post_save
+from django.urls import reverse
+from django.utils import timezone
+
+from utils.transitions import transition_applied
+
+from .models import Payment
+
+logger = logging.getLogger(__name__)
+
+
+class PaymentProofService:
+    """
+    Uploaded payment screenshots are written to storage as-is on the request
+    thread; the process_payment_proof task then hashes them for duplicate
+    detection and renders the small preview and thumbnail the admin shows.
+    """
+
+    PREVIEW_SIZE = (1280, 1280)
+    THUMBNAIL_SIZE = (240, 240)
+    HASH_CHUNK_SIZE = 1024 * 1024
+    QUALITY = 80
+
+    @staticmethod
+    def store(payment, uploaded_file):
+        """
+        Save an upload as the payment's proof and clear anything derived from
+        a previous one. Storage backends read the upload chunk by chunk, so a
+        large screenshot is never held in memory. The caller saves `payment`.
+        """
+        stale = [
+            (field.storage, field.name)
+            for field in (payment.payment_proof_preview_file, payment.payment_proof_thumbnail_file)
+            if field
+        ]
+        original = os.path.basename(getattr(uploaded_file, 'name', '') or 'upload')
+        payment.payment_proof_file.save(f'payment_{payment.id}_{original}', uploaded_file, save=False)
+        payment.payment_proof_preview_file = None
+        payment.payment_proof_thumbnail_file = None
+        payment.payment_proof_sha256 = ''
+        payment.payment_proof_duplicate_of = None
+        payment.payment_proof_processed_at = None
+        if stale:
+            # The old renditions stay in place if the new proof is rolled back
+            transaction.on_commit(lambda: PaymentProofService.delete_files(stale))
+
+    @staticmethod
+    def delete_files(files):
+        for storage, name in files:
+            storage.delete(name)
+
+    @staticmethod
+    def schedule(payment_id):
+        """Process the payment's proof in the background once the current transaction commits."""
+        transaction.on_commit(lambda: PaymentProofService.enqueue(payment_id))
+
+    @staticmethod
+    def enqueue(payment_id):
+        from .tasks import process_payment_proof
+
+        try:
+            process_payment_proof.apply_async(args=[payment_id], retry=False)
+        except Exception:
+            # Broker unreachable: process here rather than leave the proof without a thumbnail
+            logger.warning('Could not queue proof processing for payment %s; processing inline', payment_id)
+            PaymentProofService.process(payment_id)
+
+    @staticmethod
+    def image_format():
+        from PIL import features
+
+        return ('WEBP', 'webp') if features.check('webp') else ('JPEG', 'jpg')
+
+    @staticmethod
+    def render(fh):
+        """Return (preview, thumbnail) ContentFiles for an image file object."""
+        from PIL import Image, ImageOps
+
+        with Image.open(fh) as image:
+            # JPEG only: let the decoder downscale, so a 12MP photo isn't decoded at full size
+            image.draft('RGB', PaymentProofService.PREVIEW_SIZE)
+            image = ImageOps.exif_transpose(image).convert('RGB')
+
+        image_format, _ = PaymentProofService.image_format()
+        renditions = []
+        for size in (PaymentProofService.PREVIEW_SIZE, PaymentProofService.THUMBNAIL_SIZE):
+            image.thumbnail(size)
+            buffer = BytesIO()
+            image.save(buffer, image_format, quality=PaymentProofService.QUALITY)
+            renditions.append(ContentFile(buffer.getvalue()))
+        return renditions
+
+    @staticmethod
+    def process(payment_id):
+        """
+        Hash the payment's proof, link it to the earliest payment with the
+        same content and store its preview and thumbnail. Returns a summary
+        dict, or None if there is nothing to process.
+        """
+        from PIL import Image, UnidentifiedImageError
+
+        payment = Payment.objects.filter(pk=payment_id).first()
+        if payment is None or not payment.payment_proof_file:
+            return None
+        name = payment.payment_proof_file.name
+
+        digest = hashlib.sha256()
+        renditions = None
+        with payment.payment_proof_file.open('rb') as fh:
+            for chunk in iter(lambda: fh.read(PaymentProofService.HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+            fh.seek(0)
+            try:
+                renditions = PaymentProofService.render(fh)
+            except (UnidentifiedImageError, Image.DecompressionBombError, OSError, ValueError):
+                logger.warning('Payment %s proof %s is not a readable image', payment_id, name)
+        sha256 = digest.hexdigest()
+
+        if renditions:
+            _, extension = PaymentProofService.image_format()
+            stem = os.path.splitext(os.path.basename(name))[0]
+            preview, thumbnail = renditions
+            payment.payment_proof_preview_file.save(f'{stem}.{extension}', preview, save=False)
+            payment.payment_proof_thumbnail_file.save(f'{stem}.{extension}', thumbnail, save=False)
+
+        duplicate_of_id = Payment.objects.filter(
+            payment_proof_sha256=sha256
+        ).exclude(pk=payment.pk).order_by('created_at', 'id').values_list('id', flat=True).first()
+
+        # Conditional update: if another proof was uploaded meanwhile, these
+        # results are stale and that upload's own task will write its own.
+        updated = Payment.objects.filter(pk=payment.pk, payment_proof_file=name).update(
+            payment_proof_preview_file=payment.payment_proof_preview_file.name or None,
+            payment_proof_thumbnail_file=payment.payment_proof_thumbnail_file.name or None,
+            payment_proof_sha256=sha256,
+            payment_proof_duplicate_of_id=duplicate_of_id,
+            payment_proof_processed_at=timezone.now(),
+        )
+        if not updated:
+            for field in (payment.payment_proof_preview_file, payment.payment_proof_thumbnail_file):
+                if field:
+                    field.delete(save=False)
+            return None
+
+        if duplicate_of_id:
+            logger.info('Payment %s proof duplicates the proof of payment %s', payment.pk, duplicate_of_id)
+        return {'payment_id': payment.pk, 'sha256': sha256, 'duplicate_of': duplicate_of_id, 'rendered': bool(renditions)}
+
+
+class PaymentQRService:
+    """
+    Per-payment QR codes. A QR only depends on (amount, payment id, account),
+    so its hash names the rendered image: kept in the cache and in
+    PAYMENT_QR_CACHE_DIR, it is encoded once and served from there after.
+    """
+
+    FORMATS = {
+        'png': 'image/png',
+        'svg': 'image/svg+xml',
+    }
+    # Bump when the payload or rendering changes so old images are not reused
+    VERSION = 1
+    # prune() leaves younger files alone: they may be mid-write, or rendered
+    # on request for a payment outside the warmed set
+    PRUNE_GRACE = 3600
+
+    @staticmethod
+    def is_available():
+        return importlib.util.find_spec('qrcode') is not None
+
+    @staticmethod
+    def payload(payment):
+        return (
+            f"UH Care Payment\n"
+            f"Amount: NPR {payment.amount}\n"
+            f"Payment ID: {payment.id}\n"
+            f"Account: {settings.PAYMENT_ACCOUNT_NUMBER}"
+        )
+
+    @staticmethod
+    def digest(payment):
+        key = f'{PaymentQRService.VERSION}|{payment.amount}|{payment.id}|{settings.PAYMENT_ACCOUNT_NUMBER}'
+        return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+    @staticmethod
+    def cache_dir():
+        return getattr(settings, 'PAYMENT_QR_CACHE_DIR', None) or os.path.join(tempfile.gettempdir(), 'uhcare-qr')
+
+    @staticmethod
+    def encode(payment, fmt):
+        import qrcode
+        import qrcode.image.svg
+
+        qr = qrcode.QRCode(version=1, box_size=10, border=5)
+        qr.add_data(PaymentQRService.payload(payment))
+        qr.make(fit=True)
+        if fmt == 'svg':
+            image = qr.make_image(image_factory=qrcode.image.svg.SvgPathImage)
+        else:
+            image = qr.make_image(fill_color='black', back_color='white')
+        buffer = BytesIO()
+        image.save(buffer)
+        return buffer.getvalue()
+
+    @staticmethod
+    def get(payment, fmt):
+        """
+        Rendered QR bytes for a payment: from the cache, else from disk, else
+        encoded now and stored in both. Returns (content, created).
+        """
+        digest = PaymentQRService.digest(payment)
+        key = f'payment-qr:{digest}.{fmt}'
+        content = cache.get(key)
+        if content is not None:
+            return content, False
+
+        created = False
+        path = os.path.join(PaymentQRService.cache_dir(), f'{digest}.{fmt}')
+        try:
+            with open(path, 'rb') as fh:
+                content = fh.read()
+        except FileNotFoundError:
+            content = PaymentQRService.encode(payment, fmt)
+            created = True
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f'{path}.{os.getpid()}.tmp'
+            with open(tmp, 'wb') as fh:
+                fh.write(content)
+            os.replace(tmp, path)
+
+        cache.set(key, content, getattr(settings, 'PAYMENT_QR_CACHE_TIMEOUT', 7 * 24 * 3600))
+        return content, created
+
+    @staticmethod
+    def prune(keep):
+        """
+        Delete images in the disk cache whose digest is not in `keep`, e.g.
+        for payments since paid or re-priced. Returns how many were removed.
+        """
+        try:
+            entries = list(os.scandir(PaymentQRService.cache_dir()))
+        except FileNotFoundError:
+            return 0
+
+        cutoff = time.time() - PaymentQRService.PRUNE_GRACE
+        removed = 0
+        for entry in entries:
+            digest, _, fmt = entry.name.partition('.')
+            if not entry.is_file() or (digest in keep and fmt in PaymentQRService.FORMATS):
+                continue
+            try:
+                if entry.stat().st_mtime > cutoff:
+                    continue
+                os.remove(entry.path)
+            except FileNotFoundError:
+                continue
+            removed += 1
+        return removed
+
+
+class PaymentVerificationService:
+    """
+    Staff review of uploaded online payment proofs, many at a time. Each
+    batch is one transaction with a constant number of queries: payments
+    are locked and updated with single UPDATEs, balances are adjusted per
+    patient in one CASE update, and timeline entries and notifications are
+    bulk-created.
+    """
+
+    PAGE_SIZE = 50
+
+    @staticmethod
+    def queue():
+        """Payments waiting for verification, oldest first, with everything the workbench shows."""
+        return Payment.objects.filter(payment_status='pending').select_related(
+            'patient', 'appointment__service', 'pharmacy_order', 'equipment_purchase', 'equipment_rental',
+        ).order_by('created_at', 'id')
+
+    @staticmethod
+    def _lock(ids, statuses=('pending',)):
+        # of=('self',): the nullable joined rows can't (and needn't) be locked
+        return list(
+            Payment.objects.select_for_update(of=('self',)).filter(
+                id__in=ids, payment_status__in=statuses
+            ).select_related('patient', 'pharmacy_order')
+        )
+
+    @staticmethod
+    def approve(ids, staff, statuses=('pending',)):
+        """
+        Mark payments paid. Only those currently in one of `statuses` are
+        touched (bank reconciliation also settles unpaid ones). Returns the
+        number approved.
+        """
+        from apps.accounts.models import PatientProfile
+        from apps.notifications.services import NotificationService
+        from apps.pharmacy.services import PharmacyActivityRecorder
+
+        now = timezone.now()
+        with transaction.atomic(), PharmacyActivityRecorder():
+            payments = PaymentVerificationService._lock(ids, statuses)
+            if not payments:
+                return 0
+            Payment.objects.filter(id__in=[p.id for p in payments]).update(
+                payment_status='paid', payment_date=now, verified_by=staff, verified_at=now, updated_at=now,
+            )
+
+            # Appointment charges are what total_balance tracks (as in confirm_payment)
+            settled = defaultdict(Decimal)
+            for payment in payments:
+                if payment.appointment_id:
+                    settled[payment.patient_id] += payment.amount
+            if settled:
+                PatientProfile.objects.filter(user_id__in=list(settled)).update(
+                    total_balance=F('total_balance') - Case(
+                        *[When(user_id=user_id, then=Value(amount)) for user_id, amount in settled.items()],
+                        output_field=DecimalField(max_digits=10, decimal_places=2),
+                    )
+                )
+
+            for payment in payments:
+                if payment.pharmacy_order_id:
+                    PharmacyActivityRecorder.record(
+                        payment.pharmacy_order,
+                        'Payment verified',
+                        f'Online payment of NPR {payment.amount} verified.',
+                        activity_type='payment',
+                        actor=staff,
+                    )
+            NotificationService.send_bulk_notifications([
+                {
+                    'user': payment.patient,
+                    'title': 'Payment verified',
+                    'message': f'Your payment of NPR {payment.amount} (#{payment.id}) has been verified.',
+                    'related_object': payment,
+                    'action_url': reverse('payments:detail', args=[payment.id]),
+                }
+                for payment in payments
+            ], 'payment_received')
+        return len(payments)
+
+    @staticmethod
+    def reject(ids, staff, reason=''):
+        """
+        Send pending payments back to unpaid so the patient can upload a new
+        proof. Balances are untouched: the amount is still owed. Returns the
+        number rejected.
+        """
+        from apps.notifications.services import NotificationService
+        from apps.pharmacy.services import PharmacyActivityRecorder
+
+        with transaction.atomic(), PharmacyActivityRecorder():
+            payments = PaymentVerificationService._lock(ids)
+            if not payments:
+                return 0
+            Payment.objects.filter(id__in=[p.id for p in payments]).update(
+                payment_status='unpaid', notes=reason, updated_at=timezone.now(),
+            )
+
+            message = 'Your payment proof could not be verified.' + (f' Reason: {reason}' if reason else '')
+            for payment in payments:
+                if payment.pharmacy_order_id:
+                    PharmacyActivityRecorder.record(
+                        payment.pharmacy_order,
+                        'Payment proof rejected',
+                        reason,
+                        activity_type='payment',
+                        actor=staff,
+                    )
+            NotificationService.send_bulk_notifications([
+                {
+                    'user': payment.patient,
+                    'title': 'Payment proof rejected',
+                    'message': f'{message} Please upload a new proof for payment #{payment.id}.',
+                    'related_object': payment,
+                    'action_url': reverse('payments:upload_proof', args=[payment.id]),
+                }
+                for payment in payments
+            ], 'payment_pending', action_text='Upload proof')
+        return len(payments)
+
+
+class PaymentSourceService:
+    """
+    Payment.source_type/source_status mirror the appointment, pharmacy order
+    or equipment purchase/rental a payment is for, so balance queries filter
+    on one table. Payment.save() fills them in; the receivers below follow
+    status changes made through save() or a BulkTransition. Code that
+    bulk-updates a source status any other way calls sync() itself.
+    """
+
+    # Payment link per source model, in precedence order for payments with several links
+    FIELDS = {
+        'appointments.Appointment': 'appointment',
+        'pharmacy.PharmacyOrder': 'pharmacy_order',
+        'equipment.EquipmentPurchase': 'equipment_purchase',
+        'equipment.EquipmentRental': 'equipment_rental',
+    }
+
+    @staticmethod
+    def refresh(payment, old=None):
+        """Set the source fields on `payment`; `old` is its stored row, reused when the links are unchanged."""
+        fields = PaymentSourceService.FIELDS.values()
+        if old is not None and all(getattr(old, f'{f}_id') == getattr(payment, f'{f}_id') for f in fields):
+            payment.source_type, payment.source_status = old.source_type, old.source_status
+            return
+        for field in fields:
+            if getattr(payment, f'{field}_id'):
+                payment.source_type = field
+                payment.source_status = getattr(payment, field).status
+                return
+        payment.source_type = payment.source_status = ''
+
+    @staticmethod
+    def sync(model, ids, status):
+        """Copy `status` to the payments of the `model` rows `ids`. Returns the number of payments changed."""
+        field = PaymentSourceService.FIELDS.get(model._meta.label)
+        ids = list(ids)
+        if field is None or not ids:
+            return 0
+        return Payment.objects.filter(
+            source_type=field, **{f'{field}_id__in': ids}
+        ).exclude(source_status=status).update(source_status=status)
+
+    @staticmethod
+    def on_saved(sender, instance, created, raw=False, update_fields=None, **kwargs):
+        # A new record has no payments yet
+        if created or raw or (update_fields is not None and 'status' not in update_fields):
+            return
+        PaymentSourceService.sync(sender, [instance.pk], instance.status)
+
+    @staticmethod
+    def on_transition(sender, transition, instances, previous, actor=None, **kwargs):
+        PaymentSourceService.sync(sender, [instance.pk for instance in instances], transition.target)
+
+
+for _label in PaymentSourceService.FIELDS:
+    post_save.connect(PaymentSourceService.on_saved, sender=_label, dispatch_uid=f'payments.source_status.{_label}')
+transition_applied.connect(PaymentSourceService.on_transition, dispatch_uid='payments.source_status')
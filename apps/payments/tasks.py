@@ -0,0 +1,8 @@
+from celery import shared_task
+
+
+@shared_task(ignore_result=True)
+def process_payment_proof(payment_id):
+    from apps.payments.services import PaymentProofService
+
+    return PaymentProofService.process(payment_id)
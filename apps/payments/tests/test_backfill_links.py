@@ -0,0 +1,113 @@
+import io
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from apps.accounts.models import User
+from apps.equipment.models import Equipment, EquipmentPurchase, EquipmentRental
+from apps.payments.models import Payment
+from apps.pharmacy.models import PharmacyOrder
+
+
+class BackfillPaymentLinksTests(TestCase):
+    def setUp(self):
+        self.patient = User.objects.create_user(username='patient', password='pw', role='patient')
+        self.other = User.objects.create_user(username='other', password='pw', role='patient')
+        self.equipment = Equipment.objects.create(
+            name='Wheelchair', slug='wheelchair', purchase_price=Decimal('700.00'), rent_price_daily=Decimal('100.00')
+        )
+        self.now = timezone.now()
+
+    def order(self, customer, subtotal, days_ago=0):
+        order = PharmacyOrder.objects.create(
+            customer=customer, subtotal=Decimal(subtotal), delivery_charge=Decimal('0.00'),
+            delivery_address='Home', delivery_phone='9800000000',
+        )
+        PharmacyOrder.objects.filter(pk=order.pk).update(created_at=self.now - timedelta(days=days_ago))
+        return order
+
+    def payment(self, customer, amount, **links):
+        return Payment.objects.create(patient=customer, amount=Decimal(amount), **links)
+
+    def run_command(self, *args):
+        out = io.StringIO()
+        call_command('backfill_payment_links', *args, stdout=out)
+        return out.getvalue()
+
+    def test_links_unique_candidates_in_window(self):
+        order = self.order(self.patient, '500.00')
+        self.order(self.patient, '500.00', days_ago=10)  # outside the window
+        self.order(self.other, '500.00')  # another customer
+        purchase = EquipmentPurchase.objects.create(
+            customer=self.patient, equipment=self.equipment, unit_price=Decimal('700.00'),
+            delivery_address='Home', delivery_phone='9800000000',
+        )
+        rental = EquipmentRental.objects.create(
+            customer=self.patient, equipment=self.equipment, rental_period='daily',
+            start_date=self.now.date(), end_date=self.now.date() + timedelta(days=3),
+            rental_price=Decimal('300.00'), delivery_address='Home', delivery_phone='9800000000',
+        )
+        to_order = self.payment(self.patient, '500.00')
+        to_purchase = self.payment(self.patient, purchase.total_amount)
+        to_rental = self.payment(self.patient, '300.00')
+        orphan = self.payment(self.patient, '123.00')
+
+        output = self.run_command()
+
+        for payment in (to_order, to_purchase, to_rental, orphan):
+            payment.refresh_from_db()
+        self.assertEqual(to_order.pharmacy_order_id, order.id)
+        self.assertEqual(to_purchase.equipment_purchase_id, purchase.id)
+        self.assertEqual(to_rental.equipment_rental_id, rental.id)
+        self.assertIsNone(orphan.pharmacy_order_id)
+        self.assertIn('Backfill complete: linked=3, unmatched=1', output)
+
+    def test_sets_source_fields_from_matched_row(self):
+        order = self.order(self.patient, '500.00')
+        PharmacyOrder.objects.filter(pk=order.pk).update(status='delivered')
+        payment = self.payment(self.patient, '500.00')
+        self.assertEqual((payment.source_type, payment.source_status), ('', ''))
+
+        self.run_command()
+
+        payment.refresh_from_db()
+        self.assertEqual(payment.pharmacy_order_id, order.id)
+        self.assertEqual((payment.source_type, payment.source_status), ('pharmacy_order', 'delivered'))
+
+    def test_ambiguous_candidates_are_left_alone(self):
+        self.order(self.patient, '500.00', days_ago=1)
+        self.order(self.patient, '500.00', days_ago=2)
+        payment = self.payment(self.patient, '500.00')
+
+        self.run_command()
+
+        payment.refresh_from_db()
+        self.assertIsNone(payment.pharmacy_order_id)
+
+    def test_dry_run_writes_nothing(self):
+        self.order(self.patient, '500.00')
+        payment = self.payment(self.patient, '500.00')
+
+        output = self.run_command('--dry-run')
+
+        payment.refresh_from_db()
+        self.assertIsNone(payment.pharmacy_order_id)
+        self.assertIn('Dry run: linked=1, unmatched=0', output)
+
+    def test_queries_per_batch_not_per_payment(self):
+        for i in range(6):
+            customer = User.objects.create_user(username=f'bulk{i}', password='pw', role='patient')
+            self.order(customer, '250.00')
+            self.payment(customer, '250.00')
+
+        with CaptureQueriesContext(connection) as ctx:
+            output = self.run_command('--batch-size', '3')
+
+        self.assertIn('linked=6', output)
+        # count + per batch (payments, three candidate tables, bulk update + savepoint) + the empty last batch
+        self.assertLessEqual(len(ctx.captured_queries), 1 + 2 * 7 + 1)
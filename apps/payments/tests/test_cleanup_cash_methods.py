@@ -0,0 +1,86 @@
+import io
+import os
+import tempfile
+from decimal import Decimal
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from apps.accounts.models import User
+from apps.notifications.models import Notification
+from apps.payments.models import Payment
+from config.maintenance import Checkpoint, ChunkedUpdate
+
+
+class CleanupCashMethodsTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.checkpoint_dir = tmp.name
+        overrides = override_settings(MAINTENANCE_CHECKPOINT_DIR=tmp.name)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+        self.patient = User.objects.create_user(username='patient', password='pw', role='patient')
+        self.cash = [
+            Payment.objects.create(patient=self.patient, amount=Decimal('100.00'), payment_method='cash')
+            for _ in range(7)
+        ]
+        self.online = Payment.objects.create(patient=self.patient, amount=Decimal('100.00'), payment_method='online')
+
+    def run_command(self, *args):
+        out = io.StringIO()
+        call_command('cleanup_cash_methods', *args, stdout=out)
+        return out.getvalue()
+
+    def test_dry_run_reports_only(self):
+        output = self.run_command()
+
+        self.assertIn("Found 7 payments with payment_method='cash'.", output)
+        self.assertEqual(Payment.objects.filter(payment_method='cash').count(), 7)
+
+    def test_apply_updates_in_batches_without_signals(self):
+        notifications = Notification.objects.count()
+
+        output = self.run_command('--apply', '--batch-size', '3')
+
+        self.assertIn('Updated 7 row(s) in 3 batch(es)', output)
+        self.assertFalse(Payment.objects.filter(payment_method='cash').exists())
+        self.online.refresh_from_db()
+        self.assertEqual(self.online.payment_method, 'online')
+        self.assertEqual(Notification.objects.count(), notifications)
+        self.assertFalse(os.listdir(self.checkpoint_dir))
+
+    def test_limit_leaves_checkpoint_and_resume_continues(self):
+        output = self.run_command('--apply', '--batch-size', '2', '--limit', '3')
+
+        self.assertIn('rerun with --resume', output)
+        self.assertEqual(Payment.objects.filter(payment_method='cash').count(), 4)
+        state = Checkpoint('cleanup_cash_methods').load()
+        self.assertEqual(state['last_pk'], self.cash[2].id)
+
+        output = self.run_command('--apply', '--resume')
+
+        self.assertIn(f'Resumed after id {self.cash[2].id}.', output)
+        self.assertFalse(Payment.objects.filter(payment_method='cash').exists())
+        self.assertIsNone(Checkpoint('cleanup_cash_methods').load())
+
+
+class ChunkedUpdateTests(TestCase):
+    def test_rows_added_after_start_are_left_alone(self):
+        patient = User.objects.create_user(username='patient', password='pw', role='patient')
+        for _ in range(3):
+            Payment.objects.create(patient=patient, amount=Decimal('10.00'), payment_method='cash')
+        late = []
+
+        def progress(result, rows):
+            if not late:
+                late.append(Payment.objects.create(patient=patient, amount=Decimal('10.00'), payment_method='cash'))
+
+        result = ChunkedUpdate(
+            Payment.objects.filter(payment_method='cash'), {'payment_method': None}, batch_size=2, progress=progress,
+        ).run()
+
+        self.assertEqual((result.rows, result.batches, result.finished), (3, 2, True))
+        late[0].refresh_from_db()
+        self.assertEqual(late[0].payment_method, 'cash')
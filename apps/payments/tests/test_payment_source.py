@@ -0,0 +1,84 @@
+from datetime import time
+from decimal import Decimal
+
+from django.db.models import Sum
+from django.test import TestCase
+from django.utils import timezone
+
+from apps.accounts.models import PatientProfile, User
+from apps.appointments.models import Appointment
+from apps.payments.models import Payment
+from apps.pharmacy.models import PharmacyOrder
+from apps.pharmacy.services import PharmacyOrderTransitionService
+from apps.services.models import Service, ServiceCategory
+
+
+class PaymentSourceTests(TestCase):
+    def setUp(self):
+        self.patient = User.objects.create_user(username='patient', password='pw', role='patient')
+        PatientProfile.objects.create(user=self.patient)
+        category = ServiceCategory.objects.create(name='Nursing')
+        self.service = Service.objects.create(
+            name='Home care', category=category, slug='home-care', description='Care',
+            base_price=Decimal('1000.00'), what_included='Care',
+        )
+
+    def appointment(self):
+        return Appointment.objects.create(
+            patient=self.patient, service=self.service, appointment_date=timezone.localdate(),
+            appointment_time=time(10, 0), service_price=Decimal('1000.00'), service_address='Home',
+        )
+
+    def order(self):
+        return PharmacyOrder.objects.create(
+            customer=self.patient, subtotal=Decimal('400.00'), delivery_address='Home', delivery_phone='9800000000',
+        )
+
+    def test_save_copies_the_linked_status(self):
+        payment = Payment.objects.create(patient=self.patient, amount=Decimal('1000.00'), appointment=self.appointment())
+        unlinked = Payment.objects.create(patient=self.patient, amount=Decimal('10.00'))
+
+        self.assertEqual((payment.source_type, payment.source_status), ('appointment', 'pending'))
+        self.assertEqual((unlinked.source_type, unlinked.source_status), ('', ''))
+
+    def test_status_change_on_save_reaches_payments(self):
+        appointment = self.appointment()
+        payment = Payment.objects.create(patient=self.patient, amount=Decimal('1000.00'), appointment=appointment)
+
+        appointment.status = 'cancelled'
+        appointment._allow_modification = True
+        appointment.save()
+
+        payment.refresh_from_db()
+        self.assertEqual(payment.source_status, 'cancelled')
+        # A stale instance saved later does not write the old status back
+        payment.notes = 'checked'
+        payment.save()
+        payment.refresh_from_db()
+        self.assertEqual(payment.source_status, 'cancelled')
+
+    def test_bulk_transition_reaches_payments(self):
+        orders = [self.order() for _ in range(2)]
+        payments = [
+            Payment.objects.create(patient=self.patient, amount=order.total_amount, pharmacy_order=order)
+            for order in orders
+        ]
+
+        PharmacyOrderTransitionService.cancel.apply(PharmacyOrder.objects.filter(pk=orders[0].pk))
+
+        statuses = dict(Payment.objects.values_list('id', 'source_status'))
+        self.assertEqual(statuses[payments[0].id], 'cancelled')
+        self.assertEqual(statuses[payments[1].id], 'pending')
+
+    def test_unpaid_total_skips_cancelled_sources_without_joins(self):
+        live, cancelled = self.order(), self.order()
+        Payment.objects.create(patient=self.patient, amount=Decimal('500.00'), pharmacy_order=live)
+        Payment.objects.create(patient=self.patient, amount=Decimal('500.00'), pharmacy_order=cancelled)
+        cancelled.status = 'cancelled'
+        cancelled._allow_modification = True
+        cancelled.save()
+
+        queryset = Payment.objects.filter(patient=self.patient, payment_status='unpaid').exclude(source_status='cancelled')
+
+        self.assertEqual(queryset.aggregate(total=Sum('amount'))['total'], Decimal('500.00'))
+        self.assertNotIn('JOIN', str(queryset.query))
@@ -0,0 +1,170 @@
+import hashlib
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from apps.payments.admin import PaymentAdmin
+from apps.payments.models import Payment
+from apps.payments.services import PaymentProofService
+
+
+def screenshot_bytes(size=(1600, 3000), color=(20, 120, 200)):
+    buffer = BytesIO()
+    Image.new('RGBA', size, color + (255,)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class PaymentProofPipelineTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.user = get_user_model().objects.create_user(username='payer', email='payer@example.com', password='pw')
+
+    def payment_with_proof(self, content, name='proof.png'):
+        payment = Payment.objects.create(patient=self.user, amount='250.00', payment_status='pending')
+        PaymentProofService.store(payment, SimpleUploadedFile(name, content))
+        payment.save()
+        return payment
+
+    def test_upload_stores_file_and_queues_processing(self):
+        payment = Payment.objects.create(patient=self.user, amount='250.00', payment_status='unpaid')
+        self.client.force_login(self.user)
+
+        with mock.patch.object(PaymentProofService, 'enqueue') as enqueue:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(reverse('payments:upload_proof', args=[payment.id]), {
+                    'transaction_id': 'TRX-1',
+                    'payment_proof': SimpleUploadedFile('proof.png', screenshot_bytes(), content_type='image/png'),
+                })
+
+        enqueue.assert_called_once_with(payment.id)
+        payment.refresh_from_db()
+        self.assertTrue(payment.payment_proof_file.name.startswith(f'payments/proofs/payment_{payment.id}_'))
+        self.assertFalse(payment.payment_proof_thumbnail_file)
+        self.assertIsNone(payment.payment_proof_processed_at)
+
+    def test_process_renders_downscaled_preview_and_thumbnail(self):
+        content = screenshot_bytes()
+        payment = self.payment_with_proof(content)
+
+        result = PaymentProofService.process(payment.id)
+
+        payment.refresh_from_db()
+        self.assertEqual(payment.payment_proof_sha256, hashlib.sha256(content).hexdigest())
+        self.assertEqual(result['sha256'], payment.payment_proof_sha256)
+        self.assertIsNotNone(payment.payment_proof_processed_at)
+        with Image.open(payment.payment_proof_preview_file.path) as preview:
+            self.assertEqual(max(preview.size), 1280)
+        with Image.open(payment.payment_proof_thumbnail_file.path) as thumbnail:
+            self.assertEqual(max(thumbnail.size), 240)
+            self.assertEqual(thumbnail.mode, 'RGB')
+
+    def test_same_image_is_flagged_as_duplicate(self):
+        content = screenshot_bytes(size=(400, 800))
+        first = self.payment_with_proof(content)
+        second = self.payment_with_proof(content, name='again.png')
+        other = self.payment_with_proof(screenshot_bytes(size=(400, 800), color=(1, 2, 3)))
+
+        for payment in (first, second, other):
+            PaymentProofService.process(payment.id)
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        other.refresh_from_db()
+        self.assertIsNone(first.payment_proof_duplicate_of_id)
+        self.assertEqual(second.payment_proof_duplicate_of_id, first.id)
+        self.assertIsNone(other.payment_proof_duplicate_of_id)
+
+    def test_unreadable_upload_is_hashed_without_renditions(self):
+        payment = self.payment_with_proof(b'not an image', name='proof.jpg')
+
+        result = PaymentProofService.process(payment.id)
+
+        payment.refresh_from_db()
+        self.assertFalse(result['rendered'])
+        self.assertEqual(payment.payment_proof_sha256, hashlib.sha256(b'not an image').hexdigest())
+        self.assertFalse(payment.payment_proof_thumbnail_file)
+
+    def test_result_for_replaced_proof_is_discarded(self):
+        payment = self.payment_with_proof(screenshot_bytes(size=(300, 300)))
+        render = PaymentProofService.render
+
+        def replaced_while_rendering(fh):
+            # A new proof is uploaded while the task is still working on the old one
+            Payment.objects.filter(pk=payment.pk).update(payment_proof_file='payments/proofs/newer.png')
+            return render(fh)
+
+        with mock.patch.object(PaymentProofService, 'render', side_effect=replaced_while_rendering):
+            self.assertIsNone(PaymentProofService.process(payment.id))
+
+        payment.refresh_from_db()
+        self.assertEqual(payment.payment_proof_sha256, '')
+        self.assertFalse(payment.payment_proof_thumbnail_file)
+
+    def test_replacing_proof_deletes_old_renditions(self):
+        payment = self.payment_with_proof(screenshot_bytes(size=(300, 300)))
+        PaymentProofService.process(payment.id)
+        payment.refresh_from_db()
+        old = [payment.payment_proof_preview_file, payment.payment_proof_thumbnail_file]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            PaymentProofService.store(payment, SimpleUploadedFile('again.png', screenshot_bytes(size=(200, 200))))
+            payment.save()
+
+        for field in old:
+            self.assertFalse(field.storage.exists(field.name))
+        self.assertFalse(payment.payment_proof_thumbnail_file)
+
+    def test_failed_upload_keeps_old_renditions(self):
+        payment = self.payment_with_proof(screenshot_bytes(size=(300, 300)))
+        PaymentProofService.process(payment.id)
+        payment.refresh_from_db()
+        old = [payment.payment_proof_preview_file, payment.payment_proof_thumbnail_file]
+        self.client.force_login(self.user)
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with mock.patch.object(Payment, 'save', side_effect=DatabaseError('write failed')):
+                with self.assertRaises(DatabaseError):
+                    self.client.post(reverse('payments:upload_proof', args=[payment.id]), {
+                        'transaction_id': 'TRX-2',
+                        'payment_proof': SimpleUploadedFile('again.png', screenshot_bytes(size=(200, 200))),
+                    })
+
+        self.assertEqual(callbacks, [])
+        payment.refresh_from_db()
+        for field in old:
+            self.assertTrue(field.storage.exists(field.name))
+        self.assertEqual(payment.payment_proof_preview_file.name, old[0].name)
+
+    def test_decompression_bomb_is_hashed_without_renditions(self):
+        payment = self.payment_with_proof(screenshot_bytes(size=(400, 800)))
+
+        with mock.patch.object(Image, 'MAX_IMAGE_PIXELS', 1000):
+            result = PaymentProofService.process(payment.id)
+
+        self.assertFalse(result['rendered'])
+        payment.refresh_from_db()
+        self.assertTrue(payment.payment_proof_sha256)
+        self.assertFalse(payment.payment_proof_preview_file)
+
+    def test_admin_links_duplicate_to_its_change_page(self):
+        first = self.payment_with_proof(b'same')
+        second = self.payment_with_proof(b'same', name='again.png')
+        second.payment_proof_duplicate_of = first
+
+        html = PaymentAdmin(Payment, admin.site).payment_proof_duplicate(second)
+
+        self.assertIn(f'href="{reverse("admin:payments_payment_change", args=[first.id])}"', html)
@@ -0,0 +1,118 @@
+import os
+import shutil
+import tempfile
+import time
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from apps.payments.models import Payment
+from apps.payments.services import PaymentQRService
+
+
+class PaymentQRCodeTests(TestCase):
+    def setUp(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+        override = override_settings(PAYMENT_QR_CACHE_DIR=cache_dir)
+        override.enable()
+        self.addCleanup(override.disable)
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+        User = get_user_model()
+        self.user = User.objects.create_user(username='payer', email='payer@example.com', password='pw')
+        self.payment = Payment.objects.create(
+            patient=self.user, amount='250.00', payment_status='unpaid', payment_method='online'
+        )
+        self.client.force_login(self.user)
+
+    def image_url(self, payment=None, fmt='png', digest=None):
+        payment = payment or self.payment
+        return reverse('payments:qr_code_image', args=[payment.id, digest or PaymentQRService.digest(payment), fmt])
+
+    def test_image_is_encoded_once_and_served_with_cache_headers(self):
+        with mock.patch.object(PaymentQRService, 'encode', wraps=PaymentQRService.encode) as encode:
+            first = self.client.get(self.image_url())
+            second = self.client.get(self.image_url())
+
+        self.assertEqual(encode.call_count, 1)
+        self.assertEqual(first['Content-Type'], 'image/png')
+        self.assertTrue(first.content.startswith(b'\x89PNG'))
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(first['ETag'], f'"{PaymentQRService.digest(self.payment)}"')
+        self.assertIn('immutable', first['Cache-Control'])
+
+        revalidated = self.client.get(self.image_url(), HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+
+    def test_svg_format(self):
+        response = self.client.get(self.image_url(fmt='svg'))
+
+        self.assertEqual(response['Content-Type'], 'image/svg+xml')
+        self.assertIn(b'<svg', response.content)
+
+    def test_stale_digest_redirects_to_current_image(self):
+        stale = self.image_url()
+        Payment.objects.filter(pk=self.payment.pk).update(amount='300.00')
+        self.payment.refresh_from_db()
+
+        response = self.client.get(stale)
+
+        self.assertRedirects(response, self.image_url(), fetch_redirect_response=False)
+
+    def test_other_patients_payment_is_not_served(self):
+        other = get_user_model().objects.create_user(username='other', email='other@example.com', password='pw')
+        payment = Payment.objects.create(patient=other, amount='99.00', payment_status='unpaid')
+
+        self.assertEqual(self.client.get(self.image_url(payment)).status_code, 404)
+
+    def test_warm_up_renders_unpaid_online_payments_to_disk(self):
+        Payment.objects.create(patient=self.user, amount='10.00', payment_status='paid', payment_method='online')
+        Payment.objects.create(patient=self.user, amount='20.00', payment_status='unpaid', payment_method='cash')
+
+        out = StringIO()
+        call_command('warm_payment_qr_codes', stdout=out)
+        self.assertIn('Rendered 1 QR image(s); 0 already cached', out.getvalue())
+
+        # A cold cache (another worker) is filled from disk, not re-encoded
+        cache.clear()
+        with mock.patch.object(PaymentQRService, 'encode') as encode:
+            response = self.client.get(self.image_url())
+        encode.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+
+    def test_warm_up_prunes_images_no_longer_needed(self):
+        call_command('warm_payment_qr_codes', '--format', 'png', 'svg', stdout=StringIO())
+        paid = Payment.objects.create(patient=self.user, amount='10.00', payment_status='unpaid', payment_method='online')
+        PaymentQRService.get(paid, 'png')
+        Payment.objects.filter(pk=paid.pk).update(payment_status='paid')
+        stale = os.path.join(PaymentQRService.cache_dir(), f'{PaymentQRService.digest(paid)}.png')
+        recent = os.path.join(PaymentQRService.cache_dir(), 'recent.png.123.tmp')
+        open(recent, 'wb').close()
+        old = time.time() - PaymentQRService.PRUNE_GRACE - 60
+        for name in os.listdir(PaymentQRService.cache_dir()):
+            if name != os.path.basename(recent):
+                os.utime(os.path.join(PaymentQRService.cache_dir(), name), (old, old))
+
+        out = StringIO()
+        call_command('warm_payment_qr_codes', '--format', 'png', 'svg', stdout=out)
+
+        self.assertIn('0 QR image(s); 2 already cached; 1 stale removed', out.getvalue())
+        self.assertFalse(os.path.exists(stale))
+        self.assertTrue(os.path.exists(recent))
+
+    def test_configured_qr_url_takes_precedence(self):
+        with override_settings(
+            PAYMENT_QR_CODE_URL='https://bank.example/qr.png',
+            STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+        ):
+            response = self.client.get(reverse('payments:qr_code', args=[self.payment.id]))
+
+        self.assertIsNone(response.context['qr_image_url'])
+        self.assertContains(response, 'https://bank.example/qr.png')
@@ -0,0 +1,134 @@
+import io
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from apps.accounts.models import User
+from apps.payments.models import Payment
+from apps.payments.reconciliation import StatementReconciler, read_statement, write_report
+
+
+OFX = b"""OFXHEADER:100
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20261019120000[+5:45]<TRNAMT>500.00<FITID>F1<REFNUM>TRX-001<MEMO>QR payment</STMTTRN>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20261019<TRNAMT>-20.00<FITID>F2</STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+
+
+class StatementParsingTests(TestCase):
+    def test_csv_header_aliases_and_formats(self):
+        statement = io.BytesIO(
+            b'\xef\xbb\xbfValue Date,Reference No,Narration,Credit\n'
+            b'19/10/2026,TRX 001,QR payment,"1,250.50"\n'
+            b'19/10/2026,,Bank fee,-10\n'
+        )
+
+        lines = list(read_statement(statement, 'csv'))
+
+        self.assertEqual(len(lines), 1)
+        line = lines[0]
+        self.assertEqual((line.number, line.transaction_id, line.amount), (2, 'TRX 001', Decimal('1250.50')))
+        self.assertEqual(line.date.isoformat(), '2026-10-19')
+
+    def test_csv_eight_digit_dates(self):
+        statement = io.BytesIO(b'reference,amount,date\nTX1,100,15012024\nTX2,100,20240115\nTX3,100,99999999\n')
+
+        lines = list(read_statement(statement, 'csv'))
+
+        self.assertEqual([line.date.isoformat() for line in lines[:2]], ['2024-01-15', '2024-01-15'])
+        # An unreadable date leaves the line without one instead of failing the import
+        self.assertEqual((lines[2].transaction_id, lines[2].date), ('TX3', None))
+
+    def test_csv_garbage_date(self):
+        lines = list(read_statement(io.BytesIO(b'reference,amount,date\nTX1,100,not a date\n'), 'csv'))
+
+        self.assertEqual((lines[0].transaction_id, lines[0].date), ('TX1', None))
+
+    def test_ofx_credits(self):
+        lines = list(read_statement(io.BytesIO(OFX), 'ofx'))
+
+        self.assertEqual(len(lines), 1)
+        self.assertEqual((lines[0].transaction_id, lines[0].amount), ('TRX-001', Decimal('500.00')))
+        self.assertEqual(lines[0].date.isoformat(), '2026-10-19')
+
+
+class StatementReconcilerTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(username='staff', password='pw', is_staff=True)
+        self.patient = User.objects.create_user(username='patient', password='pw', role='patient')
+        self.today = timezone.localdate().isoformat()
+
+    def payment(self, amount, transaction_id='', status='pending'):
+        return Payment.objects.create(
+            patient=self.patient, amount=amount, transaction_id=transaction_id, payment_status=status,
+            payment_method='online' if status == 'pending' else None,
+        )
+
+    def statement(self, *rows):
+        body = 'date,transaction_id,amount,description\n' + ''.join(
+            f'{self.today},{ref},{amount},line\n' for ref, amount in rows
+        )
+        return read_statement(io.BytesIO(body.encode()), 'csv')
+
+    def test_matches_ambiguities_and_leftovers(self):
+        by_reference = self.payment('500.00', 'TRX-001')
+        by_amount = self.payment('750.00', status='unpaid')
+        duplicated = self.payment('300.00', 'DUP1')
+        wrong_amount = self.payment('900.00', 'TRX-009')
+        missing = self.payment('120.00', 'NOPE')
+        self.payment('50.00', status='paid')
+
+        report = StatementReconciler().reconcile(self.statement(
+            ('trx001', '500'), ('', '750'), ('DUP1', '300'), ('DUP1', '300'), ('TRX-009', '800'), ('XYZ', '42'),
+        ))
+
+        self.assertEqual(
+            {(m.payment_id, m.method) for m in report.matched},
+            {(by_reference.id, 'transaction_id'), (by_amount.id, 'amount_date')},
+        )
+        self.assertEqual({a.payment_id for a in report.ambiguous}, {duplicated.id, wrong_amount.id})
+        self.assertEqual(report.unmatched_payments, [missing.id])
+        self.assertEqual([line.transaction_id for line in report.unmatched_lines], ['XYZ'])
+
+        out = io.StringIO()
+        write_report(report, out)
+        self.assertEqual(len(out.getvalue().splitlines()), 1 + 2 + 3 + 1 + 1)
+
+    def test_line_claimed_by_two_payments_is_ambiguous(self):
+        first = self.payment('400.00', status='unpaid')
+        second = self.payment('400.00', status='unpaid')
+
+        report = StatementReconciler().reconcile(self.statement(('', '400')))
+
+        self.assertEqual(report.matched, [])
+        self.assertEqual({a.payment_id for a in report.ambiguous}, {first.id, second.id})
+
+    def test_apply_settles_transaction_id_matches_only_by_default(self):
+        by_reference = self.payment('500.00', 'TRX-001', status='unpaid')
+        by_amount = self.payment('750.00', status='unpaid')
+        report = StatementReconciler().reconcile(self.statement(('TRX-001', '500'), ('', '750')))
+
+        self.assertEqual(StatementReconciler.apply(report, self.staff), 1)
+
+        by_reference.refresh_from_db()
+        by_amount.refresh_from_db()
+        self.assertEqual((by_reference.payment_status, by_reference.payment_method), ('paid', 'online'))
+        self.assertEqual(by_reference.verified_by, self.staff)
+        self.assertEqual(by_amount.payment_status, 'unpaid')
+
+    def test_payments_fetched_in_one_query(self):
+        for i in range(20):
+            self.payment('100.00', f'REF{i}')
+        Payment.objects.update(created_at=timezone.now() - timedelta(days=3))
+        rows = [(f'REF{i}', '100') for i in range(5000)]
+
+        with CaptureQueriesContext(connection) as captured:
+            report = StatementReconciler().reconcile(self.statement(*rows))
+
+        self.assertEqual(len(captured), 1)
+        self.assertEqual(len(report.matched), 20)
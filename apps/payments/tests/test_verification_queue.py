@@ -0,0 +1,136 @@
+from datetime import time
+from decimal import Decimal
+
+from django.contrib import messages
+from django.contrib.messages import get_messages
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.accounts.models import PatientProfile, User
+from apps.appointments.models import Appointment
+from apps.notifications.models import Notification
+from apps.payments.models import Payment
+from apps.payments.services import PaymentVerificationService
+from apps.payments.views import verify_payment
+from apps.pharmacy.models import PharmacyOrder, PharmacyOrderActivity
+from apps.services.models import Service, ServiceCategory
+
+
+class PaymentVerificationTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(username='staff', password='pw', role='admin', is_staff=True)
+        category = ServiceCategory.objects.create(name='Nursing')
+        self.service = Service.objects.create(
+            name='Home care', category=category, slug='home-care', description='Care',
+            base_price=Decimal('1000.00'), what_included='Care',
+        )
+        self.patients = []
+        for i in range(2):
+            patient = User.objects.create_user(username=f'patient{i}', password='pw', role='patient')
+            PatientProfile.objects.create(user=patient, total_balance=Decimal('5000.00'))
+            self.patients.append(patient)
+
+    def appointment_payment(self, patient, amount='1000.00'):
+        appointment = Appointment.objects.create(
+            patient=patient, service=self.service, appointment_date=timezone.localdate(),
+            appointment_time=time(10, 0), status='confirmed', service_price=Decimal(amount),
+            total_amount=Decimal(amount), service_address='Home',
+        )
+        return Payment.objects.create(
+            appointment=appointment, patient=patient, amount=amount, payment_status='pending', payment_method='online'
+        )
+
+    def order_payment(self, patient):
+        order = PharmacyOrder(customer=patient, delivery_address='Home', delivery_phone='9800000000')
+        order.save()
+        return Payment.objects.create(
+            pharmacy_order=order, patient=patient, amount='150.00', payment_status='pending', payment_method='online'
+        )
+
+    def balance(self, patient):
+        return PatientProfile.objects.get(user=patient).total_balance
+
+    def test_approve_settles_batch_and_aggregates_balances_per_patient(self):
+        first, second = self.patients
+        payments = [
+            self.appointment_payment(first, '1000.00'),
+            self.appointment_payment(first, '500.00'),
+            self.appointment_payment(second, '200.00'),
+            self.order_payment(second),
+        ]
+        already_paid = self.appointment_payment(second, '300.00')
+        Payment.objects.filter(pk=already_paid.pk).update(payment_status='paid')
+
+        approved = PaymentVerificationService.approve([p.id for p in payments] + [already_paid.id], self.staff)
+
+        self.assertEqual(approved, 4)
+        self.assertEqual(
+            set(Payment.objects.filter(verified_by=self.staff).values_list('id', flat=True)),
+            {p.id for p in payments},
+        )
+        self.assertFalse(Payment.objects.filter(payment_status='pending').exists())
+        self.assertEqual(self.balance(first), Decimal('3500.00'))
+        # The pharmacy payment is not part of total_balance; the paid one is skipped
+        self.assertEqual(self.balance(second), Decimal('4800.00'))
+        self.assertTrue(PharmacyOrderActivity.objects.filter(
+            order_id=payments[3].pharmacy_order_id, title='Payment verified'
+        ).exists())
+        self.assertEqual(Notification.objects.filter(notification_type='payment_received').count(), 4)
+
+    def test_approve_runs_constant_queries(self):
+        def queries_for(count):
+            ids = [self.appointment_payment(self.patients[i % 2]).id for i in range(count)]
+            with CaptureQueriesContext(connection) as captured:
+                PaymentVerificationService.approve(ids, self.staff)
+            return len(captured)
+
+        # First batch creates notification preferences and caches content types
+        queries_for(2)
+        self.assertEqual(queries_for(2), queries_for(8))
+
+    def test_reject_returns_payments_to_unpaid_without_touching_balance(self):
+        payment = self.appointment_payment(self.patients[0])
+
+        rejected = PaymentVerificationService.reject([payment.id], self.staff, 'Amount does not match')
+
+        payment.refresh_from_db()
+        self.assertEqual(rejected, 1)
+        self.assertEqual(payment.payment_status, 'unpaid')
+        self.assertEqual(payment.notes, 'Amount does not match')
+        self.assertEqual(self.balance(self.patients[0]), Decimal('5000.00'))
+        notification = Notification.objects.get(notification_type='payment_pending')
+        self.assertIn('Amount does not match', notification.message)
+
+    def test_queue_is_staff_only_and_approves_selected(self):
+        payment = self.appointment_payment(self.patients[0])
+        url = reverse('payments:verification_queue')
+
+        self.client.force_login(self.patients[0])
+        self.assertEqual(self.client.post(url, {'action': 'approve', 'payment_ids': [payment.id]}).status_code, 302)
+        payment.refresh_from_db()
+        self.assertEqual(payment.payment_status, 'pending')
+
+        self.client.force_login(self.staff)
+        response = self.client.post(url, {'action': 'approve', 'payment_ids': [payment.id]})
+        self.assertRedirects(response, url, fetch_redirect_response=False)
+        payment.refresh_from_db()
+        self.assertEqual(payment.payment_status, 'paid')
+
+    def test_verify_reports_payment_no_longer_pending(self):
+        payment = self.appointment_payment(self.patients[0])
+        Payment.objects.filter(pk=payment.pk).update(payment_status='paid')
+        request = RequestFactory().post('/', {'action': 'approve'})
+        request.user = self.staff
+        request.session = {}
+        request._messages = FallbackStorage(request)
+
+        response = verify_payment(request, payment.id)
+
+        self.assertEqual(response.status_code, 302)
+        [message] = get_messages(request)
+        self.assertEqual(message.level, messages.ERROR)
+        self.assertFalse(Payment.objects.filter(verified_by=self.staff).exists())
@@ -7,6 +7,7 @@ urlpatterns = [
     # Payment initiation
     path('pay/<int:appointment_id>/', views.initiate_payment, name='initiate'),
     path('qr/<int:payment_id>/', views.show_qr_code, name='qr_code'),
+    path('qr/<int:payment_id>/<str:digest>.<str:fmt>', views.qr_code_image, name='qr_code_image'),
     path('detail/<int:payment_id>/', views.payment_detail, name='detail'),
     
     # Payment confirmation
@@ -16,6 +17,9 @@ urlpatterns = [
     # Payment history
     path('history/', views.payment_history, name='history'),
     path('qr-paid/', views.qr_paid_list, name='qr_paid'),
+    # Staff verification of uploaded proofs
+    path('verification/', views.verification_queue, name='verification_queue'),
+    path('reconcile/', views.reconcile_statement, name='reconcile'),
     # Cash commitments listing (separate page)
     path('cash-commitments/', views.cash_commitments, name='cash_commitments'),
 ]
\ No newline at end of file
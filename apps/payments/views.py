@@ -3,6 +3,8 @@ UH Care - Payment System
 """
 
 from django.shortcuts import render, get_object_or_404, redirect
+from django.urls import reverse
+from django.core.paginator import Paginator
 from django.contrib.auth.decorators import login_required
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
@@ -11,19 +13,19 @@ from django.db.models import Sum
 from django.utils import timezone
 from django.conf import settings
 from decimal import Decimal
-try:
-    import qrcode
-except Exception:
-    qrcode = None
-from io import BytesIO
-from django.core.files import File
+from django.http import Http404, HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
 
 from .models import Payment
+from .reconciliation import StatementError, StatementReconciler, read_statement
+from .services import PaymentProofService, PaymentQRService, PaymentVerificationService
 from apps.appointments.models import Appointment
+from config.idempotency import idempotent
 from django.db.models import Q
 
 
 @login_required
+@idempotent
 def initiate_payment(request, appointment_id):
     """
     Initiate payment for an appointment
@@ -101,9 +103,15 @@ def show_qr_code(request, payment_id):
             return redirect('equipment:rental_detail', rental_number=payment.equipment_rental.rental_number)
         return redirect('payments:history')
     
+    # An explicitly configured QR image (e.g. the bank's own) wins over the generated one
+    qr_image_url = None
+    if not settings.PAYMENT_QR_CODE_URL and PaymentQRService.is_available():
+        qr_image_url = reverse('payments:qr_code_image', args=[payment.id, PaymentQRService.digest(payment), 'png'])
+
     context = {
         'payment': payment,
         'appointment': payment.appointment,
+        'qr_image_url': qr_image_url,
         'qr_code_url': settings.PAYMENT_QR_CODE_URL,
         'account_name': settings.PAYMENT_ACCOUNT_NAME,
         'account_number': settings.PAYMENT_ACCOUNT_NUMBER,
@@ -112,6 +120,31 @@ def show_qr_code(request, payment_id):
     return render(request, 'payments/qr_code.html', context)
 
 
+@login_required
+def qr_code_image(request, payment_id, digest, fmt):
+    """
+    The payment's QR code as PNG or SVG. Images are only encoded once per
+    (amount, payment, account); see PaymentQRService.
+    """
+    if fmt not in PaymentQRService.FORMATS or not PaymentQRService.is_available():
+        raise Http404
+    payment = get_object_or_404(
+        Payment.objects.only('id', 'amount', 'patient_id'),
+        id=payment_id,
+        patient=request.user
+    )
+
+    current = PaymentQRService.digest(payment)
+    if digest != current:
+        # Amount or account changed since the page linked here
+        return redirect('payments:qr_code_image', payment_id=payment.id, digest=current, fmt=fmt)
+    if f'"{current}"' in parse_etags(request.headers.get('If-None-Match', '')):
+        return qr_response(HttpResponseNotModified(), current)
+
+    content, _ = PaymentQRService.get(payment, fmt)
+    return qr_response(HttpResponse(content, content_type=PaymentQRService.FORMATS[fmt]), current)
+
+
 @login_required
 def upload_payment_proof(request, payment_id):
     """
@@ -144,8 +177,6 @@ def upload_payment_proof(request, payment_id):
             messages.error(request, 'Please provide a transaction ID.')
             return redirect('payments:upload_proof', payment_id=payment.id)
         
-        # In production, upload to S3/Cloud Storage
-        # For now, store the transaction ID and save uploaded file to the ImageField
         payment.transaction_id = transaction_id
         # If the payment already has a different method selected, do not overwrite it.
         if payment.payment_method and payment.payment_method != 'online':
@@ -156,23 +187,21 @@ def upload_payment_proof(request, payment_id):
         # Mark as pending verification so staff can review the uploaded proof
         payment.payment_status = 'pending'
 
-        if payment_proof:
-            # Save uploaded file to the ImageField (uses default storage)
-            try:
-                # Build a safe name: payment_<id>_<orig_name>
-                orig_name = getattr(payment_proof, 'name', 'upload')
-                filename = f"payment_{payment.id}_{orig_name}"
-                payment.payment_proof_file.save(filename, File(payment_proof), save=False)
+        # One transaction, so the old renditions are only deleted once the new proof is saved
+        with transaction.atomic():
+            if payment_proof:
+                # Written to the default storage (S3 when USE_S3) in chunks; the
+                # preview, thumbnail and content hash are made in the background
+                PaymentProofService.store(payment, payment_proof)
                 # Keep the URL field for backward compatibility
                 try:
                     payment.payment_proof_url = payment.payment_proof_file.url
                 except Exception:
                     payment.payment_proof_url = ''
-            except Exception:
-                # Fallback: if saving to ImageField fails, attempt S3 placeholder
-                payment.payment_proof_url = upload_to_s3(payment_proof)
 
-        payment.save()
+            payment.save()
+            if payment_proof:
+                PaymentProofService.schedule(payment.id)
 
         messages.success(
             request,
@@ -291,13 +320,13 @@ def confirm_payment(request, payment_id):
             if domain == 'pharmacy':
                 # Log an activity on the pharmacy order timeline
                 try:
-                    from apps.pharmacy.models import PharmacyOrderActivity
-                    PharmacyOrderActivity.objects.create(
-                        order=payment.pharmacy_order,
-                        actor=request.user,
+                    from apps.pharmacy.services import PharmacyActivityRecorder
+                    PharmacyActivityRecorder.record(
+                        payment.pharmacy_order,
+                        'Payment confirmed',
+                        'Customer confirmed cash payment on delivery.',
                         activity_type='payment',
-                        title='Payment confirmed',
-                        message='Customer confirmed cash payment on delivery.'
+                        actor=request.user,
                     )
                 except Exception:
                     # If activity model not available for any reason, ignore
@@ -332,7 +361,8 @@ def payment_history(request):
     payments = Payment.objects.filter(
         patient=request.user
     ).select_related(
-        'appointment', 'appointment__service', 'verified_by'
+        'appointment', 'appointment__service', 'appointment__provider', 'verified_by',
+        'pharmacy_order', 'equipment_purchase', 'equipment_rental',
     ).order_by('-created_at')
     
     # Filter by status
@@ -501,26 +531,17 @@ def verify_payment(request, payment_id):
     if request.method == 'POST':
         action = request.POST.get('action')
         
-        with transaction.atomic():
-            if action == 'approve':
-                payment.payment_status = 'paid'
-                payment.payment_date = timezone.now()
-                payment.verified_by = request.user
-                payment.verified_at = timezone.now()
-                payment.save()
-                
-                # Update patient balance
-                profile = payment.patient.patient_profile
-                profile.total_balance -= payment.amount
-                profile.save()
-                
+        if action == 'approve':
+            if PaymentVerificationService.approve([payment.id], request.user):
                 messages.success(request, f'Payment #{payment.id} approved.')
-                
-            elif action == 'reject':
-                payment.notes = request.POST.get('rejection_reason', '')
-                payment.save()
-                
+            else:
+                messages.error(request, f'Payment #{payment.id} is not awaiting verification; nothing was changed.')
+            
+        elif action == 'reject':
+            if PaymentVerificationService.reject([payment.id], request.user, request.POST.get('rejection_reason', '')):
                 messages.warning(request, f'Payment #{payment.id} rejected.')
+            else:
+                messages.error(request, f'Payment #{payment.id} is not awaiting verification; nothing was changed.')
         
         return redirect('admin:payments_payment_change', payment.id)
     
@@ -531,45 +552,85 @@ def verify_payment(request, payment_id):
     return render(request, 'payments/admin_verify.html', context)
 
 
-# =====================================================
-# UTILITY FUNCTIONS
-# =====================================================
-
-def generate_qr_code(payment):
-    """
-    Generate QR code for payment
+@staff_member_required
+def verification_queue(request):
     """
-    # Create QR code with payment details
-    qr_data = f"""
-    UH Care Payment
-    Amount: NPR {payment.amount}
-    Payment ID: {payment.id}
-    Account: {settings.PAYMENT_ACCOUNT_NUMBER}
+    Staff workbench: pending online payments with their proof thumbnails,
+    approved or rejected in batches.
     """
-    
-    qr = qrcode.QRCode(version=1, box_size=10, border=5)
-    qr.add_data(qr_data)
-    qr.make(fit=True)
-    
-    img = qr.make_image(fill_color="black", back_color="white")
-    
-    # Save to BytesIO
-    buffer = BytesIO()
-    img.save(buffer, format='PNG')
-    buffer.seek(0)
-    
-    return buffer
+    if request.method == 'POST':
+        ids = [int(value) for value in request.POST.getlist('payment_ids') if value.isdigit()]
+        action = request.POST.get('action')
+
+        if not ids:
+            messages.error(request, 'Select at least one payment.')
+        elif action == 'approve':
+            count = PaymentVerificationService.approve(ids, request.user)
+            messages.success(request, f'{count} payment(s) approved.')
+        elif action == 'reject':
+            reason = request.POST.get('rejection_reason', '').strip()
+            count = PaymentVerificationService.reject(ids, request.user, reason)
+            messages.warning(request, f'{count} payment(s) rejected.')
+        else:
+            messages.error(request, 'Unknown action.')
+
+        return redirect(request.get_full_path())
+
+    paginator = Paginator(PaymentVerificationService.queue(), PaymentVerificationService.PAGE_SIZE)
+    page_obj = paginator.get_page(request.GET.get('page'))
+
+    context = {
+        'page_obj': page_obj,
+        'payments': page_obj.object_list,
+    }
 
+    return render(request, 'payments/verification_queue.html', context)
 
-def upload_to_s3(file_obj):
+
+@staff_member_required
+def reconcile_statement(request):
     """
-    Upload file to S3/Cloud Storage
-    Placeholder - implement with boto3 in production
+    Upload a bank/QR statement (CSV or OFX) and match it against unpaid and
+    pending payments; optionally settle the transaction-id matches.
     """
-    # TODO: Implement S3 upload
-    # import boto3
-    # s3_client = boto3.client('s3')
-    # s3_client.upload_fileobj(file_obj, bucket, key)
-    # return f"https://{bucket}.s3.amazonaws.com/{key}"
-    
-    return "/media/placeholder.jpg"
\ No newline at end of file
+    context = {}
+    if request.method == 'POST':
+        upload = request.FILES.get('statement')
+        if not upload:
+            messages.error(request, 'Choose a statement file to upload.')
+            return redirect('payments:reconcile')
+
+        fmt = 'ofx' if upload.name.lower().endswith(('.ofx', '.qfx')) else 'csv'
+        try:
+            report = StatementReconciler().reconcile(read_statement(upload.file, fmt))
+        except StatementError as exc:
+            messages.error(request, str(exc))
+            return redirect('payments:reconcile')
+
+        if request.POST.get('apply'):
+            settled = StatementReconciler.apply(report, request.user)
+            messages.success(request, f'{settled} payment(s) marked paid from the statement.')
+
+        limit = 200
+        context = {
+            'report': report,
+            'summary': [(key.replace('_', ' ').capitalize(), value) for key, value in report.summary().items()],
+            'matched': report.matched[:limit],
+            'ambiguous': report.ambiguous[:limit],
+            'unmatched_lines': report.unmatched_lines[:limit],
+            'limit': limit,
+            'applied': bool(request.POST.get('apply')),
+        }
+
+    return render(request, 'payments/reconcile.html', context)
+
+
+# =====================================================
+# UTILITY FUNCTIONS
+# =====================================================
+
+def qr_response(response, digest):
+    """Strong ETag plus long-lived private caching: the URL carries the content hash."""
+    response['ETag'] = f'"{digest}"'
+    response['Cache-Control'] = 'private, max-age=31536000, immutable'
+    return response
@@ -5,6 +5,7 @@ from .models import (
     Cart, CartItem, PharmacyWishlist
 )
 from .models import PharmacyOrderActivity
+from .services import PharmacyOrderTransitionService
 
 
 @admin.register(MedicineCategory)
@@ -115,6 +116,32 @@ class PharmacyOrderAdmin(admin.ModelAdmin):
         }),
     )
 
+    actions = ['mark_as_confirmed', 'mark_as_processing', 'mark_as_out_for_delivery', 'mark_as_delivered', 'mark_as_cancelled']
+
+    def _transition(self, request, queryset, transition, label):
+        count = len(transition.apply(queryset, actor=request.user))
+        self.message_user(request, f'{count} order(s) marked as {label}.')
+
+    def mark_as_confirmed(self, request, queryset):
+        self._transition(request, queryset, PharmacyOrderTransitionService.confirm, 'confirmed')
+    mark_as_confirmed.short_description = 'Mark selected as Confirmed'
+
+    def mark_as_processing(self, request, queryset):
+        self._transition(request, queryset, PharmacyOrderTransitionService.process, 'processing')
+    mark_as_processing.short_description = 'Mark selected as Processing'
+
+    def mark_as_out_for_delivery(self, request, queryset):
+        self._transition(request, queryset, PharmacyOrderTransitionService.dispatch, 'out for delivery')
+    mark_as_out_for_delivery.short_description = 'Mark selected as Out for Delivery'
+
+    def mark_as_delivered(self, request, queryset):
+        self._transition(request, queryset, PharmacyOrderTransitionService.deliver, 'delivered')
+    mark_as_delivered.short_description = 'Mark selected as Delivered'
+
+    def mark_as_cancelled(self, request, queryset):
+        self._transition(request, queryset, PharmacyOrderTransitionService.cancel, 'cancelled')
+    mark_as_cancelled.short_description = 'Mark selected as Cancelled'
+
     def save_model(self, request, obj, form, change):
         # Allow staff/admin to override immutability when editing in admin
         if change:
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 15:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pharmacy', '0004_pharmacyorderactivity'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pharmacyorderactivity',
+            index=models.Index(fields=['order', 'created_at'], name='pharmacy_activity_order_idx'),
+        ),
+    ]
@@ -3,6 +3,8 @@ from django.core.validators import MinValueValidator
 from django.core.exceptions import ValidationError
 from decimal import Decimal
 
+from utils.querysets import UnpaidPaymentQuerySet
+
 
 class MedicineCategory(models.Model):
     """
@@ -115,6 +117,10 @@ class Medicine(models.Model):
         return self.stock_quantity <= self.low_stock_threshold
 
 
+class PharmacyOrderQuerySet(UnpaidPaymentQuerySet):
+    payment_link = 'pharmacy_order'
+
+
 class PharmacyOrder(models.Model):
     """
     Pharmacy delivery orders
@@ -164,6 +170,8 @@ class PharmacyOrder(models.Model):
     # Metadata
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    objects = PharmacyOrderQuerySet.as_manager()
     
     class Meta:
         db_table = 'pharmacy_orders'
@@ -178,7 +186,10 @@ class PharmacyOrder(models.Model):
         return f"Order #{self.order_number}"
     
     def save(self, *args, **kwargs):
+        from .services import PharmacyActivityRecorder
+
         # Prevent modifying critical order fields once order is no longer pending
+        old = None
         if self.pk:
             try:
                 old = PharmacyOrder.objects.get(pk=self.pk)
@@ -201,54 +212,47 @@ class PharmacyOrder(models.Model):
         self.total_amount = self.subtotal + self.delivery_charge - self.discount
         # Detect changes for activity logging
         is_new = self.pk is None
-        old_status = None
-        old_prescription_verified = None
-        if not is_new:
-            try:
-                old = PharmacyOrder.objects.get(pk=self.pk)
-                old_status = old.status
-                old_prescription_verified = old.prescription_verified
-            except PharmacyOrder.DoesNotExist:
-                old = None
-
-        super().save(*args, **kwargs)
+        old_status = old.status if old else None
+        old_prescription_verified = old.prescription_verified if old else None
 
-        # Create activities
-        try:
-            from .models import PharmacyOrderActivity
-        except Exception:
-            PharmacyOrderActivity = None
+        # Timeline rows are buffered and written with one bulk insert
+        with PharmacyActivityRecorder():
+            super().save(*args, **kwargs)
 
-        if PharmacyOrderActivity:
             if is_new:
-                PharmacyOrderActivity.objects.create(
-                    order=self,
-                    title='Order placed',
-                    message='Your order has been placed successfully.'
+                PharmacyActivityRecorder.record(
+                    self,
+                    'Order placed',
+                    'Your order has been placed successfully.',
+                    activity_type='placed',
                 )
 
             # Prescription uploaded on create
             if is_new and self.prescription_image:
-                PharmacyOrderActivity.objects.create(
-                    order=self,
-                    title='Prescription uploaded',
-                    message='Prescription uploaded for verification.'
+                PharmacyActivityRecorder.record(
+                    self,
+                    'Prescription uploaded',
+                    'Prescription uploaded for verification.',
+                    activity_type='prescription_uploaded',
                 )
 
             # Prescription verified
             if old_prescription_verified is not None and not old_prescription_verified and self.prescription_verified:
-                PharmacyOrderActivity.objects.create(
-                    order=self,
-                    title='Prescription verified',
-                    message='Prescription has been verified by our team.'
+                PharmacyActivityRecorder.record(
+                    self,
+                    'Prescription verified',
+                    'Prescription has been verified by our team.',
+                    activity_type='prescription_verified',
                 )
 
             # Status change
             if old_status is not None and old_status != self.status:
-                PharmacyOrderActivity.objects.create(
-                    order=self,
-                    title=f'Order {self.get_status_display()}',
-                    message=f'Order status updated to {self.get_status_display()}.'
+                PharmacyActivityRecorder.record(
+                    self,
+                    f'Order {self.get_status_display()}',
+                    f'Order status updated to {self.get_status_display()}.',
+                    activity_type='delivered' if self.status == 'delivered' else 'status',
+                    metadata={'from': old_status, 'to': self.status},
                 )
 
 
@@ -298,6 +302,10 @@ class PharmacyOrderActivity(models.Model):
     class Meta:
         db_table = 'pharmacy_order_activities'
         ordering = ['created_at']
+        indexes = [
+            # Timelines per order, and the customer's recent activity (joined through the order)
+            models.Index(fields=['order', 'created_at'], name='pharmacy_activity_order_idx'),
+        ]
 
     def __str__(self):
         return f"{self.order.order_number} - {self.title}"
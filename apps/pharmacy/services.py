@@ -0,0 +1,156 @@
+"""
+UH Care - Pharmacy order services
+"""
+
+import sys
+import threading
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Sum
+from django.urls import reverse
+from django.utils import timezone
+
+from utils.transitions import BulkTransition, bulk_increment, transition_applied
+from .models import Medicine, PharmacyOrder, PharmacyOrderActivity, PharmacyOrderItem
+
+
+class PharmacyActivityRecorder:
+    """
+    Buffers PharmacyOrderActivity rows and writes them with one bulk_create.
+
+    Used as a context manager that also opens a transaction: entries
+    recorded inside the block are flushed just before it commits and are
+    discarded if it raises. Nested recorders join the outermost buffer.
+    Outside any recorder, record() saves immediately.
+
+        with PharmacyActivityRecorder():
+            order.save()
+            PharmacyActivityRecorder.record(order, 'Payment record', ...)
+    """
+
+    _state = threading.local()
+
+    def __enter__(self):
+        self._owner = getattr(self._state, 'buffer', None) is None
+        if self._owner:
+            self._atomic = transaction.atomic()
+            self._atomic.__enter__()
+            self._state.buffer = []
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if not self._owner:
+            return False
+        buffer, self._state.buffer = self._state.buffer, None
+        try:
+            if exc_type is None and buffer:
+                PharmacyOrderActivity.objects.bulk_create(buffer)
+        except Exception:
+            self._atomic.__exit__(*sys.exc_info())
+            raise
+        return self._atomic.__exit__(exc_type, exc_value, traceback)
+
+    @classmethod
+    def record(cls, order, title, message='', activity_type='other', actor=None, metadata=None):
+        activity = PharmacyOrderActivity(
+            order=order,
+            actor=actor,
+            activity_type=activity_type,
+            title=title,
+            message=message,
+            metadata=metadata,
+        )
+        buffer = getattr(cls._state, 'buffer', None)
+        if buffer is None:
+            activity.save()
+        else:
+            buffer.append(activity)
+        return activity
+
+
+class PharmacyOrderTransitionService:
+    """
+    Bulk status changes for pharmacy orders. After the UPDATE, one handler
+    writes the timeline entries with bulk_create, sends notifications in
+    bulk and, for cancellations, restores stock and refunds open payments.
+    """
+
+    confirm = BulkTransition(PharmacyOrder, 'confirm', 'confirmed', ['pending'], related=['customer'])
+    process = BulkTransition(PharmacyOrder, 'process', 'processing', ['confirmed'], related=['customer'])
+    dispatch = BulkTransition(
+        PharmacyOrder, 'dispatch', 'out_for_delivery', ['confirmed', 'processing'], related=['customer']
+    )
+    deliver = BulkTransition(
+        PharmacyOrder, 'deliver', 'delivered', ['out_for_delivery'],
+        timestamp_field='delivered_at', related=['customer'],
+    )
+    cancel = BulkTransition(
+        PharmacyOrder, 'cancel', 'cancelled', ['pending', 'confirmed', 'processing'], related=['customer']
+    )
+
+    # Same wording as notifications.signals.pharmacy_order_notification
+    NOTIFICATIONS = {
+        'confirmed': ('order_confirmed', 'Order Confirmed',
+                      'Your order #{number} has been confirmed and is being processed.'),
+        'out_for_delivery': ('order_shipped', 'Order Out for Delivery',
+                             'Your order #{number} is out for delivery!'),
+        'delivered': ('order_delivered', 'Order Delivered',
+                      'Your order #{number} has been delivered. Thank you for shopping with UH Care!'),
+    }
+
+    @staticmethod
+    def release_cancelled(ids):
+        """Return stock for cancelled orders and refund their open payments."""
+        from apps.payments.models import Payment
+
+        quantities = defaultdict(int)
+        for medicine_id, quantity in PharmacyOrderItem.objects.filter(order_id__in=ids).values(
+            'medicine_id'
+        ).annotate(quantity=Sum('quantity')).values_list('medicine_id', 'quantity'):
+            quantities[medicine_id] += quantity
+        bulk_increment(Medicine, 'stock_quantity', quantities)
+
+        Payment.objects.filter(pharmacy_order_id__in=ids).exclude(
+            payment_status__in=['refunded', 'paid']
+        ).update(payment_status='refunded', verified_at=timezone.now())
+
+    @staticmethod
+    def on_transition(sender, transition, instances, previous, actor=None, **kwargs):
+        from apps.notifications.services import NotificationService
+
+        with PharmacyActivityRecorder():
+            for order in instances:
+                display = order.get_status_display()
+                PharmacyActivityRecorder.record(
+                    order,
+                    f'Order {display}',
+                    f'Order status updated to {display}.',
+                    activity_type='delivered' if order.status == 'delivered' else 'status',
+                    actor=actor,
+                    metadata={'from': previous.get(order.pk), 'to': order.status},
+                )
+
+        if transition.target == 'cancelled':
+            PharmacyOrderTransitionService.release_cancelled([order.id for order in instances])
+
+        notification = PharmacyOrderTransitionService.NOTIFICATIONS.get(transition.target)
+        if notification:
+            notification_type, title, message = notification
+            NotificationService.send_bulk_notifications([
+                {
+                    'user': order.customer,
+                    'title': title,
+                    'message': message.format(number=order.order_number),
+                    'related_object': order,
+                    'action_url': reverse('pharmacy:order_confirmation', args=[order.order_number]),
+                }
+                for order in instances
+            ], notification_type)
+
+
+transition_applied.connect(
+    PharmacyOrderTransitionService.on_transition,
+    sender=PharmacyOrder,
+    dispatch_uid='pharmacy.bulk_transition',
+)
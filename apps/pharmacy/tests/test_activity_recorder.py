@@ -0,0 +1,70 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from apps.accounts.models import User
+from apps.pharmacy.models import PharmacyOrder, PharmacyOrderActivity
+from apps.pharmacy.services import PharmacyActivityRecorder
+
+
+class PharmacyActivityRecorderTestCase(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(username='customer1', password='pass', role='patient')
+
+    def _order(self, **kwargs):
+        return PharmacyOrder(
+            customer=self.customer,
+            delivery_address='Kathmandu',
+            delivery_phone='9800000000',
+            **kwargs
+        )
+
+    def _activity_inserts(self, queries):
+        return [q for q in queries if q['sql'].startswith('INSERT INTO "pharmacy_order_activities"')]
+
+    def test_new_order_timeline_is_one_insert(self):
+        order = self._order(prescription_image='https://example.com/rx.jpg')
+
+        with CaptureQueriesContext(connection) as ctx:
+            order.save()
+
+        self.assertEqual(len(self._activity_inserts(ctx.captured_queries)), 1)
+        self.assertEqual(
+            list(order.activities.values_list('activity_type', flat=True)),
+            ['placed', 'prescription_uploaded'],
+        )
+
+    def test_nested_recorders_share_one_flush(self):
+        with CaptureQueriesContext(connection) as ctx:
+            with PharmacyActivityRecorder():
+                order = self._order()
+                order.save()
+                PharmacyActivityRecorder.record(order, 'Payment record', activity_type='payment')
+                self.assertFalse(PharmacyOrderActivity.objects.exists())
+
+        self.assertEqual(len(self._activity_inserts(ctx.captured_queries)), 1)
+        self.assertEqual(order.activities.count(), 2)
+
+    def test_rolled_back_block_writes_nothing(self):
+        with self.assertRaises(RuntimeError):
+            with PharmacyActivityRecorder():
+                self._order().save()
+                raise RuntimeError('checkout failed')
+
+        self.assertFalse(PharmacyOrder.objects.exists())
+        self.assertFalse(PharmacyOrderActivity.objects.exists())
+
+        # The buffer is reset, so later writes outside a recorder go straight in
+        order = self._order()
+        order.save()
+        self.assertEqual(order.activities.count(), 1)
+
+    def test_status_change_records_transition(self):
+        order = self._order()
+        order.save()
+        order.status = 'confirmed'
+        order.save()
+
+        activity = order.activities.last()
+        self.assertEqual(activity.activity_type, 'status')
+        self.assertEqual(activity.metadata, {'from': 'pending', 'to': 'confirmed'})
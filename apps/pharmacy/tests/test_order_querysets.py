@@ -0,0 +1,33 @@
+from decimal import Decimal
+
+from django.test import TestCase
+
+from apps.accounts.models import User
+from apps.payments.models import Payment
+from apps.pharmacy.models import PharmacyOrder
+
+
+class PharmacyOrderQuerySetTestCase(TestCase):
+    def setUp(self):
+        self.patient = User.objects.create_user(username='patient1', password='pass', role='patient')
+
+    def _order(self):
+        order = PharmacyOrder(customer=self.patient, delivery_address='Kathmandu', delivery_phone='9800000000')
+        order.save()
+        return order
+
+    def test_with_unpaid_payment_annotates_newest_unpaid(self):
+        paid = self._order()
+        Payment.objects.create(patient=self.patient, amount=Decimal('100.00'), payment_status='paid', pharmacy_order=paid)
+        unpaid = self._order()
+        Payment.objects.create(patient=self.patient, amount=Decimal('50.00'), payment_status='unpaid', pharmacy_order=unpaid)
+        latest = Payment.objects.create(
+            patient=self.patient, amount=Decimal('50.00'), payment_status='unpaid', pharmacy_order=unpaid
+        )
+
+        with self.assertNumQueries(1):
+            orders = {o.pk: o for o in PharmacyOrder.objects.with_unpaid_payment()}
+
+        self.assertIsNone(orders[paid.pk].unpaid_payment_id)
+        self.assertEqual(orders[unpaid.pk].unpaid_payment_id, latest.id)
+        self.assertEqual(orders[unpaid.pk].unpaid_payment_created_at, latest.created_at)
@@ -0,0 +1,101 @@
+from decimal import Decimal
+
+from django.core import mail
+from django.db import transaction
+from django.test import TestCase
+
+from apps.accounts.models import User
+from apps.notifications.models import EmailLog, Notification
+from apps.payments.models import Payment
+from apps.pharmacy.models import Medicine, MedicineCategory, PharmacyOrder, PharmacyOrderItem
+from apps.pharmacy.services import PharmacyOrderTransitionService
+
+
+class PharmacyOrderTransitionServiceTestCase(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin1', password='pass', role='admin', is_staff=True)
+        self.customer = User.objects.create_user(
+            username='customer1', email='customer1@example.com', password='pass', role='patient'
+        )
+        category = MedicineCategory.objects.create(name='Pain Relief', slug='pain-relief')
+        self.medicine = Medicine.objects.create(
+            category=category, name='Paracetamol', slug='paracetamol', description='Tablets',
+            uses='Pain', dosage_instructions='Daily', strength='500mg', package_size=10,
+            price=Decimal('50.00'), stock_quantity=10,
+        )
+
+    def _order(self, status='pending', quantity=2):
+        order = PharmacyOrder.objects.create(
+            customer=self.customer, subtotal=Decimal('100.00'), delivery_address='Kathmandu',
+            delivery_phone='9800000000', status=status,
+        )
+        PharmacyOrderItem.objects.create(
+            order=order, medicine=self.medicine, quantity=quantity, unit_price=self.medicine.price
+        )
+        Payment.objects.create(patient=self.customer, amount=order.total_amount, pharmacy_order=order)
+        return order
+
+    def test_confirm_records_timeline_and_notifies(self):
+        order = self._order()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            confirmed = PharmacyOrderTransitionService.confirm.apply(PharmacyOrder.objects.all(), actor=self.admin)
+
+        self.assertEqual([o.pk for o in confirmed], [order.pk])
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'confirmed')
+        activity = order.activities.get(activity_type='status')
+        self.assertEqual(activity.actor, self.admin)
+        self.assertEqual(activity.metadata, {'from': 'pending', 'to': 'confirmed'})
+        self.assertTrue(Notification.objects.filter(notification_type='order_confirmed', object_id=order.pk).exists())
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_deliver_sets_timestamp(self):
+        order = self._order(status='out_for_delivery')
+
+        PharmacyOrderTransitionService.deliver.apply(PharmacyOrder.objects.all())
+
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'delivered')
+        self.assertIsNotNone(order.delivered_at)
+        self.assertTrue(order.activities.filter(activity_type='delivered').exists())
+
+    def test_cancel_restocks_and_refunds_open_payments(self):
+        self._order(quantity=2)
+        self._order(status='processing', quantity=3)
+
+        cancelled = PharmacyOrderTransitionService.cancel.apply(PharmacyOrder.objects.all())
+
+        self.assertEqual(len(cancelled), 2)
+        self.medicine.refresh_from_db()
+        self.assertEqual(self.medicine.stock_quantity, 15)
+        self.assertEqual(set(Payment.objects.values_list('payment_status', flat=True)), {'refunded'})
+
+    def test_rejected_states_are_left_alone(self):
+        delivered = self._order(status='delivered')
+        pending = self._order(status='pending')
+
+        self.assertEqual(PharmacyOrderTransitionService.cancel.apply(PharmacyOrder.objects.filter(pk=delivered.pk)), [])
+        self.assertEqual(PharmacyOrderTransitionService.deliver.apply(PharmacyOrder.objects.filter(pk=pending.pk)), [])
+
+        delivered.refresh_from_db()
+        pending.refresh_from_db()
+        self.assertEqual((delivered.status, pending.status), ('delivered', 'pending'))
+        self.medicine.refresh_from_db()
+        self.assertEqual(self.medicine.stock_quantity, 10)
+        self.assertFalse(Payment.objects.filter(payment_status='refunded').exists())
+        self.assertFalse(Notification.objects.exists())
+
+    def test_rolled_back_transition_sends_nothing(self):
+        self._order()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError):
+                with transaction.atomic():
+                    PharmacyOrderTransitionService.confirm.apply(PharmacyOrder.objects.all())
+                    raise RuntimeError('admin action failed')
+
+        self.assertEqual(PharmacyOrder.objects.get().status, 'pending')
+        self.assertFalse(Notification.objects.exists())
+        self.assertFalse(EmailLog.objects.exists())
+        self.assertEqual(mail.outbox, [])
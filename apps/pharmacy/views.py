@@ -5,14 +5,19 @@ Pharmacy app views
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q
+from django.db.models import Prefetch, Q
 from django.core.paginator import Paginator
-from django.db import transaction
+from collections import defaultdict
 from decimal import Decimal
-from .models import Medicine, MedicineCategory, PharmacyOrder, PharmacyOrderItem
+from config.idempotency import idempotent
+from config.routers import use_replica
+from utils.transitions import bulk_increment
+from .models import Medicine, MedicineCategory, PharmacyOrder, PharmacyOrderActivity, PharmacyOrderItem
 from .forms import PharmacyOrderForm
+from .services import PharmacyActivityRecorder
 
 
+@use_replica
 def medicine_list(request, category_slug=None):
     """
     Display list of medicines with filtering
@@ -214,6 +219,7 @@ def update_cart_quantity(request, item_id):
 
 
 @login_required
+@idempotent
 def checkout(request):
     """
     Checkout and create pharmacy order
@@ -235,27 +241,33 @@ def checkout(request):
             return redirect('dashboard:provider')
         if form.is_valid():
             try:
-                with transaction.atomic():
+                # Timeline entries for the whole checkout are inserted together on commit
+                with PharmacyActivityRecorder():
                     # Create order
                     order = form.save(commit=False)
                     order.customer = request.user
                     order.subtotal = cart.subtotal
                     order.save()
                     
-                    # Create order items and update stock
-                    for cart_item in cart_items:
-                        PharmacyOrderItem.objects.create(
+                    # Create order items and update stock with a fixed number
+                    # of statements however many lines the cart has
+                    lines = list(cart_items)
+                    PharmacyOrderItem.objects.bulk_create([
+                        PharmacyOrderItem(
                             order=order,
-                            medicine=cart_item.medicine,
+                            medicine_id=cart_item.medicine_id,
                             quantity=cart_item.quantity,
                             unit_price=cart_item.unit_price,
+                            # Same as PharmacyOrderItem.save, which bulk_create skips
+                            total_price=cart_item.unit_price * cart_item.quantity,
                         )
-                        
-                        # Reduce stock
-                        medicine = cart_item.medicine
-                        medicine.stock_quantity -= cart_item.quantity
-                        medicine.total_sales += cart_item.quantity
-                        medicine.save()
+                        for cart_item in lines
+                    ])
+                    sold = defaultdict(int)
+                    for cart_item in lines:
+                        sold[cart_item.medicine_id] += cart_item.quantity
+                    bulk_increment(Medicine, 'stock_quantity', {pk: -quantity for pk, quantity in sold.items()})
+                    bulk_increment(Medicine, 'total_sales', sold)
                     
                     # Clear cart
                     cart_items.delete()
@@ -269,6 +281,13 @@ def checkout(request):
                         payment_status='unpaid',
                         pharmacy_order=order,
                     )
+                    PharmacyActivityRecorder.record(
+                        order,
+                        'Payment record',
+                        'Payment record created.',
+                        activity_type='payment',
+                        actor=request.user,
+                    )
                     
                     messages.success(request, f'Order #{order.order_number} placed successfully!')
                     return redirect('pharmacy:order_confirmation', order_number=order.order_number)
@@ -309,69 +328,20 @@ def order_confirmation(request, order_number):
     Order confirmation page
     """
     order = get_object_or_404(
-        PharmacyOrder.objects.prefetch_related('items__medicine'),
+        PharmacyOrder.objects.prefetch_related(
+            'items__medicine',
+            Prefetch(
+                'activities',
+                queryset=PharmacyOrderActivity.objects.order_by('created_at', 'id'),
+                to_attr='timeline',
+            ),
+        ),
         order_number=order_number,
         customer=request.user
     )
-    
-    # Build recent activities timeline using available timestamps
-    from apps.payments.models import Payment
-    activities = []
-
-    # Order placed
-    activities.append({
-        'title': 'Order placed',
-        'message': 'Your order was placed successfully.',
-        'time': order.created_at,
-        'status': 'placed',
-    })
-
-    # Payment record (if any)
-    payment = Payment.objects.filter(pharmacy_order=order).order_by('created_at').first()
-    if payment:
-        activities.append({
-            'title': 'Payment record',
-            'message': f'Payment record created (Method: {payment.get_payment_method_display() or payment.payment_method}).',
-            'time': payment.created_at,
-            'status': 'payment',
-        })
-
-    # Prescription uploaded/verified
-    if order.prescription_image:
-        activities.append({
-            'title': 'Prescription uploaded',
-            'message': 'Prescription was uploaded for verification.',
-            'time': order.created_at,
-            'status': 'prescription',
-        })
-    if order.prescription_verified:
-        activities.append({
-            'title': 'Prescription verified',
-            'message': 'Prescription has been verified by our team.',
-            'time': order.updated_at,
-            'status': 'prescription_verified',
-        })
-
-    # Status milestone
-    if order.status and order.status != 'pending':
-        activities.append({
-            'title': f'Order {order.get_status_display()}',
-            'message': f'Order status updated to {order.get_status_display()}.',
-            'time': order.updated_at,
-            'status': order.status,
-        })
-
-    # Delivered
-    if order.delivered_at:
-        activities.append({
-            'title': 'Order delivered',
-            'message': 'Order has been delivered to the provided address.',
-            'time': order.delivered_at,
-            'status': 'delivered',
-        })
-
-    # Sort activities by time ascending
-    activities = sorted([a for a in activities if a.get('time')], key=lambda x: x['time'])
+
+    # Timeline rows are written by PharmacyActivityRecorder, oldest first
+    activities = order.timeline
 
     context = {
         'order': order,
@@ -386,21 +356,14 @@ def my_orders(request):
     """
     View user's pharmacy orders
     """
+    # Any unpaid payment is annotated in the same query for the template
     orders = (
         PharmacyOrder.objects.filter(customer=request.user)
-        .prefetch_related('items__medicine', 'payments')
+        .with_unpaid_payment()
+        .prefetch_related('items__medicine')
         .order_by('-created_at')
     )
 
-    # Attach any unpaid payment to the order for simple template rendering
-    for o in orders:
-        unpaid = None
-        for pay in o.payments.all():
-            if getattr(pay, 'payment_status', None) == 'unpaid':
-                unpaid = pay
-                break
-        o.unpaid_payment = unpaid
-
     context = {
         'orders': orders,
     }
@@ -5,7 +5,12 @@ Services Admin Configuration
 from django.contrib import admin
 from django.utils.html import format_html
 from django.urls import reverse
-from .models import ServiceCategory, Service, Wishlist
+from .models import ServiceCategory, Service, Wishlist, SpecializationCategory
+
+
+class SpecializationCategoryInline(admin.TabularInline):
+    model = SpecializationCategory
+    extra = 0
 
 
 @admin.register(ServiceCategory)
@@ -15,6 +20,7 @@ class ServiceCategoryAdmin(admin.ModelAdmin):
     search_fields = ['name', 'description']
     ordering = ['display_order', 'name']
     # ServiceCategory model does not have a slug field. Remove prepopulated_fields.
+    inlines = [SpecializationCategoryInline]
     
     def service_count(self, obj):
         count = obj.services.count()
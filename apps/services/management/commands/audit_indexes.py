@@ -0,0 +1,127 @@
+import os
+from datetime import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Sum
+from django.utils import timezone
+
+from utils.index_audit import TUNED_INDEXES, IndexAudit, QueryCapture, baseline_allowed, render_report
+
+
+def hot_queries():
+    """The filters behind the busiest pages and jobs, as the views and services write them."""
+    from apps.accounts.models import User
+    from apps.appointments.models import Appointment, PersonalAppointment
+    from apps.appointments.services import ProviderAssignmentService
+    from apps.equipment.models import EquipmentPurchase, EquipmentRental
+    from apps.payments.models import Payment
+    from apps.pharmacy.models import PharmacyOrder, PharmacyOrderActivity
+
+    patient = User.objects.filter(role='patient').values('id', 'email').first() or {'id': 0, 'email': ''}
+    patient_id = patient['id']
+    provider_id = User.objects.filter(role='provider').values_list('id', flat=True).first() or 0
+    order_id = PharmacyOrder.objects.values_list('id', flat=True).first() or 0
+    today = timezone.localdate()
+
+    return {
+        'accounts.login': lambda: User.objects.for_login(patient['email'].upper()).order_by('id').first(),
+        'payments.cash_committed': lambda: Payment.objects.filter(
+            patient_id=patient_id, payment_status='unpaid', payment_method='cash'
+        ).aggregate(total=Sum('amount')),
+        'appointments.provider_day': lambda: list(Appointment.objects.filter(
+            provider_id=provider_id, appointment_date=today
+        ).order_by('appointment_time')),
+        'appointments.unassigned_queue': lambda: ProviderAssignmentService.load_open_appointments(limit=50),
+        'personal.slot_booked': lambda: PersonalAppointment.objects.filter(
+            provider_id=provider_id, appointment_date=today, appointment_time=time(10, 0),
+            status__in=['pending', 'confirmed'],
+        ).exists(),
+        'equipment.recent_rentals': lambda: list(
+            EquipmentRental.objects.filter(customer_id=patient_id).order_by('-created_at')[:5]
+        ),
+        'equipment.recent_purchases': lambda: list(
+            EquipmentPurchase.objects.filter(customer_id=patient_id).order_by('-created_at')[:5]
+        ),
+        'pharmacy.recent_activity': lambda: list(
+            PharmacyOrderActivity.objects.filter(order__customer_id=patient_id).order_by('-created_at')[:6]
+        ),
+        'pharmacy.order_timeline': lambda: list(
+            PharmacyOrderActivity.objects.filter(order_id=order_id).order_by('created_at', 'id')
+        ),
+    }
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN the queries behind the benchmarks and hot paths, flag scans/sorts and propose indexes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--source', nargs='*', choices=['benchmarks', 'hot'], default=['benchmarks', 'hot'],
+            help='Workloads to capture queries from (default: both)'
+        )
+        parser.add_argument(
+            '--baseline', nargs='*', default=list(TUNED_INDEXES),
+            help='Indexes dropped (in a rolled-back transaction) for the "before" plans; pass none to skip. '
+                 'Only with DEBUG on or against a test/load copy of the database'
+        )
+        parser.add_argument('--flagged-only', action='store_true', help='Leave statements with clean plans out of the report')
+        parser.add_argument(
+            '--output', default=None, help='Markdown report (default: benchmarks/index-audit-<timestamp>.md)'
+        )
+
+    def handle(self, *args, **options):
+        if options['baseline'] and not baseline_allowed(connections[DEFAULT_DB_ALIAS]):
+            raise CommandError(
+                '--baseline drops indexes and locks their tables until it rolls back. Run it with DEBUG on '
+                'or against a test/load copy of the database (LOAD_TEST_DATABASE=True), or pass --baseline '
+                'with no index names to skip the "before" plans.'
+            )
+
+        workloads = {}
+        if 'hot' in options['source']:
+            workloads.update(hot_queries())
+        if 'benchmarks' in options['source']:
+            workloads.update(self.benchmark_workloads())
+        if not workloads:
+            raise CommandError('Nothing to capture.')
+
+        with QueryCapture() as capture:
+            for name, run in workloads.items():
+                capture.label = name
+                try:
+                    run()
+                except Exception as exc:
+                    self.stdout.write(self.style.WARNING(f'{name}: skipped ({type(exc).__name__}: {exc})'))
+
+        findings = IndexAudit(capture.queries, baseline_indexes=options['baseline']).run()
+        if options['flagged_only']:
+            findings = [f for f in findings if f.flagged or f.improved]
+
+        output = options['output'] or os.path.join(
+            'benchmarks', f"index-audit-{timezone.now():%Y%m%d-%H%M%S}.md"
+        )
+        os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+        with open(output, 'w') as fh:
+            fh.write(render_report(findings, options['baseline']))
+
+        flagged = sum(1 for f in findings if f.flagged)
+        improved = sum(1 for f in findings if f.improved)
+        proposals = {(table, tuple(fields)) for f in findings for table, fields in f.proposals}
+        for table, fields in sorted(proposals):
+            self.stdout.write(f'Proposed: {table} ({", ".join(fields)})')
+        self.stdout.write(self.style.SUCCESS(
+            f'Audited {len(findings)} statement(s): {flagged} with full scans or temp sorts, '
+            f'{improved} changed by the baseline indexes. Report written to {output}'
+        ))
+
+    def benchmark_workloads(self):
+        from .run_benchmarks import Command as Benchmarks
+
+        benchmarks = Benchmarks(stdout=self.stdout, stderr=self.stderr)
+        try:
+            benchmarks.load_actors()
+        except CommandError as exc:
+            self.stdout.write(self.style.WARNING(f'benchmarks: skipped ({exc})'))
+            return {}
+        return benchmarks.benchmarks()
@@ -0,0 +1,103 @@
+import os
+import tempfile
+import threading
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError
+from django.db.utils import ConnectionHandler
+
+from config.database import sqlite_config
+
+
+class Command(BaseCommand):
+    help = 'Compare SQLite write/read throughput under concurrency with and without the connection pragmas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4, help='Concurrent writer threads')
+        parser.add_argument('--readers', type=int, default=4, help='Concurrent reader threads')
+        parser.add_argument('--seconds', type=float, default=5.0, help='Duration of each run')
+
+    def handle(self, *args, **options):
+        baseline = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'OPTIONS': {},
+        }
+        # What config.database builds for SQLite: WAL, synchronous=NORMAL and
+        # a busy timeout, against Django's stock backend (rollback journal,
+        # sqlite3's 5s lock wait)
+        tuned = sqlite_config(None, conn_max_age=0)
+
+        results = {}
+        for label, settings_dict in (('baseline', baseline), ('tuned', tuned)):
+            results[label] = self.run(settings_dict, options)
+            r = results[label]
+            self.stdout.write(
+                f"{label:<9} writes {r['writes'] / r['seconds']:>8.1f}/s  reads {r['reads'] / r['seconds']:>8.1f}/s  "
+                f"locked errors {r['locked']}"
+            )
+
+        before, after = results['baseline']['writes'], results['tuned']['writes']
+        change = (after - before) / before * 100 if before else float('inf')
+        self.stdout.write(self.style.SUCCESS(f'Write throughput change: {change:+.1f}%'))
+
+    def run(self, settings_dict, options):
+        with tempfile.TemporaryDirectory() as directory:
+            handler = ConnectionHandler({
+                'default': dict(settings_dict, NAME=os.path.join(directory, 'bench.sqlite3')),
+            })
+            with handler['default'].cursor() as cursor:
+                cursor.execute('CREATE TABLE bench (id INTEGER PRIMARY KEY, counter INTEGER, payload TEXT)')
+                cursor.execute("INSERT INTO bench (id, counter, payload) VALUES (1, 0, '')")
+            handler['default'].close()
+
+            counts = {'writes': 0, 'reads': 0, 'locked': 0}
+            lock = threading.Lock()
+            deadline = perf_counter() + options['seconds']
+
+            def bump(key):
+                with lock:
+                    counts[key] += 1
+
+            def writer():
+                connection = handler['default']
+                try:
+                    while perf_counter() < deadline:
+                        try:
+                            # A booking-sized write: one insert and one counter update
+                            with connection.cursor() as cursor:
+                                cursor.execute('BEGIN IMMEDIATE')
+                                cursor.execute("INSERT INTO bench (counter, payload) VALUES (0, 'x')")
+                                cursor.execute('UPDATE bench SET counter = counter + 1 WHERE id = 1')
+                                cursor.execute('COMMIT')
+                            bump('writes')
+                        except OperationalError:
+                            bump('locked')
+                            if connection.connection is not None and connection.connection.in_transaction:
+                                connection.connection.rollback()
+                finally:
+                    connection.close()
+
+            def reader():
+                connection = handler['default']
+                try:
+                    while perf_counter() < deadline:
+                        try:
+                            with connection.cursor() as cursor:
+                                cursor.execute('SELECT COUNT(*), MAX(counter) FROM bench')
+                                cursor.fetchone()
+                            bump('reads')
+                        except OperationalError:
+                            bump('locked')
+                finally:
+                    connection.close()
+
+            threads = [threading.Thread(target=writer) for _ in range(options['writers'])]
+            threads += [threading.Thread(target=reader) for _ in range(options['readers'])]
+            started = perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            counts['seconds'] = perf_counter() - started
+            return counts
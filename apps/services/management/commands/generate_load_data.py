@@ -0,0 +1,379 @@
+import random
+from datetime import time, timedelta
+from decimal import Decimal
+from time import perf_counter
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from apps.accounts.models import PatientProfile, ProviderProfile, User
+from apps.appointments.models import Appointment, OpenAppointmentRequest, PersonalAppointment, ProviderSchedule
+from apps.equipment.models import Equipment, EquipmentRental
+from apps.notifications.models import Notification
+from apps.payments.models import Payment
+from apps.pharmacy.models import (
+    Medicine, MedicineCategory, PharmacyOrder, PharmacyOrderActivity, PharmacyOrderItem,
+)
+from apps.services.models import Service, ServiceCategory, SpecializationCategory
+
+
+# Everything this command creates is tagged with this prefix (usernames,
+# slugs, order numbers) so --flush can remove it without touching real data.
+PREFIX = 'load'
+
+APPOINTMENT_STATUSES = (
+    ['completed'] * 50 + ['confirmed'] * 20 + ['pending'] * 15 + ['cancelled'] * 10 + ['rejected'] * 5
+)
+PERSONAL_STATUSES = ['completed'] * 55 + ['confirmed'] * 20 + ['pending'] * 15 + ['cancelled_by_patient'] * 10
+ORDER_STATUSES = ['delivered'] * 60 + ['pending'] * 15 + ['processing'] * 10 + ['cancelled'] * 15
+RENTAL_STATUSES = ['returned'] * 50 + ['active'] * 25 + ['confirmed'] * 10 + ['pending'] * 10 + ['cancelled'] * 5
+
+
+class Command(BaseCommand):
+    help = 'Bulk-generate production-scale synthetic data for benchmarking'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale', type=float, default=1.0,
+            help='Multiplier on the base volumes (1.0 = 1000 patients, ~15k payments)'
+        )
+        parser.add_argument('--seed', type=int, default=42, help='Random seed, for repeatable data sets')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Rows per bulk INSERT')
+        parser.add_argument('--flush', action='store_true', help='Delete previously generated load data first')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.today = timezone.localdate()
+        scale = options['scale']
+
+        self.volumes = {
+            'patients': max(1, int(1000 * scale)),
+            'providers': max(1, int(100 * scale)),
+            'services': 40,
+            'medicines': 500,
+            'equipment': 100,
+            'appointments_per_patient': 10,
+            'personal_per_patient': 4,
+            'orders_per_patient': 3,
+            'rentals_per_patient': 1,
+            'notifications_per_patient': 20,
+        }
+
+        started = perf_counter()
+        if options['flush']:
+            self.flush()
+
+        with transaction.atomic():
+            self.create_catalog()
+            self.create_users()
+            self.create_schedules()
+            self.create_appointments()
+            self.create_personal_appointments()
+            self.create_pharmacy_orders()
+            self.create_rentals()
+            self.create_notifications()
+            self.update_balances()
+
+        self.stdout.write(self.style.SUCCESS(f'Load data generated in {perf_counter() - started:.1f}s'))
+
+    # Helpers -----------------------------------------------------------------
+
+    def bulk(self, model, objs):
+        started = perf_counter()
+        created = model.objects.bulk_create(objs, batch_size=self.batch_size)
+        self.stdout.write(f'  {model.__name__}: {len(created)} rows in {perf_counter() - started:.2f}s')
+        return created
+
+    def past_or_future(self, past_days=180, future_days=60):
+        return self.today + timedelta(days=self.rng.randint(-past_days, future_days))
+
+    def slot(self):
+        return time(self.rng.randint(8, 16), self.rng.choice((0, 30)))
+
+    def flush(self):
+        self.stdout.write('Removing previous load data...')
+        User.objects.filter(username__startswith=f'{PREFIX}_').delete()
+        Medicine.objects.filter(slug__startswith=f'{PREFIX}-').delete()
+        MedicineCategory.objects.filter(slug__startswith=f'{PREFIX}-').delete()
+        Equipment.objects.filter(slug__startswith=f'{PREFIX}-').delete()
+        Service.objects.filter(slug__startswith=f'{PREFIX}-').delete()
+        ServiceCategory.objects.filter(slug__startswith=f'{PREFIX}-').delete()
+
+    # Generators ---------------------------------------------------------------
+
+    def create_catalog(self):
+        self.stdout.write('Creating catalog...')
+        specializations = [code for code, _ in ProviderProfile.SPECIALIZATION_CHOICES]
+        categories = self.bulk(ServiceCategory, [
+            ServiceCategory(name=f'Load {code.title()}', slug=f'{PREFIX}-{code}', display_order=i)
+            for i, code in enumerate(specializations)
+        ])
+        self.bulk(SpecializationCategory, [
+            SpecializationCategory(specialization=code, category=category)
+            for code, category in zip(specializations, categories)
+        ])
+        self.services = self.bulk(Service, [
+            Service(
+                category=categories[i % len(categories)],
+                name=f'Load Service {i}',
+                slug=f'{PREFIX}-service-{i}',
+                description='Synthetic service for load testing',
+                short_description='Synthetic service',
+                base_price=Decimal(self.rng.randrange(800, 4000, 100)),
+                what_included='Care',
+            )
+            for i in range(self.volumes['services'])
+        ])
+
+        medicine_categories = self.bulk(MedicineCategory, [
+            MedicineCategory(name=f'Load Medicines {i}', slug=f'{PREFIX}-medicines-{i}') for i in range(10)
+        ])
+        self.medicines = self.bulk(Medicine, [
+            Medicine(
+                category=medicine_categories[i % len(medicine_categories)],
+                name=f'Load Medicine {i}',
+                slug=f'{PREFIX}-medicine-{i}',
+                generic_name=f'Compound {i % 97}',
+                description='Synthetic medicine for load testing',
+                uses='Testing',
+                dosage_instructions='As directed',
+                strength=f'{self.rng.choice((5, 10, 250, 500))}mg',
+                package_size=self.rng.choice((10, 20, 30)),
+                price=Decimal(self.rng.randrange(20, 2000, 5)),
+                stock_quantity=self.rng.randint(0, 500),
+            )
+            for i in range(self.volumes['medicines'])
+        ])
+        self.equipment = self.bulk(Equipment, [
+            Equipment(
+                name=f'Load Equipment {i}',
+                slug=f'{PREFIX}-equipment-{i}',
+                price_per_day=Decimal(self.rng.randrange(100, 1500, 50)),
+                rent_price_daily=Decimal(self.rng.randrange(100, 1500, 50)),
+                security_deposit=Decimal('2000.00'),
+                purchase_price=Decimal(self.rng.randrange(5000, 90000, 500)),
+                total_units=20,
+                available_units=self.rng.randint(0, 20),
+            )
+            for i in range(self.volumes['equipment'])
+        ])
+
+    def create_users(self):
+        self.stdout.write('Creating users...')
+        # Hashing is deliberately slow; every generated account shares one hash
+        password = make_password('loadtest')
+        self.patients = self.bulk(User, [
+            User(
+                username=f'{PREFIX}_patient_{i}',
+                email=f'{PREFIX}_patient_{i}@example.com',
+                password=password,
+                role='patient',
+                first_name='Patient',
+                last_name=str(i),
+                phone_number=f'98{i:08d}'[:10],
+                address='Kathmandu',
+            )
+            for i in range(self.volumes['patients'])
+        ])
+        self.bulk(PatientProfile, [PatientProfile(user=user) for user in self.patients])
+
+        self.providers = self.bulk(User, [
+            User(
+                username=f'{PREFIX}_provider_{i}',
+                email=f'{PREFIX}_provider_{i}@example.com',
+                password=password,
+                role='provider',
+                first_name='Provider',
+                last_name=str(i),
+            )
+            for i in range(self.volumes['providers'])
+        ])
+        specializations = [code for code, _ in ProviderProfile.SPECIALIZATION_CHOICES]
+        self.bulk(ProviderProfile, [
+            ProviderProfile(
+                user=user,
+                specialization=specializations[i % len(specializations)],
+                license_number=f'{PREFIX.upper()}-{i:06d}',
+                years_of_experience=self.rng.randint(0, 30),
+                rating=Decimal(self.rng.randint(250, 500)) / 100,
+                total_reviews=self.rng.randint(0, 200),
+            )
+            for i, user in enumerate(self.providers)
+        ])
+
+    def create_schedules(self):
+        self.bulk(ProviderSchedule, [
+            ProviderSchedule(provider=provider, day_of_week=day, start_time=time(8, 0), end_time=time(17, 0))
+            for provider in self.providers
+            for day in range(6)
+        ])
+
+    def create_appointments(self):
+        self.stdout.write('Creating appointments...')
+        appointments = []
+        for patient in self.patients:
+            for _ in range(self.volumes['appointments_per_patient']):
+                service = self.rng.choice(self.services)
+                status = self.rng.choice(APPOINTMENT_STATUSES)
+                appointments.append(Appointment(
+                    patient=patient,
+                    provider=None if status == 'pending' else self.rng.choice(self.providers),
+                    service=service,
+                    appointment_date=self.past_or_future(),
+                    appointment_time=self.slot(),
+                    service_address='Kathmandu',
+                    service_price=service.base_price,
+                    total_amount=service.base_price,
+                    status=status,
+                ))
+        appointments = self.bulk(Appointment, appointments)
+
+        # bulk_create skips Appointment.save, so fill the open-request queue here
+        self.bulk(OpenAppointmentRequest, OpenAppointmentRequest.entries_for(appointments))
+
+        payments = []
+        for appointment in appointments:
+            if appointment.status in ('cancelled', 'rejected'):
+                continue
+            paid = appointment.status == 'completed' and self.rng.random() < 0.8
+            payments.append(Payment(
+                appointment=appointment,
+                patient_id=appointment.patient_id,
+                amount=appointment.total_amount,
+                payment_method=self.rng.choice(('cash', 'online')) if paid else None,
+                payment_status='paid' if paid else 'unpaid',
+                source_type='appointment',
+                source_status=appointment.status,
+            ))
+        self.bulk(Payment, payments)
+
+    def create_personal_appointments(self):
+        self.bulk(PersonalAppointment, [
+            PersonalAppointment(
+                patient=patient,
+                provider=self.rng.choice(self.providers),
+                appointment_type=self.rng.choice(('consultation', 'follow_up', 'screening')),
+                appointment_date=self.past_or_future(),
+                appointment_time=self.slot(),
+                reason='Synthetic visit',
+                status=self.rng.choice(PERSONAL_STATUSES),
+                # PersonalAppointment.save normally derives this
+                total_fee=Decimal('500.00'),
+            )
+            for patient in self.patients
+            for _ in range(self.volumes['personal_per_patient'])
+        ])
+
+    def create_pharmacy_orders(self):
+        self.stdout.write('Creating pharmacy orders...')
+        orders, lines = [], []
+        for patient in self.patients:
+            for n in range(self.volumes['orders_per_patient']):
+                picked = self.rng.sample(self.medicines, self.rng.randint(1, 4))
+                items = [(medicine, self.rng.randint(1, 3)) for medicine in picked]
+                subtotal = sum((m.price * q for m, q in items), Decimal('0.00'))
+                status = self.rng.choice(ORDER_STATUSES)
+                orders.append(PharmacyOrder(
+                    customer=patient,
+                    order_number=f'{PREFIX.upper()}{patient.id:07d}{n:02d}',
+                    delivery_address='Kathmandu',
+                    delivery_phone=patient.phone_number or '9800000000',
+                    subtotal=subtotal,
+                    total_amount=subtotal + Decimal('100.00'),
+                    status=status,
+                ))
+                lines.append(items)
+        orders = self.bulk(PharmacyOrder, orders)
+
+        self.bulk(PharmacyOrderItem, [
+            PharmacyOrderItem(order=order, medicine=medicine, quantity=qty, unit_price=medicine.price,
+                              total_price=medicine.price * qty)
+            for order, items in zip(orders, lines)
+            for medicine, qty in items
+        ])
+        self.bulk(PharmacyOrderActivity, [
+            PharmacyOrderActivity(order=order, activity_type='placed', title='Order placed',
+                                  message='Your order has been placed successfully.')
+            for order in orders
+        ])
+        self.bulk(Payment, [
+            Payment(
+                pharmacy_order=order,
+                patient_id=order.customer_id,
+                amount=order.total_amount,
+                payment_method='cash' if order.status == 'delivered' else None,
+                payment_status='paid' if order.status == 'delivered' else 'unpaid',
+                source_type='pharmacy_order',
+                source_status=order.status,
+            )
+            for order in orders
+            if order.status != 'cancelled'
+        ])
+
+    def create_rentals(self):
+        self.stdout.write('Creating rentals...')
+        rentals = []
+        for patient in self.patients:
+            for n in range(self.volumes['rentals_per_patient']):
+                equipment = self.rng.choice(self.equipment)
+                start = self.past_or_future(past_days=120, future_days=14)
+                days = self.rng.randint(3, 30)
+                price = equipment.rent_price_daily * days
+                status = self.rng.choice(RENTAL_STATUSES)
+                rentals.append(EquipmentRental(
+                    rental_number=f'{PREFIX.upper()}R{patient.id:07d}{n:02d}',
+                    customer=patient,
+                    equipment=equipment,
+                    rental_period='daily',
+                    start_date=start,
+                    end_date=start + timedelta(days=days),
+                    rental_price=price,
+                    security_deposit=equipment.security_deposit,
+                    total_amount=price + equipment.security_deposit,
+                    delivery_address='Kathmandu',
+                    delivery_phone=patient.phone_number or '9800000000',
+                    status=status,
+                    actual_return_date=start + timedelta(days=days) if status == 'returned' else None,
+                ))
+        rentals = self.bulk(EquipmentRental, rentals)
+        self.bulk(Payment, [
+            Payment(
+                equipment_rental=rental,
+                patient_id=rental.customer_id,
+                amount=rental.total_amount,
+                payment_status='paid' if rental.status == 'returned' else 'unpaid',
+                source_type='equipment_rental',
+                source_status=rental.status,
+            )
+            for rental in rentals
+            if rental.status != 'cancelled'
+        ])
+
+    def create_notifications(self):
+        types = ['appointment_booked', 'appointment_reminder', 'payment_pending', 'order_placed', 'rental_due']
+        self.bulk(Notification, [
+            Notification(
+                user=patient,
+                notification_type=self.rng.choice(types),
+                title='Synthetic notification',
+                message='Generated for load testing.',
+                is_read=self.rng.random() < 0.7,
+            )
+            for patient in self.patients
+            for _ in range(self.volumes['notifications_per_patient'])
+        ])
+
+    def update_balances(self):
+        # Outstanding appointment charges, as the booking flow would have accrued them
+        balances = {}
+        for patient_id, amount in Payment.objects.filter(
+            patient__username__startswith=f'{PREFIX}_', appointment__isnull=False, payment_status='unpaid'
+        ).values_list('patient_id', 'amount'):
+            balances[patient_id] = balances.get(patient_id, Decimal('0.00')) + amount
+        profiles = list(PatientProfile.objects.filter(user_id__in=list(balances)))
+        for profile in profiles:
+            profile.total_balance = balances[profile.user_id]
+        PatientProfile.objects.bulk_update(profiles, ['total_balance'], batch_size=self.batch_size)
@@ -0,0 +1,219 @@
+import json
+import os
+import statistics
+import subprocess
+from contextlib import contextmanager
+from datetime import timedelta
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.accounts.models import User
+from apps.appointments.models import Appointment
+from apps.payments.models import Payment
+from apps.pharmacy.models import Medicine, PharmacyOrder
+from utils.query_budget import QueryRecorder
+
+
+class Rollback(Exception):
+    pass
+
+
+@contextmanager
+def rolled_back():
+    """Run a block in a transaction that is always rolled back."""
+    try:
+        with transaction.atomic():
+            yield
+            raise Rollback
+    except Rollback:
+        pass
+
+
+class Command(BaseCommand):
+    help = 'Time key views and services and write comparable JSON results'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=10, help='Timed runs per benchmark')
+        parser.add_argument('--warmup', type=int, default=1, help='Untimed runs before timing')
+        parser.add_argument('--only', nargs='*', default=None, help='Run only these benchmark names')
+        parser.add_argument(
+            '--output', default=None,
+            help='Results file (default: benchmarks/results-<timestamp>.json)'
+        )
+        parser.add_argument('--compare', default=None, help='Previous results file to compare against')
+
+    def handle(self, *args, **options):
+        self.load_actors()
+
+        benchmarks = self.benchmarks()
+        if options['only']:
+            unknown = set(options['only']) - set(benchmarks)
+            if unknown:
+                raise CommandError(f"Unknown benchmark(s): {', '.join(sorted(unknown))}")
+            benchmarks = {name: benchmarks[name] for name in options['only']}
+
+        results = {}
+        for name, fn in benchmarks.items():
+            results[name] = self.measure(fn, options['iterations'], options['warmup'])
+            result = results[name]
+            if 'error' in result:
+                self.stdout.write(self.style.ERROR(f"{name:<28} error: {result['error']}"))
+            else:
+                self.stdout.write(
+                    f"{name:<28} median {result['median_ms']:>9.2f} ms  "
+                    f"p95 {result['p95_ms']:>9.2f} ms  queries {result['queries']}"
+                )
+
+        report = {'meta': self.meta(options), 'results': results}
+        output = options['output'] or os.path.join(
+            'benchmarks', f"results-{timezone.now():%Y%m%d-%H%M%S}.json"
+        )
+        os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+        with open(output, 'w') as fh:
+            json.dump(report, fh, indent=2, sort_keys=True)
+        self.stdout.write(self.style.SUCCESS(f'Results written to {output}'))
+
+        if options['compare']:
+            self.compare(options['compare'], results)
+
+    # Measurement ---------------------------------------------------------------
+
+    def measure(self, fn, iterations, warmup):
+        timings, queries = [], []
+        try:
+            for _ in range(warmup):
+                fn()
+            for _ in range(iterations):
+                with QueryRecorder() as recorder:
+                    started = perf_counter()
+                    fn()
+                    timings.append((perf_counter() - started) * 1000)
+                queries.append(recorder.count)
+        except Exception as exc:
+            return {'error': f'{type(exc).__name__}: {exc}'}
+
+        ordered = sorted(timings)
+        return {
+            'iterations': iterations,
+            'min_ms': round(ordered[0], 3),
+            'median_ms': round(statistics.median(ordered), 3),
+            'mean_ms': round(statistics.fmean(ordered), 3),
+            'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+            'max_ms': round(ordered[-1], 3),
+            'queries': int(statistics.median(queries)),
+        }
+
+    def meta(self, options):
+        try:
+            revision = subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            revision = None
+        return {
+            'timestamp': timezone.now().isoformat(),
+            'revision': revision,
+            'iterations': options['iterations'],
+            'rows': {
+                'users': User.objects.count(),
+                'appointments': Appointment.objects.count(),
+                'pharmacy_orders': PharmacyOrder.objects.count(),
+                'payments': Payment.objects.count(),
+            },
+        }
+
+    def compare(self, path, results):
+        with open(path) as fh:
+            previous = json.load(fh)['results']
+        self.stdout.write(f'\nCompared with {path} (median):')
+        for name, result in results.items():
+            before = previous.get(name, {})
+            if 'median_ms' not in result or 'median_ms' not in before:
+                continue
+            change = (result['median_ms'] - before['median_ms']) / before['median_ms'] * 100 if before['median_ms'] else 0
+            line = (
+                f"{name:<28} {before['median_ms']:>9.2f} -> {result['median_ms']:>9.2f} ms ({change:+.1f}%)  "
+                f"queries {before['queries']} -> {result['queries']}"
+            )
+            self.stdout.write(self.style.WARNING(line) if change > 10 else line)
+
+    # Benchmarks ----------------------------------------------------------------
+
+    def load_actors(self):
+        """Pick the users the benchmarks run as (generate_load_data's, if present)."""
+        self.patient = (
+            User.objects.filter(username__startswith='load_patient_').order_by('id').first()
+            or User.objects.filter(role='patient').order_by('id').first()
+        )
+        self.provider = (
+            User.objects.filter(username__startswith='load_provider_').order_by('id').first()
+            or User.objects.filter(role='provider').order_by('id').first()
+        )
+        self.admin = User.objects.filter(is_staff=True).order_by('id').first()
+        if not self.patient or not self.provider:
+            raise CommandError('No patients/providers found. Run generate_load_data first.')
+
+    def client_for(self, user):
+        client = Client(raise_request_exception=True)
+        if user:
+            client.force_login(user)
+        return client
+
+    def get(self, user, url):
+        client = self.client_for(user)
+
+        def run():
+            response = client.get(url)
+            if response.status_code >= 400:
+                raise RuntimeError(f'GET {url} returned {response.status_code}')
+        return run
+
+    def benchmarks(self):
+        from apps.appointments.services import ProviderAssignmentService
+        from apps.equipment.services import RentalLifecycleService
+
+        slot_date = timezone.localdate() + timedelta(days=1)
+        benchmarks = {
+            'dashboard.patient': self.get(self.patient, reverse('dashboard:patient')),
+            'dashboard.provider': self.get(self.provider, reverse('dashboard:provider')),
+            'dashboard.patient_balance': self.get(self.patient, reverse('dashboard:patient_balance')),
+            'catalog.services_search': self.get(None, reverse('services:list') + '?search=care'),
+            'catalog.pharmacy_search': self.get(None, reverse('pharmacy:list') + '?search=medicine'),
+            'catalog.equipment_search': self.get(None, reverse('equipment:list') + '?search=equipment'),
+            'slots.available': self.get(
+                self.patient,
+                reverse('appointments:get_available_slots', args=[self.provider.id, slot_date.isoformat()]),
+            ),
+            'orders.my_orders': self.get(self.patient, reverse('pharmacy:my_orders')),
+            'payments.history': self.get(self.patient, reverse('payments:history')),
+            'pharmacy.checkout': self.checkout,
+            'service.assign_providers': lambda: ProviderAssignmentService.run(dry_run=True),
+            'service.sweep_rentals': lambda: RentalLifecycleService.sweep(dry_run=True),
+        }
+        if self.admin:
+            benchmarks['dashboard.admin'] = self.get(self.admin, reverse('dashboard:admin'))
+        return benchmarks
+
+    def checkout(self):
+        """Place a three-item order from a fresh cart; rolled back afterwards."""
+        from apps.pharmacy.models import Cart, CartItem
+
+        client = self.client_for(self.patient)
+        with rolled_back():
+            cart, _ = Cart.objects.get_or_create(user=self.patient, cart_type='pharmacy')
+            for medicine in Medicine.objects.filter(is_active=True, stock_quantity__gte=5)[:3]:
+                CartItem.objects.create(
+                    cart=cart, item_type='medicine', medicine=medicine, quantity=1,
+                    unit_price=medicine.price, total_price=medicine.price,
+                )
+            response = client.post(reverse('pharmacy:checkout'), {
+                'delivery_address': 'Kathmandu',
+                'delivery_phone': '9800000000',
+            })
+            if response.status_code != 302:
+                raise RuntimeError(f'checkout returned {response.status_code}')
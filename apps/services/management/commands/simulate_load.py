@@ -0,0 +1,241 @@
+import random
+import statistics
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import time, timedelta
+from time import perf_counter
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Count, Sum
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.accounts.models import User
+from apps.appointments.models import Appointment, PersonalAppointment
+from apps.payments.models import Payment
+from apps.pharmacy.models import Medicine, PharmacyOrderItem
+from apps.services.models import Service
+
+
+FLOWS = ('book', 'personal', 'checkout', 'proof')
+
+
+class SimulatedClient:
+    """
+    One simulated patient driving the booking and checkout flows through
+    the full request stack with Django's test Client. Every client aims at
+    the same provider slots and the same medicine so requests contend.
+    """
+
+    def __init__(self, plan, patient_id, seed):
+        self.plan = plan
+        self.patient_id = patient_id
+        self.rng = random.Random(seed)
+        self.client = Client()
+        self.client.force_login(User.objects.get(pk=patient_id))
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def request(self, flow, method, url, data=None):
+        started = perf_counter()
+        try:
+            response = getattr(self.client, method)(url, data or {})
+        except Exception:
+            self.errors[flow] += 1
+            return None
+        finally:
+            self.samples[flow].append(perf_counter() - started)
+        if response.status_code >= 500:
+            self.errors[flow] += 1
+        return response
+
+    def book(self):
+        service_id = self.rng.choice(self.plan['service_ids'])
+        self.request('book', 'post', reverse('appointments:book', args=[service_id]), {
+            'appointment_date': self.plan['slot_date'],
+            'appointment_time': self.rng.choice(self.plan['slot_times']),
+            'duration_hours': '1.0',
+            'service_address': 'Kathmandu',
+            'additional_charges': '0',
+        })
+
+    def personal(self):
+        self.request('personal', 'post', reverse('appointments:book_personal_appointment', args=[self.plan['provider_id']]), {
+            'appointment_type': 'consultation',
+            'appointment_date': self.plan['slot_date'],
+            'appointment_time': self.rng.choice(self.plan['slot_times']),
+            'duration_minutes': '30',
+            'location_type': 'home',
+            'location_address': 'Kathmandu',
+            'reason': 'Load test',
+            'additional_charges': '0',
+        })
+
+    def checkout(self):
+        self.request('add_to_cart', 'post', reverse('pharmacy:add_to_cart', args=[self.plan['medicine_id']]), {
+            'quantity': '1',
+        })
+        self.request('checkout', 'post', reverse('pharmacy:checkout'), {
+            'delivery_address': 'Kathmandu',
+            'delivery_phone': '9800000000',
+        })
+
+    def proof(self):
+        payment_id = Payment.objects.filter(
+            patient_id=self.patient_id, payment_status='unpaid', payment_method__isnull=True
+        ).values_list('id', flat=True).first()
+        if payment_id is None:
+            return
+        self.request('proof', 'post', reverse('payments:upload_proof', args=[payment_id]), {
+            'transaction_id': f'LOAD{self.rng.randrange(10**9)}',
+        })
+
+    def run(self, iterations, flows):
+        for _ in range(iterations):
+            for flow in flows:
+                getattr(self, flow)()
+        return dict(self.samples), dict(self.errors)
+
+
+def run_client(plan, patient_id, seed, iterations, flows):
+    try:
+        return SimulatedClient(plan, patient_id, seed).run(iterations, flows)
+    finally:
+        connections.close_all()
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class Command(BaseCommand):
+    help = 'Drive concurrent booking/checkout traffic and report latency and integrity violations'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=8, help='Concurrent simulated patients')
+        parser.add_argument('--iterations', type=int, default=5, help='Rounds of flows per client')
+        parser.add_argument('--mode', choices=['thread', 'process'], default='thread', help='Worker pool type')
+        parser.add_argument(
+            '--flows', nargs='*', choices=FLOWS, default=list(FLOWS), help='Flows each client runs per round'
+        )
+        parser.add_argument('--stock', type=int, default=10, help='Units of the contended medicine to start with')
+        parser.add_argument('--slots', type=int, default=3, help='Number of contended appointment slots')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        patients = list(
+            User.objects.filter(username__startswith='load_patient_', is_active=True)
+            .order_by('id').values_list('id', flat=True)[:options['clients']]
+        )
+        provider = User.objects.filter(username__startswith='load_provider_').order_by('id').first()
+        medicine = Medicine.objects.filter(slug__startswith='load-', is_active=True).order_by('id').first()
+        service_ids = list(Service.objects.filter(slug__startswith='load-', is_active=True).values_list('id', flat=True))
+        if len(patients) < options['clients'] or not provider or not medicine or not service_ids:
+            raise CommandError('Not enough load data. Run generate_load_data first.')
+
+        # Contended resources: a few slots a week out and one medicine with little stock
+        medicine.stock_quantity = options['stock']
+        medicine.save(update_fields=['stock_quantity'])
+        slot_date = timezone.localdate() + timedelta(days=7)
+        plan = {
+            'provider_id': provider.id,
+            'medicine_id': medicine.id,
+            'service_ids': service_ids,
+            'slot_date': slot_date.isoformat(),
+            'slot_times': [time(9 + i // 2, 30 * (i % 2)).strftime('%H:%M') for i in range(options['slots'])],
+        }
+        marks = {
+            'appointment': Appointment.objects.order_by('-id').values_list('id', flat=True).first() or 0,
+            'personal': PersonalAppointment.objects.order_by('-id').values_list('id', flat=True).first() or 0,
+            'order_item': PharmacyOrderItem.objects.order_by('-id').values_list('id', flat=True).first() or 0,
+        }
+
+        self.stdout.write(
+            f"Running {options['clients']} {options['mode']} clients x {options['iterations']} rounds "
+            f"({', '.join(options['flows'])})..."
+        )
+        connections.close_all()
+        if options['mode'] == 'thread':
+            pool = ThreadPoolExecutor(max_workers=options['clients'])
+        else:
+            # Under spawn (the default on macOS and Windows) each worker is a
+            # fresh interpreter that only inherits DJANGO_SETTINGS_MODULE, so
+            # it sets Django up before unpickling its first task. Under fork
+            # the setup is already done and this returns straight away.
+            pool = ProcessPoolExecutor(max_workers=options['clients'], initializer=django.setup)
+        started = perf_counter()
+        with pool:
+            futures = [
+                pool.submit(run_client, plan, patient_id, options['seed'] + i, options['iterations'], options['flows'])
+                for i, patient_id in enumerate(patients)
+            ]
+            results = [future.result() for future in futures]
+        elapsed = perf_counter() - started
+
+        samples, errors = defaultdict(list), defaultdict(int)
+        for client_samples, client_errors in results:
+            for flow, values in client_samples.items():
+                samples[flow].extend(values)
+            for flow, count in client_errors.items():
+                errors[flow] += count
+
+        total = sum(len(values) for values in samples.values())
+        self.stdout.write(f'\n{total} requests in {elapsed:.2f}s = {total / elapsed:.1f} req/s\n')
+        self.stdout.write(f"{'flow':<12}{'requests':>9}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for flow, values in sorted(samples.items()):
+            ordered = sorted(values)
+            self.stdout.write(
+                f"{flow:<12}{len(ordered):>9}{errors[flow]:>8}"
+                f"{statistics.median(ordered) * 1000:>10.1f}"
+                f"{percentile(ordered, 0.95) * 1000:>10.1f}"
+                f"{percentile(ordered, 0.99) * 1000:>10.1f}"
+            )
+
+        violations = self.check_integrity(plan, marks, options['stock'], provider)
+        self.stdout.write('')
+        if violations:
+            for line in violations:
+                self.stdout.write(self.style.ERROR(f'VIOLATION: {line}'))
+        else:
+            self.stdout.write(self.style.SUCCESS('No integrity violations detected'))
+
+    def check_integrity(self, plan, marks, initial_stock, provider):
+        violations = []
+
+        sold = PharmacyOrderItem.objects.filter(
+            id__gt=marks['order_item'], medicine_id=plan['medicine_id']
+        ).exclude(order__status='cancelled').aggregate(total=Sum('quantity'))['total'] or 0
+        remaining = Medicine.objects.get(pk=plan['medicine_id']).stock_quantity
+        self.stdout.write(
+            f"\nCreated {Appointment.objects.filter(id__gt=marks['appointment']).count()} service bookings, "
+            f"{PersonalAppointment.objects.filter(id__gt=marks['personal']).count()} personal bookings; "
+            f"sold {sold} of {initial_stock} contended units, {remaining} left"
+        )
+        if sold > initial_stock:
+            violations.append(f'oversold stock: {sold} units sold from {initial_stock}')
+        if initial_stock - sold != remaining:
+            violations.append(
+                f'stock drift: {initial_stock} - {sold} sold should leave {initial_stock - sold}, found {remaining}'
+            )
+
+        duplicate_slots = PersonalAppointment.objects.filter(
+            id__gt=marks['personal'], provider=provider, status__in=['pending', 'confirmed'],
+        ).values('appointment_date', 'appointment_time').annotate(n=Count('id')).filter(n__gt=1)
+        for slot in duplicate_slots:
+            violations.append(
+                f"duplicate slot: {slot['n']} bookings for provider {provider.id} at "
+                f"{slot['appointment_date']} {slot['appointment_time']}"
+            )
+
+        duplicate_bookings = Appointment.objects.filter(
+            id__gt=marks['appointment'], status__in=['pending', 'confirmed', 'in_progress'],
+        ).values('patient_id', 'service_id').annotate(n=Count('id')).filter(n__gt=1)
+        for booking in duplicate_bookings:
+            violations.append(
+                f"duplicate booking: patient {booking['patient_id']} holds {booking['n']} active "
+                f"bookings for service {booking['service_id']}"
+            )
+        return violations
@@ -0,0 +1,51 @@
+# Generated by Django 4.2.7 on 2026-10-19 14:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+SPECIALIZATIONS = (
+    ('nursing', 'Skilled Nursing'),
+    ('physiotherapy', 'Physiotherapy'),
+    ('geriatric', 'Elderly & Geriatric Care'),
+    ('respiratory', 'Respiratory Care'),
+    ('wound_care', 'Wound Care'),
+    ('general', 'General Care'),
+)
+
+
+def seed_mappings(apps, schema_editor):
+    """Seed mappings using the previous dashboard rule: a category matches a
+    specialization when its name contains the specialization display name."""
+    ServiceCategory = apps.get_model('services', 'ServiceCategory')
+    SpecializationCategory = apps.get_model('services', 'SpecializationCategory')
+    mappings = []
+    for code, label in SPECIALIZATIONS:
+        for category in ServiceCategory.objects.filter(name__icontains=label):
+            mappings.append(SpecializationCategory(specialization=code, category=category))
+    SpecializationCategory.objects.bulk_create(mappings, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0004_service_price_max_service_price_min'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpecializationCategory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('specialization', models.CharField(choices=[('nursing', 'Skilled Nursing'), ('physiotherapy', 'Physiotherapy'), ('geriatric', 'Elderly & Geriatric Care'), ('respiratory', 'Respiratory Care'), ('wound_care', 'Wound Care'), ('general', 'General Care')], db_index=True, max_length=50)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='specializations', to='services.servicecategory')),
+            ],
+            options={
+                'verbose_name_plural': 'Specialization Categories',
+                'db_table': 'specialization_categories',
+                'indexes': [models.Index(fields=['category', 'specialization'], name='specializat_categor_0f94a3_idx')],
+                'unique_together': {('specialization', 'category')},
+            },
+        ),
+        migrations.RunPython(seed_mappings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+from django.core.management import call_command
+from django.db import migrations
+
+
+TABLE = 'idempotency_keys'
+
+
+def create_table(apps, schema_editor):
+    """The DatabaseCache table config.idempotency uses with IDEMPOTENCY_BACKEND=db,
+    created here so `migrate` is all a deploy needs."""
+    call_command('createcachetable', TABLE, database=schema_editor.connection.alias, verbosity=0)
+
+
+def drop_table(apps, schema_editor):
+    schema_editor.execute(f'DROP TABLE IF EXISTS {schema_editor.quote_name(TABLE)}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('services', '0005_specializationcategory'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_table, drop_table),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from django.core.validators import MinValueValidator
 from decimal import Decimal
+from apps.accounts.models import ProviderProfile
 
 class ServiceCategory(models.Model):
     """
@@ -30,6 +31,30 @@ class ServiceCategory(models.Model):
         super().save(*args, **kwargs)
 
 
+class SpecializationCategory(models.Model):
+    """
+    Maps a provider specialization to the service categories it covers.
+    Used to route pending service requests to matching providers.
+    """
+    specialization = models.CharField(
+        max_length=50,
+        choices=ProviderProfile.SPECIALIZATION_CHOICES,
+        db_index=True
+    )
+    category = models.ForeignKey(ServiceCategory, on_delete=models.CASCADE, related_name='specializations')
+
+    class Meta:
+        db_table = 'specialization_categories'
+        verbose_name_plural = 'Specialization Categories'
+        unique_together = ('specialization', 'category')
+        indexes = [
+            models.Index(fields=['category', 'specialization']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_specialization_display()} -> {self.category.name}"
+
+
 class Service(models.Model):
     """
     Healthcare services offered by UH Care
@@ -0,0 +1,35 @@
+from django.db.utils import ConnectionHandler
+
+from config.database import postgres_config, sqlite_config
+
+
+def test_sqlite_connections_apply_pragmas(tmp_path, django_db_blocker):
+    handler = ConnectionHandler({'default': sqlite_config(str(tmp_path / 'db.sqlite3'), busy_timeout_ms=1234)})
+    connection = handler['default']
+    try:
+        with django_db_blocker.unblock(), connection.cursor() as cursor:
+            pragmas = {}
+            for name in ('journal_mode', 'synchronous', 'busy_timeout', 'temp_store'):
+                cursor.execute(f'PRAGMA {name}')
+                pragmas[name] = cursor.fetchone()[0]
+    finally:
+        connection.close()
+
+    # synchronous NORMAL = 1, temp_store MEMORY = 2
+    assert pragmas == {'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 1234, 'temp_store': 2}
+
+
+def test_postgres_config_persistent_with_health_checks(monkeypatch):
+    monkeypatch.delenv('DB_CONN_MAX_AGE', raising=False)
+    config = postgres_config('postgres://user:secret@db:5432/uhcare', pooler='')
+
+    assert config['CONN_MAX_AGE'] == 600
+    assert config['CONN_HEALTH_CHECKS'] is True
+    assert config['OPTIONS']['connect_timeout'] == 5
+    assert not config.get('DISABLE_SERVER_SIDE_CURSORS')
+
+
+def test_postgres_config_behind_pgbouncer_disables_server_side_cursors():
+    config = postgres_config('postgres://user:secret@db:6432/uhcare', pooler='pgbouncer')
+
+    assert config['DISABLE_SERVER_SIDE_CURSORS'] is True
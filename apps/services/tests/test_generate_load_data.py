@@ -0,0 +1,35 @@
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.db.models import Sum
+from django.test import TestCase
+
+from apps.accounts.models import PatientProfile, User
+from apps.appointments.models import Appointment, OpenAppointmentRequest
+from apps.payments.models import Payment
+from apps.pharmacy.models import PharmacyOrder
+
+
+class GenerateLoadDataTestCase(TestCase):
+    def generate(self, *args):
+        call_command('generate_load_data', '--scale', '0.01', *args, stdout=StringIO())
+
+    def test_generates_consistent_data(self):
+        self.generate()
+
+        self.assertEqual(User.objects.filter(role='patient', username__startswith='load_').count(), 10)
+        self.assertEqual(Appointment.objects.count(), 100)
+        self.assertEqual(PharmacyOrder.objects.count(), 30)
+        # bulk_create bypasses save(), so the queue and balances are filled explicitly
+        open_ids = set(Appointment.objects.filter(status='pending', provider__isnull=True).values_list('id', flat=True))
+        self.assertEqual(set(OpenAppointmentRequest.objects.values_list('appointment_id', flat=True)), open_ids)
+        owed = Payment.objects.filter(appointment__isnull=False, payment_status='unpaid').aggregate(t=Sum('amount'))['t']
+        self.assertEqual(PatientProfile.objects.aggregate(t=Sum('total_balance'))['t'], owed or Decimal('0.00'))
+
+    def test_flush_replaces_previous_run(self):
+        self.generate()
+        self.generate('--flush')
+
+        self.assertEqual(User.objects.filter(username__startswith='load_').count(), 11)
+        self.assertEqual(Appointment.objects.count(), 100)
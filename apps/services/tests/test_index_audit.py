@@ -0,0 +1,91 @@
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from apps.accounts.models import User
+from apps.equipment.models import EquipmentRental
+from utils.index_audit import CapturedQuery, IndexAudit, QueryCapture, index_columns
+
+
+class IndexAuditTests(TestCase):
+    def setUp(self):
+        self.patient = User.objects.create_user(username='patient', password='pw', role='patient')
+
+    def audit(self, queryset, baseline=()):
+        with QueryCapture() as capture:
+            capture.label = 'test'
+            list(queryset)
+        return IndexAudit(capture.queries, baseline_indexes=baseline).run()
+
+    def test_before_and_after_plans_for_shipped_index(self):
+        [finding] = self.audit(
+            EquipmentRental.objects.filter(customer=self.patient).order_by('-created_at')[:5],
+            baseline=['equipment_rental_customer_idx'],
+        )
+
+        self.assertTrue(finding.improved)
+        self.assertTrue(finding.before_sorts)
+        self.assertFalse(finding.flagged)
+        self.assertIn('equipment_rental_customer_idx', ' '.join(finding.plan))
+        # The DROP INDEX was rolled back
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, 'equipment_rentals')
+        self.assertIn('equipment_rental_customer_idx', constraints)
+
+    def test_full_scan_gets_a_proposal(self):
+        [finding] = self.audit(EquipmentRental.objects.filter(delivery_phone='9800000000').order_by('created_at'))
+
+        self.assertEqual(finding.scans, ['equipment_rentals'])
+        self.assertEqual(finding.proposals, [('equipment_rentals', ['delivery_phone', 'created_at'])])
+
+    def test_index_columns_put_equality_before_range(self):
+        sql = (
+            'SELECT "t"."id" FROM "t" WHERE ("t"."created_at" >= %s AND "t"."customer_id" = %s '
+            'AND "t"."status" IN (%s, %s)) ORDER BY "t"."created_at" DESC'
+        )
+
+        self.assertEqual(index_columns(sql, 't'), ['customer_id', 'status', 'created_at'])
+
+    def test_command_writes_report(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, 'audit.md')
+            out = StringIO()
+            call_command('audit_indexes', '--source', 'hot', '--output', output, stdout=out)
+            with open(output) as fh:
+                report = fh.read()
+
+        self.assertIn('Report written to', out.getvalue())
+        self.assertIn('appointments.unassigned_queue', report)
+        self.assertIn('appointments_unassigned_idx', report)
+        self.assertIn('Before:', report)
+
+    def test_failed_before_explain_skips_only_that_statement(self):
+        with QueryCapture() as capture:
+            capture.label = 'test'
+            list(EquipmentRental.objects.filter(customer=self.patient).order_by('-created_at')[:5])
+        broken = CapturedQuery('SELECT * FROM "no_such_table"', (), 'broken', 'default')
+        audit = IndexAudit(capture.queries + [broken], baseline_indexes=['equipment_rental_customer_idx'])
+
+        findings = {finding.query.fingerprint: finding for finding in audit.run()}
+
+        self.assertIsNone(findings['broken'].before)
+        self.assertIn('EXPLAIN failed', findings['broken'].plan[0])
+        [good] = [finding for key, finding in findings.items() if key != 'broken']
+        self.assertTrue(good.improved)
+
+    @override_settings(DEBUG=False, LOAD_TEST_DATABASE=False)
+    def test_baseline_refused_on_a_live_database(self):
+        with mock.patch.dict(connection.settings_dict, {'NAME': 'uhcare'}):
+            with self.assertRaisesMessage(CommandError, '--baseline drops indexes'):
+                call_command('audit_indexes', '--source', 'hot', stdout=StringIO())
+
+            with override_settings(LOAD_TEST_DATABASE=True), tempfile.TemporaryDirectory() as tmp:
+                out = StringIO()
+                call_command('audit_indexes', '--source', 'hot', '--output', os.path.join(tmp, 'a.md'), stdout=out)
+        self.assertIn('Report written to', out.getvalue())
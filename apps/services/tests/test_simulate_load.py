@@ -0,0 +1,36 @@
+from io import StringIO
+from unittest import mock
+
+from django import forms
+from django.core.management import call_command
+from django.test import TransactionTestCase
+
+from apps.appointments.forms import PersonalAppointmentForm
+
+
+class SimulateLoadTestCase(TransactionTestCase):
+    # Worker threads use their own connections, so the data must be committed
+    def setUp(self):
+        call_command('generate_load_data', '--scale', '0.01', stdout=StringIO())
+
+    def simulate(self):
+        out = StringIO()
+        call_command(
+            'simulate_load', '--mode', 'thread', '--clients', '1', '--iterations', '2',
+            '--flows', 'personal', '--slots', '1', stdout=out,
+        )
+        return out.getvalue()
+
+    def test_rebooking_a_taken_slot_is_refused(self):
+        output = self.simulate()
+
+        self.assertIn('1 personal bookings', output)
+        self.assertIn('No integrity violations detected', output)
+
+    def test_reports_duplicate_slot(self):
+        # Without the form's conflict check every round books the same slot
+        with mock.patch.object(PersonalAppointmentForm, 'clean', forms.ModelForm.clean):
+            output = self.simulate()
+
+        self.assertIn('2 personal bookings', output)
+        self.assertIn('VIOLATION: duplicate slot: 2 bookings for provider', output)
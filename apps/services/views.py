@@ -3,10 +3,12 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.db.models import Q
 from django.core.paginator import Paginator
+from config.routers import use_replica
 from .models import Service, ServiceCategory
 from .wishlist import Wishlist
 
 
+@use_replica
 def service_list(request, category_slug=None):
     """
     Display list of available services with filtering and search
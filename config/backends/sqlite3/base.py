@@ -0,0 +1,26 @@
+"""
+SQLite backend that applies connection pragmas.
+
+Django 4.2's SQLite backend has no init_command, so concurrent writers
+(several gunicorn workers, Celery) fall back to SQLite's defaults: a
+rollback journal that blocks readers during writes and a 5 second lock
+wait. This backend runs the PRAGMAs listed in OPTIONS['pragmas'] on every
+new connection; config.database sets WAL, synchronous=NORMAL and a busy
+timeout by default.
+"""
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        # Not a sqlite3.connect() argument; consumed in get_new_connection
+        params.pop('pragmas', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        pragmas = self.settings_dict['OPTIONS'].get('pragmas') or {}
+        for name, value in pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
@@ -32,11 +32,11 @@ def user_context(request):
                 status='pending'
             ).count()
         elif getattr(request.user, 'role', None) == 'provider':
-            from apps.appointments.models import Appointment
-            context['pending_requests_count'] = Appointment.objects.filter(
-                status='pending',
-                provider__isnull=True
-            ).count()
+            from apps.appointments.models import OpenAppointmentRequest
+            specialization = getattr(getattr(request.user, 'provider_profile', None), 'specialization', None)
+            context['pending_requests_count'] = OpenAppointmentRequest.objects.filter(
+                specialization=specialization
+            ).count() if specialization else 0
     
     return context
 
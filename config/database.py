@@ -0,0 +1,77 @@
+"""
+UH Care - Database configuration
+
+Builds settings.DATABASES['default'] from the environment:
+
+- DATABASE_URL set (Postgres): persistent connections (DB_CONN_MAX_AGE,
+  default 600s) with health checks, so a connection dropped by the server
+  or a restart is replaced instead of failing the next request. With
+  DB_POOLER=pgbouncer (transaction pooling) server-side cursors are
+  disabled, since they don't survive across pooled transactions.
+- Otherwise SQLite, through config.backends.sqlite3 which applies
+  journal_mode=WAL (readers no longer block on a writer),
+  synchronous=NORMAL (safe with WAL, far fewer fsyncs) and a busy timeout
+  so concurrent writers wait for the lock instead of raising "database is
+  locked".
+- DATABASE_REPLICA_URL set as well: a read-only `replica` alias, used by
+  config.routers.ReplicaRouter for views marked @use_replica. Tests treat
+  it as a mirror of `default`.
+"""
+import importlib.util
+import os
+
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 20000,
+    'temp_store': 'MEMORY',
+}
+
+
+def sqlite_config(name, busy_timeout_ms=None, conn_max_age=None):
+    busy_timeout_ms = busy_timeout_ms if busy_timeout_ms is not None else int(
+        os.getenv('DB_SQLITE_BUSY_TIMEOUT_MS', SQLITE_PRAGMAS['busy_timeout'])
+    )
+    return {
+        'ENGINE': 'config.backends.sqlite3',
+        'NAME': name,
+        'CONN_MAX_AGE': conn_max_age if conn_max_age is not None else int(os.getenv('DB_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # sqlite3.connect's own lock wait, in seconds
+            'timeout': busy_timeout_ms / 1000,
+            'pragmas': dict(SQLITE_PRAGMAS, busy_timeout=busy_timeout_ms),
+        },
+    }
+
+
+def postgres_config(url, conn_max_age=None, pooler=None):
+    import dj_database_url
+
+    conn_max_age = conn_max_age if conn_max_age is not None else int(os.getenv('DB_CONN_MAX_AGE', '600'))
+    pooler = pooler if pooler is not None else os.getenv('DB_POOLER', '')
+    config = dj_database_url.parse(url, conn_max_age=conn_max_age, conn_health_checks=True)
+    config.setdefault('OPTIONS', {}).setdefault('connect_timeout', int(os.getenv('DB_CONNECT_TIMEOUT', '5')))
+    if pooler == 'pgbouncer':
+        config['DISABLE_SERVER_SIDE_CURSORS'] = True
+    return config
+
+
+def database_config(base_dir):
+    url = os.getenv('DATABASE_URL')
+    # Without dj-database-url installed, fall back to SQLite as before
+    if url and importlib.util.find_spec('dj_database_url') is not None:
+        return postgres_config(url)
+    return sqlite_config(base_dir / 'db.sqlite3')
+
+
+def replica_config():
+    """The `replica` alias, or None when no replica is configured."""
+    url = os.getenv('DATABASE_REPLICA_URL')
+    # A replica only makes sense next to a Postgres primary
+    if not url or not os.getenv('DATABASE_URL') or importlib.util.find_spec('dj_database_url') is None:
+        return None
+    config = postgres_config(url)
+    config['TEST'] = {'MIRROR': 'default'}
+    return config
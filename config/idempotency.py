@@ -0,0 +1,107 @@
+"""
+UH Care - Idempotent form submissions
+
+Every form rendered with the `idempotency_key` context variable carries a
+one-off token in a hidden field (clients without the form can send an
+Idempotency-Key header instead). Views decorated with @idempotent record,
+per user, view and token, the redirect their POST ended in:
+
+- the first POST claims the token with cache.add() and runs the view;
+- a replay of a finished POST (double-click, mobile retry) gets the
+  original redirect back from one cache lookup, without touching the
+  database or sending notifications again;
+- a replay that arrives while the first is still running waits up to
+  IDEMPOTENCY_WAIT_SECONDS for it to finish, then replays its redirect.
+
+Only redirects are remembered. A POST that re-renders the form (validation
+errors) or raises releases the token, so correcting the form and sending
+it again goes through. Requests without a token are not affected.
+
+Tokens live in the `idempotency` cache (IDEMPOTENCY_BACKEND), a database
+table or Redis shared by every worker: a retry rarely lands on the worker
+that served the first attempt.
+"""
+import hashlib
+import re
+import time
+import uuid
+from functools import wraps
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import caches
+from django.http import HttpResponseRedirect
+from django.utils.connection import ConnectionProxy
+from django.utils.functional import SimpleLazyObject
+
+
+FIELD_NAME = 'idempotency_key'
+HEADER_NAME = 'HTTP_IDEMPOTENCY_KEY'
+PENDING = 'pending'
+
+_VALID_KEY = re.compile(r'^[A-Za-z0-9_\-]{8,128}$')
+
+cache = ConnectionProxy(caches, 'idempotency')
+
+
+def idempotency_key(request):
+    """Context processor: a fresh token for each rendered page's form(s)."""
+    return {FIELD_NAME: SimpleLazyObject(lambda: uuid.uuid4().hex)}
+
+
+def request_key(request):
+    key = request.POST.get(FIELD_NAME) or request.META.get(HEADER_NAME, '')
+    return key if _VALID_KEY.match(key) else None
+
+
+def cache_key(request, scope, key):
+    digest = hashlib.sha256(f'{request.user.pk}:{scope}:{key}'.encode()).hexdigest()
+    return f'idempotency:{digest}'
+
+
+def wait_for(record_key):
+    """Poll for the outcome of an in-flight request: its redirect, None if it released the key, or PENDING."""
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+    while True:
+        record = cache.get(record_key)
+        if record != PENDING:
+            return record
+        if time.monotonic() >= deadline:
+            return PENDING
+        time.sleep(0.1)
+
+
+def idempotent(view):
+    """Replay the original redirect for repeated POSTs carrying the same idempotency key."""
+    scope = f'{view.__module__}.{view.__qualname__}'
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request_key(request) if request.method == 'POST' else None
+        if key is None or not request.user.is_authenticated:
+            return view(request, *args, **kwargs)
+
+        record_key = cache_key(request, scope, key)
+        if not cache.add(record_key, PENDING, settings.IDEMPOTENCY_LOCK_SECONDS):
+            record = wait_for(record_key)
+            if record == PENDING:
+                messages.info(request, 'Your previous submission is still being processed.')
+                return HttpResponseRedirect(request.get_full_path())
+            if record is not None:
+                return HttpResponseRedirect(record)
+            # The first attempt failed and released the key: this one runs
+            if not cache.add(record_key, PENDING, settings.IDEMPOTENCY_LOCK_SECONDS):
+                return HttpResponseRedirect(request.get_full_path())
+
+        try:
+            response = view(request, *args, **kwargs)
+        except BaseException:
+            cache.delete(record_key)
+            raise
+        if response.status_code in (301, 302, 303, 307, 308) and response.has_header('Location'):
+            cache.set(record_key, response['Location'], settings.IDEMPOTENCY_KEY_TTL)
+        else:
+            cache.delete(record_key)
+        return response
+
+    return wrapper
@@ -0,0 +1,207 @@
+"""
+UH Care - Chunked bulk updates for data-fix commands
+
+ChunkedUpdate applies `queryset.update(**values)` in primary-key ranges of
+at most `batch_size` matching rows, committing after each range:
+
+- Each batch is one short transaction, so writers on the same table wait
+  for a batch (milliseconds) rather than for the whole run.
+- Ranges are found by keyset on the primary key, never OFFSET, and stop at
+  the largest id that existed when the run started; rows inserted while it
+  runs are left alone.
+- After each commit the last id is written to a checkpoint file under
+  settings.MAINTENANCE_CHECKPOINT_DIR, so an interrupted run continues
+  where it stopped with --resume. A finished run removes its checkpoint.
+
+Because it goes through update(), Model.save() and the pre/post_save
+signals do not run: use it for column fixes that need neither.
+
+ChunkedUpdateCommand is the management command base: subclasses set
+`checkpoint_name` and implement get_queryset() and get_values().
+"""
+import json
+import os
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+
+class Checkpoint:
+    """Last committed primary key of a named run, kept in a small JSON file."""
+
+    def __init__(self, name, directory=None):
+        directory = directory or settings.MAINTENANCE_CHECKPOINT_DIR
+        self.path = os.path.join(directory, f'{name}.json')
+
+    def load(self):
+        try:
+            with open(self.path) as fh:
+                return json.load(fh)
+        except FileNotFoundError:
+            return None
+
+    def save(self, last_pk, rows):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = f'{self.path}.tmp'
+        with open(tmp, 'w') as fh:
+            json.dump({'last_pk': last_pk, 'rows': rows, 'saved_at': timezone.now().isoformat()}, fh)
+        os.replace(tmp, self.path)
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+@dataclass
+class ChunkedUpdateResult:
+    rows: int = 0
+    batches: int = 0
+    last_pk: object = None
+    elapsed: float = 0.0
+    finished: bool = False
+    resumed_from: object = None
+
+    @property
+    def rate(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+
+class ChunkedUpdate:
+    def __init__(self, queryset, values, *, batch_size=1000, limit=0, checkpoint=None, pause=0.0, progress=None):
+        if batch_size < 1:
+            raise ValueError('batch_size must be at least 1')
+        self.queryset = queryset.order_by()
+        self.values = values
+        self.batch_size = batch_size
+        self.limit = limit
+        self.checkpoint = checkpoint
+        self.pause = pause
+        self.progress = progress
+
+    def next_upper_bound(self, last_pk, size, ceiling):
+        """The primary key of the `size`-th matching row after `last_pk`, capped at `ceiling`."""
+        qs = self.queryset.filter(pk__lte=ceiling)
+        if last_pk is not None:
+            qs = qs.filter(pk__gt=last_pk)
+        bound = qs.order_by('pk').values_list('pk', flat=True)[size - 1:size].first()
+        return ceiling if bound is None else bound
+
+    def run(self, resume=False):
+        result = ChunkedUpdateResult()
+        started = time.perf_counter()
+
+        last_pk = None
+        if resume and self.checkpoint is not None:
+            state = self.checkpoint.load()
+            if state:
+                last_pk = result.resumed_from = state['last_pk']
+
+        remaining = self.queryset if last_pk is None else self.queryset.filter(pk__gt=last_pk)
+        ceiling = remaining.aggregate(ceiling=Max('pk'))['ceiling']
+
+        while ceiling is not None and (last_pk is None or last_pk < ceiling):
+            size = self.batch_size
+            if self.limit:
+                size = min(size, self.limit - result.rows)
+                if size <= 0:
+                    break
+            upper = self.next_upper_bound(last_pk, size, ceiling)
+            batch = self.queryset.filter(pk__lte=upper)
+            if last_pk is not None:
+                batch = batch.filter(pk__gt=last_pk)
+
+            with transaction.atomic():
+                rows = batch.update(**self.values)
+            last_pk = upper
+            result.rows += rows
+            result.batches += 1
+            result.last_pk = last_pk
+            result.elapsed = time.perf_counter() - started
+            if self.checkpoint is not None:
+                self.checkpoint.save(last_pk, result.rows)
+            if self.progress is not None:
+                self.progress(result, rows)
+            if self.pause:
+                time.sleep(self.pause)
+
+        result.elapsed = time.perf_counter() - started
+        result.finished = not self.limit or result.rows < self.limit
+        if result.finished and self.checkpoint is not None:
+            self.checkpoint.clear()
+        return result
+
+
+class ChunkedUpdateCommand(BaseCommand):
+    """
+    Base for data-fix commands built on ChunkedUpdate. Without --apply the
+    command only reports what would change.
+    """
+
+    checkpoint_name = None
+    default_batch_size = 1000
+
+    def add_arguments(self, parser):
+        parser.add_argument('--apply', action='store_true', help='Write the changes (default is a dry run).')
+        parser.add_argument(
+            '--batch-size', type=int, default=self.default_batch_size, help='Rows updated per transaction.'
+        )
+        parser.add_argument('--limit', type=int, default=0, help='Stop after this many rows (0 = no limit).')
+        parser.add_argument('--resume', action='store_true', help='Continue after the last committed batch of a previous run.')
+        parser.add_argument('--pause', type=float, default=0.0, help='Seconds to sleep between batches.')
+
+    def get_queryset(self):
+        raise NotImplementedError
+
+    def get_values(self):
+        raise NotImplementedError
+
+    def describe(self, queryset, total):
+        """Write the dry-run report; `total` rows currently match."""
+        self.stdout.write(self.style.NOTICE(f'{total} row(s) to update.'))
+
+    def report_progress(self, result, rows):
+        self.stdout.write(
+            f'Batch {result.batches}: {rows} row(s) up to id {result.last_pk}; '
+            f'{result.rows} total, {result.rate:.0f} rows/s'
+        )
+
+    def handle(self, *args, **options):
+        if self.checkpoint_name is None:
+            raise CommandError(f'{type(self).__name__} must set checkpoint_name')
+        queryset = self.get_queryset()
+        total = queryset.count()
+        self.describe(queryset, total)
+        if not options['apply']:
+            self.stdout.write(self.style.WARNING('Dry-run complete. No changes made. Rerun with --apply to update these rows.'))
+            return
+        if total == 0:
+            Checkpoint(self.checkpoint_name).clear()
+            return
+
+        try:
+            result = ChunkedUpdate(
+                queryset, self.get_values(),
+                batch_size=options['batch_size'],
+                limit=options['limit'],
+                checkpoint=Checkpoint(self.checkpoint_name),
+                pause=options['pause'],
+                progress=self.report_progress,
+            ).run(resume=options['resume'])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        if result.resumed_from is not None:
+            self.stdout.write(f'Resumed after id {result.resumed_from}.')
+        self.stdout.write(self.style.SUCCESS(
+            f'Updated {result.rows} row(s) in {result.batches} batch(es), '
+            f'{result.elapsed:.2f}s ({result.rate:.0f} rows/s).'
+        ))
+        if not result.finished:
+            self.stdout.write(f'Stopped at the limit; rerun with --resume to continue after id {result.last_pk}.')
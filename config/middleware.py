@@ -12,3 +12,116 @@ class HealthCheckMiddleware:
         
         response = self.get_response(request)
         return response
+
+
+class QueryCountMiddleware:
+    """
+    Records query count, DB time and duplicate-query count for each request.
+
+    With DEBUG on the numbers are returned as X-DB-* response headers; in
+    production they are logged as JSON on the `uhcare.db` logger, at WARNING
+    once a request exceeds its view's budget in config/query_budgets.py (or
+    QUERY_COUNT_WARNING_THRESHOLD for views without one).
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        import json
+        import logging
+        from django.conf import settings
+        from utils.query_budget import QueryRecorder
+
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+
+        summary = recorder.summary()
+        request.query_stats = summary
+        if settings.DEBUG:
+            response['X-DB-Query-Count'] = str(summary['queries'])
+            response['X-DB-Time-Ms'] = str(summary['db_time_ms'])
+            response['X-DB-Duplicate-Queries'] = str(summary['duplicate_queries'])
+        else:
+            match = getattr(request, 'resolver_match', None)
+            payload = dict(
+                summary,
+                path=request.path,
+                method=request.method,
+                view=match.view_name if match else None,
+                status=response.status_code,
+            )
+            from config.query_budgets import QUERY_BUDGETS
+            threshold = QUERY_BUDGETS.get(payload['view'], getattr(settings, 'QUERY_COUNT_WARNING_THRESHOLD', 50))
+            level = logging.WARNING if summary['queries'] > threshold else logging.INFO
+            if level == logging.WARNING:
+                payload['top_duplicates'] = dict(list(recorder.duplicates.items())[:3])
+            logging.getLogger('uhcare.db').log(level, json.dumps(payload), extra={'db_queries': payload})
+        return response
+
+
+class MetricsMiddleware:
+    """
+    Records latency, DB time, template render time and response size per
+    resolved URL name (see utils.metrics). Sits outside QueryCountMiddleware
+    and reads the DB numbers it leaves on the request.
+    """
+    def __init__(self, get_response):
+        from utils import metrics
+        self.get_response = get_response
+        metrics.instrument_templates()
+
+    def __call__(self, request):
+        import time
+        from utils import metrics
+
+        metrics.begin_request()
+        started = time.perf_counter()
+        response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        if response.streaming:
+            size = int(response.get('Content-Length') or 0)
+        else:
+            size = len(response.content)
+        db = getattr(request, 'query_stats', None) or {}
+        metrics.observe_request(
+            view=match.view_name if match and match.view_name else 'unresolved',
+            method=request.method,
+            status=response.status_code,
+            duration=duration,
+            db_time=db.get('db_time_ms', 0) / 1000,
+            db_queries=db.get('queries', 0),
+            template_time=metrics.template_time(),
+            size=size,
+        )
+        return response
+
+
+class ReplicaStickyMiddleware:
+    """
+    Pins a client to the primary database for REPLICA_STICKY_SECONDS after a
+    write request, so replica-served views (config.routers.use_replica)
+    don't show data from before its own change. Tracked in a short-lived
+    cookie so it also covers anonymous clients. No-op without a replica.
+    """
+    cookie_name = 'uhcare_primary'
+    safe_methods = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        from django.conf import settings
+
+        if not getattr(settings, 'DATABASE_REPLICA_ALIAS', None):
+            return self.get_response(request)
+
+        request.pin_primary = self.cookie_name in request.COOKIES
+        response = self.get_response(request)
+        if request.method not in self.safe_methods:
+            response.set_cookie(
+                self.cookie_name, '1', max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True, samesite='Lax', secure=request.is_secure(),
+            )
+        return response
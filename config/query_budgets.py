@@ -0,0 +1,143 @@
+"""
+UH Care - Per-view query budgets
+
+Upper bound on the queries one request to each named URL may run, including
+session and auth lookups. Each number is the count measured against the
+seed data in apps/dashboard/tests/test_query_budgets.py, which enforces
+them; QueryCountMiddleware logs a warning in production when a view goes
+over its budget. Every named URL in config/urls.py must have an entry;
+raise a budget only together with the change that needs it.
+"""
+
+QUERY_BUDGETS = {
+    # Django auth views
+    'login': 0,
+    'logout': 4,
+    'password_change': 7,
+    'password_change_done': 7,
+    'password_reset': 0,
+    'password_reset_done': 0,
+    'password_reset_confirm': 1,
+    'password_reset_complete': 0,
+
+    # Accounts
+    'accounts:home': 3,
+    'accounts:login': 0,
+    'accounts:logout': 4,
+    'accounts:register_patient': 0,
+    'accounts:register_provider': 0,
+    'accounts:profile': 8,
+    'accounts:about': 0,
+    'accounts:contact': 0,
+    'accounts:change_password': 7,
+    'accounts:password_change_done': 7,
+
+    # Services
+    'services:list': 4,
+    'services:list_by_category': 5,
+    'services:add_to_wishlist': 7,
+    'services:remove_from_wishlist': 4,
+    'services:wishlist': 8,
+    'services:detail': 2,
+
+    # Appointments
+    'appointments:book': 23,
+    'appointments:confirmation': 10,
+    'appointments:my_appointments': 8,
+    'appointments:detail': 11,
+    'appointments:cancel': 16,
+    'appointments:provider_pending': 3,
+    'appointments:accept': 9,
+    'appointments:reject': 9,
+    'appointments:complete': 16,
+    'appointments:provider_directory': 9,
+    'appointments:provider_detail': 8,
+    'appointments:book_personal_appointment': 9,
+    'appointments:get_available_slots': 5,
+    'appointments:my_personal_appointments': 3,
+    'appointments:personal_appointment_detail': 10,
+    'appointments:confirm_personal_appointment': 5,
+    'appointments:complete_personal_appointment': 9,
+    'appointments:cancel_personal_appointment': 5,
+    'appointments:add_appointment_review': 10,
+
+    # Dashboards
+    'dashboard:home': 32,
+    'dashboard:patient': 32,
+    'dashboard:patient_balance': 19,
+    'dashboard:provider': 13,
+    'dashboard:provider_schedule': 3,
+    'dashboard:admin': 17,
+
+    # Payments
+    'payments:initiate': 6,
+    'payments:qr_code': 8,
+    'payments:qr_code_image': 3,
+    'payments:detail': 9,
+    'payments:confirm': 10,
+    'payments:upload_proof': 8,
+    'payments:history': 11,
+    'payments:qr_paid': 3,
+    'payments:cash_commitments': 14,
+    'payments:verification_queue': 11,
+    'payments:reconcile': 6,
+
+    # Pharmacy
+    'pharmacy:list': 3,
+    'pharmacy:list_by_category': 4,
+    'pharmacy:detail': 1,
+    'pharmacy:cart': 11,
+    'pharmacy:add_to_cart': 6,
+    'pharmacy:remove_from_cart': 4,
+    'pharmacy:update_cart': 5,
+    'pharmacy:checkout': 15,
+    'pharmacy:order_confirmation': 11,
+    'pharmacy:cancel_order': 14,
+    'pharmacy:my_orders': 10,
+
+    # Equipment
+    'equipment:list': 3,
+    'equipment:list_by_category': 4,
+    'equipment:rent': 8,
+    'equipment:buy': 8,
+    'equipment:my_rentals': 8,
+    'equipment:my_purchases': 8,
+    'equipment:purchase_detail': 10,
+    'equipment:cancel_purchase': 12,
+    'equipment:rental_detail': 4,
+    'equipment:cancel_rental': 9,
+    'equipment:return_rental': 11,
+    'equipment:detail': 1,
+
+    # Notifications
+    'notifications:list': 9,
+    'notifications:mark_read': 5,
+    'notifications:mark_all_read': 3,
+    'notifications:delete': 4,
+    'notifications:preferences': 6,
+    'notifications:unread_count': 3,
+    'notifications:recent': 8,
+
+    # Blog
+    'blog:list': 2,
+    'blog:detail': 2,
+
+    # Site
+    'metrics': 2,
+}
+
+
+def named_urls(patterns=None, namespace=None):
+    """Yield the fully-qualified name of every named URL pattern."""
+    from django.urls import URLResolver, get_resolver
+
+    if patterns is None:
+        patterns = get_resolver().url_patterns
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            if pattern.app_name == 'admin':
+                continue
+            inner = ':'.join(part for part in (namespace, pattern.namespace) if part) or None
+            yield from named_urls(pattern.url_patterns, inner)
+        elif pattern.name:
+            yield f'{namespace}:{pattern.name}' if namespace else pattern.name
@@ -0,0 +1,78 @@
+"""
+UH Care - Database routing
+
+All writes, and all reads by default, go to `default`. Views decorated with
+@use_replica send their reads to the `replica` alias (DATABASE_REPLICA_URL,
+see config/database.py) so the heavy dashboard and catalog aggregates stay
+off the primary. Reads fall back to the primary when:
+
+- no replica is configured (DATABASE_REPLICA_ALIAS is None),
+- the client wrote within the last REPLICA_STICKY_SECONDS
+  (ReplicaStickyMiddleware sets request.pin_primary), so it sees its own
+  writes despite replication lag,
+- the primary has an open transaction, which must read its own changes,
+- the model is a database cache table (the idempotency keys).
+"""
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+_state = threading.local()
+
+
+def replica_alias():
+    return getattr(settings, 'DATABASE_REPLICA_ALIAS', None)
+
+
+@contextmanager
+def replica_reads():
+    """Route reads in this block (on this thread) to the replica."""
+    previous = getattr(_state, 'replica', False)
+    _state.replica = True
+    try:
+        yield
+    finally:
+        _state.replica = previous
+
+
+def use_replica(view):
+    """Serve a read-only view from the replica unless the client is pinned to the primary."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if getattr(request, 'pin_primary', False):
+            return view(request, *args, **kwargs)
+        with replica_reads():
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == 'django_cache':
+            # Database cache tables (idempotency keys) must read their own writes
+            return DEFAULT_DB_ALIAS
+        alias = replica_alias()
+        if alias and getattr(_state, 'replica', False) and not connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return alias
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # Explicit, otherwise saving an instance read from the replica would
+        # follow its _state.db back to the replica
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Same data on both aliases
+        aliases = {DEFAULT_DB_ALIAS, replica_alias()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == replica_alias():
+            return False
+        return None
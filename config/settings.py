@@ -1,9 +1,5 @@
 from pathlib import Path
 import os
-try:
-    import dj_database_url
-except Exception:
-    dj_database_url = None
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -41,6 +37,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Per-view latency / DB / template / size metrics, exported on /metrics
+    'config.middleware.MetricsMiddleware',
+    # Outside the rest so session/auth queries are counted too; adds X-DB-* headers
+    # in DEBUG and logs per-request query stats otherwise
+    'config.middleware.QueryCountMiddleware',
     'django.middleware.security.SecurityMiddleware',
     # WhiteNoise should come right after SecurityMiddleware to efficiently serve static files in production
     'whitenoise.middleware.WhiteNoiseMiddleware',
@@ -50,8 +51,23 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Keeps a client on the primary database for a few seconds after it writes
+    'config.middleware.ReplicaStickyMiddleware',
 ]
 
+# Requests to views without a declared budget (config/query_budgets.py)
+# running more queries than this are logged at WARNING
+QUERY_COUNT_WARNING_THRESHOLD = int(os.getenv('QUERY_COUNT_WARNING_THRESHOLD', '50'))
+
+# Request metrics (utils/metrics.py). 'local' sums per-worker files in
+# METRICS_DIR and needs no outside service; 'redis' shares one hash across hosts.
+METRICS_BACKEND = os.getenv('METRICS_BACKEND', 'local')
+METRICS_DIR = os.getenv('METRICS_DIR', '')
+METRICS_FLUSH_SECONDS = int(os.getenv('METRICS_FLUSH_SECONDS', '5'))
+METRICS_REDIS_URL = os.getenv('METRICS_REDIS_URL', os.getenv('REDIS_URL', 'redis://redis:6379/0'))
+# Bearer token that lets a Prometheus scraper read /metrics without a staff login
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
 ROOT_URLCONF = 'config.urls'
 
 TEMPLATES = [
@@ -67,6 +83,8 @@ TEMPLATES = [
                 'django.contrib.messages.context_processors.messages',
                 # Cart and wishlist counts available in all templates
                 'apps.pharmacy.context_processors.cart_and_wishlist_counts',
+                # One-off token for @idempotent form posts
+                'config.idempotency.idempotency_key',
             ],
         },
     },
@@ -75,20 +93,25 @@ TEMPLATES = [
 WSGI_APPLICATION = 'config.wsgi.application'
 
 # Database
-# Database configuration: support DATABASE_URL env var (Postgres) and
-# fallback to SQLite for local development.
-DATABASE_URL = os.getenv('DATABASE_URL')
-if DATABASE_URL and dj_database_url is not None:
-    DATABASES = {
-        'default': dj_database_url.parse(DATABASE_URL, conn_max_age=600)
-    }
-else:
-    DATABASES = {
-        'default': {
-            'ENGINE': 'django.db.backends.sqlite3',
-            'NAME': BASE_DIR / 'db.sqlite3',
-        }
-    }
+# DATABASE_URL (Postgres) or SQLite for local development; connection
+# tuning lives in config/database.py.
+from config.database import database_config, replica_config  # noqa: E402
+
+DATABASES = {
+    'default': database_config(BASE_DIR),
+}
+if replica_config():
+    DATABASES['replica'] = replica_config()
+
+# Reads in views marked @use_replica go to the replica when one is configured;
+# for REPLICA_STICKY_SECONDS after a POST the client stays on the primary so it
+# sees its own writes despite replication lag.
+DATABASE_ROUTERS = ['config.routers.ReplicaRouter']
+DATABASE_REPLICA_ALIAS = 'replica' if 'replica' in DATABASES else None
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', '5'))
+# Set on a test or load-testing copy of the database: lets `audit_indexes
+# --baseline` drop indexes (in a rolled-back transaction) with DEBUG off
+LOAD_TEST_DATABASE = os.getenv('LOAD_TEST_DATABASE', 'False') == 'True'
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -144,13 +167,69 @@ DEFAULT_MODEL = os.getenv('DEFAULT_MODEL', 'gpt-5-mini')
 # Helper: You can reference settings.DEFAULT_MODEL wherever you build API calls
 
 # Payment defaults used by the payments app when generating/displaying QR codes
+# When set, this QR image is shown instead of the generated per-payment one
 PAYMENT_QR_CODE_URL = os.getenv('PAYMENT_QR_CODE_URL', '')
 PAYMENT_ACCOUNT_NAME = os.getenv('PAYMENT_ACCOUNT_NAME', 'UH Care')
 PAYMENT_ACCOUNT_NUMBER = os.getenv('PAYMENT_ACCOUNT_NUMBER', '0000-0000-0000')
+# Rendered per-payment QR codes (see PaymentQRService); defaults to a temp dir
+PAYMENT_QR_CACHE_DIR = os.getenv('PAYMENT_QR_CACHE_DIR', '')
+PAYMENT_QR_CACHE_TIMEOUT = int(os.getenv('PAYMENT_QR_CACHE_TIMEOUT', str(7 * 24 * 3600)))
+
+# Late fee per overdue rental day, as a multiple of the daily rent price
+RENTAL_LATE_FEE_RATE = os.getenv('RENTAL_LATE_FEE_RATE', '1.0')
+
+# Replayed booking/checkout/payment POSTs (see config.idempotency): how long the
+# outcome is remembered, how long a running request holds its key, and how long a
+# concurrent duplicate waits for it
+IDEMPOTENCY_KEY_TTL = int(os.getenv('IDEMPOTENCY_KEY_TTL', str(24 * 3600)))
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv('IDEMPOTENCY_LOCK_SECONDS', '60'))
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv('IDEMPOTENCY_WAIT_SECONDS', '5'))
+# The keys must be visible to every worker. 'db' keeps them in the
+# idempotency_keys table (`manage.py createcachetable`) and needs no outside
+# service; 'redis' keeps them in IDEMPOTENCY_REDIS_URL.
+IDEMPOTENCY_BACKEND = os.getenv('IDEMPOTENCY_BACKEND', 'db')
+IDEMPOTENCY_REDIS_URL = os.getenv('IDEMPOTENCY_REDIS_URL', os.getenv('REDIS_URL', 'redis://redis:6379/0'))
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'idempotency': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': IDEMPOTENCY_REDIS_URL,
+        'KEY_PREFIX': 'uhcare',
+    } if IDEMPOTENCY_BACKEND == 'redis' else {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'idempotency_keys',
+        # Culling drops live keys too, so only expired ones should ever go
+        'OPTIONS': {'MAX_ENTRIES': 1000000},
+    },
+}
+
+# Resume checkpoints of chunked data-fix commands (see config.maintenance)
+MAINTENANCE_CHECKPOINT_DIR = os.getenv('MAINTENANCE_CHECKPOINT_DIR', os.path.join(BASE_DIR, 'var', 'checkpoints'))
 
 # Celery configuration
 CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', os.getenv('REDIS_URL', 'redis://redis:6379/0'))
 CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND', CELERY_BROKER_URL)
+# Run queued tasks (e.g. payment proof processing) in-process, for development without a broker
+CELERY_TASK_ALWAYS_EAGER = os.getenv('CELERY_TASK_ALWAYS_EAGER', 'False') == 'True'
+
+# Periodic jobs run by `celery beat` (schedules are in seconds)
+CELERY_BEAT_SCHEDULE = {
+    'assign-pending-providers': {
+        'task': 'apps.appointments.tasks.assign_pending_providers',
+        'schedule': float(os.getenv('PROVIDER_ASSIGNMENT_INTERVAL', '300')),
+    },
+    'send-appointment-reminders': {
+        'task': 'apps.appointments.tasks.send_appointment_reminders',
+        'schedule': float(os.getenv('APPOINTMENT_REMINDER_INTERVAL', '900')),
+    },
+    'sweep-rentals': {
+        'task': 'apps.equipment.tasks.sweep_rentals',
+        'schedule': float(os.getenv('RENTAL_SWEEP_INTERVAL', '3600')),
+    },
+}
 
 # AWS S3 / storage settings (optional)
 USE_S3 = os.getenv('USE_S3', 'False') == 'True'
@@ -3,6 +3,7 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from apps.accounts.views import PasswordResetNotifyView
+from config.views import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -24,6 +25,8 @@ urlpatterns = [
     path('notifications/', include('apps.notifications.urls')),
     # Blog
     path('blog/', include('apps.blog.urls')),
+    # Request metrics for Prometheus (staff or METRICS_TOKEN only)
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 # Serve media files in development
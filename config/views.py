@@ -0,0 +1,25 @@
+"""
+UH Care - Site-level views
+"""
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+from utils import metrics
+
+
+def metrics_view(request):
+    """
+    Prometheus exposition of request metrics. Readable by staff, or by a
+    scraper sending `Authorization: Bearer <METRICS_TOKEN>`.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    supplied = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+    authorised = request.user.is_authenticated and request.user.is_staff
+    if not authorised and token and supplied:
+        authorised = hmac.compare_digest(supplied, token)
+    if not authorised:
+        return HttpResponseForbidden('Forbidden')
+
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,366 @@
+"""
+Index audit: EXPLAIN the queries the application actually runs.
+
+QueryCapture records one example (SQL and parameters) per query
+fingerprint while a workload runs, such as the benchmark suite or a
+catalogue of hot querysets. IndexAudit EXPLAINs each captured SELECT and
+flags full table scans and temporary sorts. For each flagged table it
+proposes an index built from the statement's own predicates: equality,
+IN and IS NULL columns first, then one range column or the ORDER BY
+columns. No proposal is made when an existing index already starts with
+those columns.
+
+With `baseline_indexes` set, every statement is also EXPLAINed inside a
+transaction that drops those indexes and is then rolled back. That shows
+the plan before and after indexes shipped in a migration. The DROP INDEX
+locks the tables until the rollback, so baseline_allowed() limits it to
+DEBUG, a test database or one marked LOAD_TEST_DATABASE. SQLite and
+PostgreSQL are supported.
+"""
+import re
+from dataclasses import dataclass, field
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.backends.base.creation import TEST_DATABASE_PREFIX
+
+from .query_budget import fingerprint
+
+
+# Indexes added for the hot query shapes; the audit's default before/after baseline
+TUNED_INDEXES = (
+    'payments_patient_method_idx',
+    'appointments_provider_date_idx',
+    'appointments_unassigned_idx',
+    'personal_provider_slot_idx',
+    'equipment_rental_customer_idx',
+    'equipment_purchase_cust_idx',
+    'pharmacy_activity_order_idx',
+    'users_username_lower_idx',
+    'users_email_lower_idx',
+)
+
+_ALIAS = re.compile(r'"(\w+)" (?:AS )?("?[A-Z]\d+"?)')
+_PREDICATE = re.compile(
+    r'(?:"(\w+)"|\b([A-Z]\d+))\."(\w+)"\s*(=|IN\b|IS NULL|IS NOT NULL|>=|<=|>|<|BETWEEN|LIKE)', re.IGNORECASE
+)
+_ORDER_COLUMN = re.compile(r'(?:"(\w+)"|\b([A-Z]\d+))\."(\w+)"')
+_CLAUSE_END = re.compile(r'\s(?:GROUP BY|ORDER BY|LIMIT|OFFSET|HAVING)\s', re.IGNORECASE)
+_EQUALITY = ('=', 'IN', 'IS NULL')
+
+
+class Rollback(Exception):
+    pass
+
+
+@dataclass
+class CapturedQuery:
+    sql: str
+    params: tuple
+    fingerprint: str
+    using: str
+    count: int = 0
+    labels: list = field(default_factory=list)
+
+
+class QueryCapture:
+    """
+    Context manager keeping the first example of every SELECT fingerprint
+    run on any connection. Set `label` to tag the statements that follow,
+    for example with the name of the benchmark being run.
+
+        with QueryCapture() as capture:
+            capture.label = 'dashboard.patient'
+            client.get(url)
+        capture.queries
+    """
+
+    def __init__(self):
+        self.label = None
+        self.by_fingerprint = {}
+        self._wrappers = []
+
+    def __enter__(self):
+        for connection in connections.all():
+            wrapper = connection.execute_wrapper(self._recorder(connection.alias))
+            wrapper.__enter__()
+            self._wrappers.append(wrapper)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        while self._wrappers:
+            self._wrappers.pop().__exit__(exc_type, exc_value, traceback)
+        return False
+
+    def _recorder(self, alias):
+        def record(execute, sql, params, many, context):
+            if not many and sql.lstrip()[:6].upper() == 'SELECT':
+                key = fingerprint(sql)
+                query = self.by_fingerprint.get(key)
+                if query is None:
+                    query = self.by_fingerprint[key] = CapturedQuery(sql, tuple(params or ()), key, alias)
+                query.count += 1
+                if self.label and self.label not in query.labels:
+                    query.labels.append(self.label)
+            return execute(sql, params, many, context)
+        return record
+
+    @property
+    def queries(self):
+        return list(self.by_fingerprint.values())
+
+
+def baseline_allowed(connection):
+    """True when dropping indexes on `connection` for the "before" plans is safe."""
+    if settings.DEBUG or getattr(settings, 'LOAD_TEST_DATABASE', False):
+        return True
+    name = str(connection.settings_dict['NAME'])
+    return name.startswith(TEST_DATABASE_PREFIX) or connection.creation.is_in_memory_db(name)
+
+
+def explain(connection, sql, params):
+    """Return the plan of `sql` as a list of lines."""
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return [row[-1] for row in cursor.fetchall()]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN ' + sql, params)
+            return [row[0] for row in cursor.fetchall()]
+    raise NotImplementedError(f'EXPLAIN is not supported for {connection.vendor}')
+
+
+def aliases(sql):
+    return {alias.strip('"'): table for table, alias in _ALIAS.findall(sql)}
+
+
+def plan_problems(vendor, plan, sql, tables):
+    """(tables read by full scan, whether a temporary sort is used) for one plan."""
+    alias_map = aliases(sql)
+    scans, sorts = [], False
+    for line in plan:
+        text = line.strip()
+        if vendor == 'sqlite':
+            match = re.match(r'SCAN (?:TABLE )?"?(\w+)"?', text)
+            if match and 'USING' not in text:
+                name = alias_map.get(match.group(1), match.group(1))
+                if name in tables and name not in scans:
+                    scans.append(name)
+            sorts = sorts or 'USE TEMP B-TREE' in text
+        else:
+            match = re.search(r'Seq Scan on "?(\w+)"?', text)
+            if match and match.group(1) in tables and match.group(1) not in scans:
+                scans.append(match.group(1))
+            sorts = sorts or bool(re.match(r'(?:->\s+)?Sort\b', text))
+    return scans, sorts
+
+
+def _where_clause(sql):
+    head, sep, tail = sql.partition(' WHERE ')
+    if not sep:
+        return ''
+    end = _CLAUSE_END.search(tail)
+    return tail[:end.start()] if end else tail
+
+
+def _order_clause(sql):
+    head, sep, tail = sql.rpartition(' ORDER BY ')
+    if not sep:
+        return ''
+    end = re.search(r'\s(?:LIMIT|OFFSET)\s', tail, re.IGNORECASE)
+    return tail[:end.start()] if end else tail
+
+
+def index_columns(sql, table):
+    """Columns of `table` an index for `sql` should lead with, in order."""
+    alias_map = aliases(sql)
+
+    def resolve(name, alias):
+        return name or alias_map.get(alias, alias)
+
+    equality, ranges = [], []
+    for name, alias, column, op in _PREDICATE.findall(_where_clause(sql)):
+        if resolve(name, alias) != table:
+            continue
+        target = equality if op.upper() in _EQUALITY else ranges
+        if column not in equality and column not in ranges:
+            target.append(column)
+    order = [
+        column for name, alias, column in _ORDER_COLUMN.findall(_order_clause(sql))
+        if resolve(name, alias) == table and column not in equality
+    ]
+    columns = equality + (ranges[:1] if ranges else order)
+    return list(dict.fromkeys(columns))
+
+
+def model_for_table(table):
+    for model in apps.get_models():
+        if model._meta.db_table == table:
+            return model
+    return None
+
+
+def field_names(model, columns):
+    by_column = {f.column: f.name for f in model._meta.concrete_fields} if model else {}
+    return [by_column.get(column, column) for column in columns]
+
+
+@dataclass
+class Finding:
+    query: CapturedQuery
+    plan: list
+    scans: list
+    sorts: bool
+    before: list = None
+    before_scans: list = None
+    before_sorts: bool = False
+    proposals: list = field(default_factory=list)
+
+    @property
+    def flagged(self):
+        return bool(self.scans or self.sorts)
+
+    @property
+    def improved(self):
+        return self.before is not None and self.before != self.plan
+
+
+class IndexAudit:
+    def __init__(self, queries, baseline_indexes=()):
+        self.queries = queries
+        self.baseline_indexes = list(baseline_indexes)
+
+    def existing_indexes(self, connection):
+        indexes = {}
+        with connection.cursor() as cursor:
+            for table in connection.introspection.table_names(cursor):
+                constraints = connection.introspection.get_constraints(cursor, table)
+                indexes[table] = {
+                    name: info['columns'] for name, info in constraints.items()
+                    if info.get('index') or info.get('primary_key') or info.get('unique')
+                }
+        return indexes
+
+    def before_plans(self, connection, queries, indexes):
+        present = {name for by_name in indexes.values() for name in by_name}
+        dropping = [name for name in self.baseline_indexes if name in present]
+        if not dropping:
+            return {}
+        plans = {}
+        try:
+            with transaction.atomic(using=connection.alias):
+                with connection.cursor() as cursor:
+                    for name in dropping:
+                        cursor.execute(f'DROP INDEX {connection.ops.quote_name(name)}')
+                for query in queries:
+                    try:
+                        # A savepoint each, so one failure doesn't abort the rest on PostgreSQL
+                        with transaction.atomic(using=connection.alias):
+                            plans[query.fingerprint] = explain(connection, query.sql, query.params)
+                    except Exception:  # left without a "before" plan; run() reports its own failure
+                        continue
+                raise Rollback
+        except Rollback:
+            pass
+        return plans
+
+    def propose(self, query, scans, sorts, indexes):
+        tables = list(scans)
+        if sorts:
+            # Sorting is on the table the statement selects from
+            match = re.search(r'\sFROM "(\w+)"', query.sql)
+            if match and match.group(1) not in tables:
+                tables.append(match.group(1))
+        proposals = []
+        for table in tables:
+            columns = index_columns(query.sql, table)
+            if not columns:
+                continue
+            covered = any(
+                existing[:len(columns)] == columns for existing in indexes.get(table, {}).values()
+            )
+            if covered:
+                continue
+            proposals.append((table, field_names(model_for_table(table), columns)))
+        return proposals
+
+    def run(self):
+        findings = []
+        by_alias = {}
+        for query in self.queries:
+            by_alias.setdefault(query.using, []).append(query)
+
+        for alias, queries in by_alias.items():
+            connection = connections[alias]
+            indexes = self.existing_indexes(connection)
+            tables = set(indexes)
+            before = self.before_plans(connection, queries, indexes)
+            for query in queries:
+                try:
+                    plan = explain(connection, query.sql, query.params)
+                except Exception as exc:  # e.g. a statement that needs a temp table gone by now
+                    plan = [f'EXPLAIN failed: {exc}']
+                scans, sorts = plan_problems(connection.vendor, plan, query.sql, tables)
+                finding = Finding(query, plan, scans, sorts)
+                if query.fingerprint in before:
+                    finding.before = before[query.fingerprint]
+                    finding.before_scans, finding.before_sorts = plan_problems(
+                        connection.vendor, finding.before, query.sql, tables
+                    )
+                finding.proposals = self.propose(query, scans, sorts, indexes)
+                findings.append(finding)
+        return findings
+
+
+def render_report(findings, baseline_indexes=()):
+    """Markdown report: summary counts, then each statement with its plans and proposals."""
+    flagged = [f for f in findings if f.flagged]
+    improved = [f for f in findings if f.improved]
+    lines = [
+        '# Index audit',
+        '',
+        f'- Statements audited: {len(findings)}',
+        f'- Full scans or temp sorts remaining: {len(flagged)}',
+        f'- Statements whose plan changed with the baseline indexes: {len(improved)}',
+    ]
+    if baseline_indexes:
+        lines.append(f"- Baseline (\"before\") drops: {', '.join(baseline_indexes)}")
+
+    proposals = {}
+    for finding in findings:
+        for table, fields in finding.proposals:
+            proposals.setdefault((table, tuple(fields)), []).append(finding)
+    lines += ['', '## Proposed indexes', '']
+    if proposals:
+        for (table, fields), hits in proposals.items():
+            lines.append(f"- `{table}`: `models.Index(fields={list(fields)!r})` ({len(hits)} statement(s))")
+    else:
+        lines.append('None: every flagged table already has an index leading with the filtered columns.')
+
+    ordered = sorted(findings, key=lambda f: (not f.improved, not f.flagged, -f.query.count))
+    lines += ['', '## Statements', '']
+    for number, finding in enumerate(ordered, start=1):
+        query = finding.query
+        status = []
+        if finding.improved:
+            status.append('improved')
+        if finding.scans:
+            status.append('full scan: ' + ', '.join(finding.scans))
+        if finding.sorts:
+            status.append('temp sort')
+        lines += [
+            f"### {number}. {', '.join(status) or 'ok'}",
+            '',
+            f"Run {query.count}x by: {', '.join(query.labels) or '-'}",
+            '',
+            '```sql',
+            query.fingerprint[:2000],
+            '```',
+            '',
+        ]
+        if finding.before is not None:
+            lines += ['Before:', '```', *finding.before, '```', 'After:']
+        lines += ['```', *finding.plan, '```', '']
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,286 @@
+"""
+Request metrics in the Prometheus text format.
+
+MetricsMiddleware records, per resolved URL name: a latency histogram, DB
+time and query count, template render time and response size. Samples are
+plain counters keyed by (sample name, labels), so aggregating across
+gunicorn workers is just summing:
+
+- `local` (default): each worker keeps its counters in memory and writes
+  them to METRICS_DIR/<pid>.json every METRICS_FLUSH_SECONDS; the exporter
+  sums every file in the directory. No outside service is needed.
+- `redis`: counters are HINCRBYFLOAT'd into one hash at METRICS_REDIS_URL
+  (defaults to the Celery broker), for deployments spanning several hosts.
+
+The /metrics view (staff only, or a bearer METRICS_TOKEN for scrapers)
+renders the merged counters.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# name -> (type, help)
+METRICS = {
+    'uhcare_requests_total': ('counter', 'Requests served, by view, method and status.'),
+    'uhcare_request_duration_seconds': ('histogram', 'Request latency, by view.'),
+    'uhcare_request_db_seconds': ('summary', 'Time spent in database queries per request, by view.'),
+    'uhcare_request_db_queries': ('summary', 'Database queries per request, by view.'),
+    'uhcare_request_template_seconds': ('summary', 'Time spent rendering templates per request, by view.'),
+    'uhcare_response_size_bytes': ('summary', 'Response body size, by view.'),
+}
+
+_SEPARATOR = '\t'
+
+
+def _key(sample, labels):
+    return sample + _SEPARATOR + json.dumps(sorted(labels.items()))
+
+
+def _split(key):
+    sample, labels = key.split(_SEPARATOR, 1)
+    return sample, dict(json.loads(labels))
+
+
+class LocalMetricsBackend:
+    """Per-process counters flushed to one JSON file per worker."""
+
+    def __init__(self, directory, flush_interval=5):
+        self.directory = str(directory)
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._pid = None
+        self._values = None
+        self._last_flush = 0.0
+
+    def _path(self, pid):
+        return os.path.join(self.directory, f'{pid}.json')
+
+    def _ensure_process(self):
+        # Counters are per process; after a fork start from this pid's file
+        # (if a previous worker with the same pid left one) rather than
+        # inheriting the parent's in-memory values.
+        pid = os.getpid()
+        if pid == self._pid:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self._pid = pid
+        self._values = defaultdict(float)
+        try:
+            with open(self._path(pid)) as fh:
+                self._values.update(json.load(fh))
+        except (OSError, ValueError):
+            pass
+
+    def add(self, increments):
+        with self._lock:
+            self._ensure_process()
+            for key, amount in increments.items():
+                self._values[key] += amount
+            if time.monotonic() - self._last_flush >= self.flush_interval:
+                self._flush()
+
+    def _flush(self):
+        path = self._path(self._pid)
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w') as fh:
+            json.dump(self._values, fh)
+        os.replace(tmp, path)
+        self._last_flush = time.monotonic()
+
+    def collect(self):
+        with self._lock:
+            self._ensure_process()
+            self._flush()
+        totals = defaultdict(float)
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as fh:
+                    values = json.load(fh)
+            except (OSError, ValueError):
+                continue
+            for key, amount in values.items():
+                totals[key] += amount
+        return totals
+
+    def reset(self):
+        with self._lock:
+            for name in os.listdir(self.directory) if os.path.isdir(self.directory) else []:
+                if name.endswith('.json'):
+                    os.remove(os.path.join(self.directory, name))
+            self._pid = None
+
+
+class RedisMetricsBackend:
+    """Counters kept in a single Redis hash shared by every worker and host."""
+
+    def __init__(self, url, key='uhcare:metrics'):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.key = key
+
+    def add(self, increments):
+        pipe = self.client.pipeline(transaction=False)
+        for field, amount in increments.items():
+            pipe.hincrbyfloat(self.key, field, amount)
+        pipe.execute()
+
+    def collect(self):
+        return {
+            field.decode(): float(value)
+            for field, value in self.client.hgetall(self.key).items()
+        }
+
+    def reset(self):
+        self.client.delete(self.key)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                kind = getattr(settings, 'METRICS_BACKEND', 'local')
+                if kind == 'redis':
+                    _backend = RedisMetricsBackend(settings.METRICS_REDIS_URL)
+                else:
+                    directory = getattr(settings, 'METRICS_DIR', None) or os.path.join(
+                        tempfile.gettempdir(), 'uhcare-metrics'
+                    )
+                    _backend = LocalMetricsBackend(directory, getattr(settings, 'METRICS_FLUSH_SECONDS', 5))
+    return _backend
+
+
+def reset_backend():
+    """Drop the configured backend (settings changed, e.g. in tests)."""
+    global _backend
+    _backend = None
+
+
+def observe_request(view, method, status, duration, db_time, db_queries, template_time, size):
+    """Record one finished request."""
+    increments = defaultdict(float)
+    increments[_key('uhcare_requests_total', {'view': view, 'method': method, 'status': str(status)})] += 1
+
+    labels = {'view': view}
+    for le in LATENCY_BUCKETS:
+        if duration <= le:
+            increments[_key('uhcare_request_duration_seconds_bucket', dict(labels, le=str(le)))] += 1
+    increments[_key('uhcare_request_duration_seconds_bucket', dict(labels, le='+Inf'))] += 1
+    increments[_key('uhcare_request_duration_seconds_sum', labels)] += duration
+    increments[_key('uhcare_request_duration_seconds_count', labels)] += 1
+
+    for name, value in (
+        ('uhcare_request_db_seconds', db_time),
+        ('uhcare_request_db_queries', db_queries),
+        ('uhcare_request_template_seconds', template_time),
+        ('uhcare_response_size_bytes', size),
+    ):
+        increments[_key(f'{name}_sum', labels)] += value
+        increments[_key(f'{name}_count', labels)] += 1
+
+    get_backend().add(increments)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels.items()
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def _format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render(values=None):
+    """Prometheus text exposition of the merged counters."""
+    if values is None:
+        values = get_backend().collect()
+
+    by_metric = defaultdict(list)
+    for key, value in values.items():
+        sample, labels = _split(key)
+        for name in METRICS:
+            if sample == name or (sample.startswith(name + '_') and sample[len(name) + 1:] in ('bucket', 'sum', 'count')):
+                by_metric[name].append((sample, labels, value))
+                break
+
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        samples = by_metric.get(name)
+        if not samples:
+            continue
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for sample, labels, value in sorted(samples, key=_sample_order):
+            lines.append(f'{sample}{_format_labels(labels)} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+def _sample_order(entry):
+    sample, labels, _ = entry
+    le = labels.get('le')
+    bound = float('inf') if le == '+Inf' else float(le) if le is not None else 0.0
+    rest = sorted((k, v) for k, v in labels.items() if k != 'le')
+    return rest, sample, bound
+
+
+# Template render time --------------------------------------------------------
+
+_state = threading.local()
+_templates_instrumented = False
+
+
+def begin_request():
+    _state.template_time = 0.0
+    _state.depth = 0
+
+
+def template_time():
+    return getattr(_state, 'template_time', 0.0)
+
+
+def instrument_templates():
+    """
+    Time Django template rendering. Wraps the backend Template.render once;
+    nested renders (render_to_string inside a template tag) are only counted
+    at the outermost level.
+    """
+    global _templates_instrumented
+    if _templates_instrumented:
+        return
+    from django.template.backends.django import Template
+
+    original = Template.render
+
+    def render(self, context=None, request=None):
+        depth = getattr(_state, 'depth', 0)
+        _state.depth = depth + 1
+        started = time.perf_counter()
+        try:
+            return original(self, context, request)
+        finally:
+            _state.depth = depth
+            if depth == 0:
+                _state.template_time = getattr(_state, 'template_time', 0.0) + time.perf_counter() - started
+
+    Template.render = render
+    _templates_instrumented = True
@@ -0,0 +1,100 @@
+"""
+Per-request query accounting.
+
+QueryRecorder hooks every database connection with an execute wrapper, so
+it works with DEBUG off (unlike connection.queries). It counts statements,
+sums their time and groups them by fingerprint - the SQL with literals and
+IN-lists collapsed - so an N+1 loop shows up as one fingerprint repeated N
+times. QueryCountMiddleware uses it for every request and the test suite
+uses it to hold views to their query budgets.
+"""
+import re
+import time
+from collections import Counter
+
+from django.db import connections
+
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\((?:\s*(?:%s|\?|\$\d+)\s*,?)+\)", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+
+
+def fingerprint(sql):
+    """Normalise `sql` so statements differing only in parameters compare equal."""
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER_LITERAL.sub('?', sql)
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryRecorder:
+    """
+    Context manager recording every query run on any connection.
+
+        with QueryRecorder() as recorder:
+            client.get(url)
+        recorder.count, recorder.total_time, recorder.duplicates
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.fingerprints = Counter()
+        self._wrappers = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.total_time += time.perf_counter() - started
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    def __enter__(self):
+        for connection in connections.all():
+            wrapper = connection.execute_wrapper(self)
+            wrapper.__enter__()
+            self._wrappers.append(wrapper)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        while self._wrappers:
+            self._wrappers.pop().__exit__(exc_type, exc_value, traceback)
+        return False
+
+    @property
+    def total_time_ms(self):
+        return round(self.total_time * 1000, 2)
+
+    @property
+    def duplicates(self):
+        """{fingerprint: times run} for statements run more than once."""
+        return {sql: n for sql, n in self.fingerprints.most_common() if n > 1}
+
+    @property
+    def duplicate_count(self):
+        """Queries beyond the first of each fingerprint."""
+        return sum(n - 1 for n in self.duplicates.values())
+
+    def summary(self):
+        return {
+            'queries': self.count,
+            'db_time_ms': self.total_time_ms,
+            'duplicate_queries': self.duplicate_count,
+        }
+
+    def check(self, budget, label='request'):
+        """Raise QueryBudgetExceeded if more than `budget` queries ran."""
+        if self.count <= budget:
+            return
+        lines = [f"{label} ran {self.count} queries, budget is {budget}."]
+        for sql, n in list(self.duplicates.items())[:5]:
+            lines.append(f"  {n}x {sql[:200]}")
+        raise QueryBudgetExceeded('\n'.join(lines))
@@ -0,0 +1,34 @@
+"""
+Reusable queryset layers for listing pages.
+
+Listing views used to loop over every row and walk a reverse relation to
+find, say, the open payment for an order. These querysets push that work
+into the listing query as annotations so a page costs the same number of
+queries however long the user's history is.
+"""
+from django.db import models
+from django.db.models import OuterRef, Subquery
+
+
+class UnpaidPaymentQuerySet(models.QuerySet):
+    """
+    Base queryset for models that payments link to. Subclasses set
+    `payment_link` to the name of the Payment foreign key pointing at them.
+    """
+
+    payment_link = None
+
+    def with_unpaid_payment(self):
+        """
+        Annotate `unpaid_payment_id` and `unpaid_payment_created_at` from the
+        newest unpaid payment for each row (None when there is none).
+        """
+        from apps.payments.models import Payment
+
+        unpaid = Payment.objects.filter(
+            payment_status='unpaid', **{self.payment_link: OuterRef('pk')}
+        ).order_by('-created_at')
+        return self.annotate(
+            unpaid_payment_id=Subquery(unpaid.values('id')[:1]),
+            unpaid_payment_created_at=Subquery(unpaid.values('created_at')[:1]),
+        )
@@ -0,0 +1,101 @@
+"""
+Bulk status transitions that still fire domain side effects.
+
+`queryset.update()` is the fast way to move hundreds of rows to a new
+status, but it skips save() and post_save, so notifications, activity rows
+and balance changes are silently lost. A BulkTransition applies the update
+in one statement and then sends a single `transition_applied` signal for the
+whole batch; receivers produce their side effects with bulk_create / F()
+updates instead of once per row.
+
+Receivers run inside the transition's transaction, while the row locks are
+held, so their database writes commit or roll back with the update. Anything
+that leaves the process (email, SMS) must be deferred with
+transaction.on_commit; NotificationService.send_bulk_notifications does this.
+"""
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.dispatch import Signal
+from django.utils import timezone
+
+
+# Sent once per applied batch with:
+#   sender      - the model class
+#   transition  - the BulkTransition that was applied
+#   instances   - the updated rows, re-read after the update
+#   previous    - {pk: status before the transition}
+#   actor       - the user who triggered it (or None)
+transition_applied = Signal()
+
+
+class BulkTransition:
+    """
+    A named move of `model.status` from any of `sources` to `target`.
+
+    `timestamp_field` is set to now on every transitioned row and
+    `related` lists the select_related paths receivers need, so handlers
+    don't trigger per-row queries.
+    """
+
+    def __init__(self, model, name, target, sources, timestamp_field=None, related=()):
+        self.model = model
+        self.name = name
+        self.target = target
+        self.sources = list(sources)
+        self.timestamp_field = timestamp_field
+        self.related = list(related)
+
+    def __repr__(self):
+        return f"<BulkTransition {self.model.__name__}.{self.name}: {self.sources} -> {self.target}>"
+
+    def apply(self, queryset, actor=None, **values):
+        """
+        Transition every row of `queryset` currently in one of the source
+        states. Extra `values` are written in the same UPDATE. Returns the
+        list of transitioned instances.
+        """
+        with transaction.atomic():
+            previous = dict(
+                queryset.filter(status__in=self.sources)
+                .select_for_update()
+                .order_by()
+                .values_list('pk', 'status')
+            )
+            if not previous:
+                return []
+
+            now = timezone.now()
+            changes = dict(values, status=self.target)
+            if self.timestamp_field:
+                changes[self.timestamp_field] = now
+            if any(f.name == 'updated_at' for f in self.model._meta.concrete_fields):
+                changes['updated_at'] = now
+
+            self.model.objects.filter(pk__in=list(previous)).update(**changes)
+
+            instances = list(
+                self.model.objects.filter(pk__in=list(previous)).select_related(*self.related)
+            )
+            transition_applied.send(
+                sender=self.model,
+                transition=self,
+                instances=instances,
+                previous=previous,
+                actor=actor,
+            )
+            return instances
+
+
+def bulk_increment(model, field, amounts):
+    """
+    Add `amounts[pk]` to the integer `field` on each row with a single
+    UPDATE ... SET field = field + CASE pk WHEN ... END. Used by transition
+    handlers to restore stock/units for a whole batch at once.
+    """
+    if not amounts:
+        return 0
+    delta = Case(
+        *[When(pk=pk, then=Value(amount)) for pk, amount in amounts.items()],
+        output_field=IntegerField(),
+    )
+    return model.objects.filter(pk__in=list(amounts)).update(**{field: F(field) + delta})